@@ -5,12 +5,14 @@ import asyncio
 import multiprocessing
 import atexit
 from tracking.manager import TrackingManager
+from tracking.thread_budget import ThreadBudget
 from api.manager import ApiManager
 from config import Config, NodeType
 from balancing.manager import BalancingManager
 from protocol.master import ClusterMaster
 from protocol.slave import ClusterSlave
 from networking.manager import NetworkingManager
+from metrics import TRACE
 
 
 async def main():
@@ -19,13 +21,19 @@ async def main():
 
     print('Starting as ' + str(config.type))
 
-    tracking = TrackingManager(config)
+    # applied before any subprocess is started, so the manager processes inherit it
+    thread_budget = ThreadBudget(config.thread_budget)
+    thread_budget.apply('main')
+
+    tracking = TrackingManager(config, thread_budget)
     networking = NetworkingManager(config)
 
     if config.type == NodeType.MASTER or '--master' in argv:
         cluster_slave = ClusterSlave(config, tracking)
         balancing = BalancingManager(config)
         cluster_master = ClusterMaster(config, cluster_slave, balancing)
+        TRACE.start()
+        atexit.register(TRACE.stop)
         api = ApiManager(config, tracking, cluster_master, balancing, networking)
 
         await asyncio.gather(
@@ -36,6 +44,7 @@ async def main():
             tracking.await_frames(),
             tracking.await_coordinates(),
             tracking.await_camera_calibration_responses(),
+            tracking.governor.run(),
             networking.initial_check(),
         )
     else:
@@ -48,6 +57,7 @@ async def main():
             tracking.await_frames(),
             tracking.await_coordinates(),
             tracking.await_camera_calibration_responses(),
+            tracking.governor.run(),
             networking.initial_check(),
         )
 
@@ -42,12 +42,13 @@ class CameraCalibrationController(AsyncNamespace):
 
         return ack
 
-    async def send_response(self, node, count, image) -> None:
+    async def send_response(self, node, count, image, status) -> None:
         """Sends the camera calibration response to all clients.
 
         :param models.node.Node node: Node
         :param int count: Count param
         :param str image: Image param
+        :param str status: Status of the calibration
         """
         await self.emit('get', {
             'node': {
@@ -55,6 +56,7 @@ class CameraCalibrationController(AsyncNamespace):
             },
             'count': count,
             'image': image,
+            'status': status,
         })
 
     async def on_update(self, _: str, data: dict) -> None:
@@ -92,6 +92,7 @@ class NodesController(AsyncNamespace):
             node = self.config.node_repository.get_node(data.get('id'))
 
             node.name = data.get('name')
+            self.config.node_repository.reindex()
 
             if data.get('detector') is not None:
                 node.detector = data.get('detector')
@@ -106,6 +106,7 @@ class RoomsController(AsyncNamespace):
         if ack.successful:
             room = self.config.room_repository.get_room(data.get('id'))
             room.name = data.get('name')
+            self.config.room_repository.reindex()
 
             if data.get('people_group') is not None:
                 room.people_group = data.get('people_group')
@@ -86,6 +86,7 @@ class SpeakersController(AsyncNamespace):
             speaker = self.config.speaker_repository.get_speaker(data.get('id'))
 
             speaker.name = data.get('name')
+            self.config.speaker_repository.reindex()
 
             # update room reference if necessary
             if speaker.room is None or speaker.room.room_id != room.room_id:
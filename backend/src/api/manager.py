@@ -13,6 +13,7 @@ from tracking.manager import TrackingManager
 from protocol.master import ClusterMaster
 from balancing.manager import BalancingManager
 from networking.manager import NetworkingManager
+from metrics import REGISTRY
 from .controllers.rooms import RoomsController
 from .controllers.nodes import NodesController
 from .controllers.speakers import SpeakersController
@@ -28,6 +29,19 @@ frontend_path: Path = (Path(__file__).resolve().parent /
                        '..' / '..' / '..' / 'frontend' / 'build').resolve()
 assets_path: Path = (Path(__file__).resolve().parent / '..' / '..' / 'assets').resolve()
 
+MAX_PROFILE_DURATION = 120
+
+SOCKETIO_EMITS = REGISTRY.counter('api_socketio_emits_total', 'Socket.io events emitted',
+                                  ('namespace', 'event'))
+
+
+class CountingAsyncServer(socketio.AsyncServer):
+    """Socket.io server which counts all emitted events."""
+
+    async def emit(self, event, *args, namespace=None, **kwargs):  # pylint: disable=arguments-differ
+        SOCKETIO_EMITS.labels(namespace or '/', event).inc()
+        await super().emit(event, *args, namespace=namespace, **kwargs)
+
 
 class ApiManager:
     """The API manager starts a web server and defines the available routes.
@@ -43,11 +57,14 @@ class ApiManager:
                  networking_manager: NetworkingManager = None):
         self.config: Config = config
         self.tracking_manager: TrackingManager = tracking_manager
+        self.cluster_master: ClusterMaster = cluster_master
         self.stream_queues: List[asyncio.Queue] = []
         self.app: web.Application = web.Application()
 
         # register routes for both masters and slaves
         self.app.add_routes([
+            web.get('/metrics', self.get_metrics),
+            web.post('/profile', self.post_profile),
             web.get('/stream.mjpeg', self.get_stream),
             web.get('/backend-assets/calibration/{image}/proxy', self.get_proxy_assets),
             web.static('/backend-assets', str(assets_path)),
@@ -69,7 +86,7 @@ class ApiManager:
             ])
 
             # attach the socket.io server to the same web server
-            self.server = socketio.AsyncServer(cors_allowed_origins='*', async_mode='aiohttp')
+            self.server = CountingAsyncServer(cors_allowed_origins='*', async_mode='aiohttp')
             self.server.attach(self.app)
 
             # register socket.io namespaces
@@ -106,6 +123,49 @@ class ApiManager:
         """
         return web.FileResponse(str(frontend_path / 'index.html'))
 
+    async def get_metrics(self, _: web.Request) -> web.Response:  # pylint: disable=no-self-use
+        """Returns all metrics in the Prometheus text format on the /metrics route.
+
+        :param aiohttp.web.Request request: Request instance
+        :returns: Response
+        :rtype: aiohttp.web.Response
+        """
+        return web.Response(text=REGISTRY.render(), content_type='text/plain')
+
+    async def post_profile(self, request: web.Request) -> web.Response:
+        """Profiles a process for the given duration on the /profile route.
+        The `process` (main, camera or detector) and `duration` (in seconds) are read from the
+        query. The response is sent immediately and contains the path of the collapsed stacks
+        file, which is written once the duration has passed.
+
+        :param aiohttp.web.Request request: Request instance
+        :returns: Response
+        :rtype: aiohttp.web.Response
+        """
+        process = request.rel_url.query.get('process', 'main')
+
+        try:
+            duration = float(request.rel_url.query.get('duration', 10))
+        except ValueError:
+            return web.json_response({'error': 'Duration must be a number'}, status=400)
+
+        if duration <= 0 or duration > MAX_PROFILE_DURATION:
+            return web.json_response({'error': 'Duration must be between 0 and {}'.format(
+                MAX_PROFILE_DURATION)}, status=400)
+
+        if process not in ('main', 'camera', 'detector'):
+            return web.json_response({'error': 'Process must be main, camera or detector'},
+                                     status=400)
+
+        if not self.tracking_manager.is_process_running(process):
+            return web.json_response({'error': 'The {} process is not running'.format(process)},
+                                     status=409)
+
+        file_name = self.tracking_manager.request_profile(process, duration)
+
+        return web.json_response({'file': '/backend-assets/profiles/' + file_name,
+                                  'duration': duration}, status=202)
+
     async def get_stream(self, request: web.Request) -> web.Response:
         """Starts a new multipart mjpeg stream response of the video camera.
         The stream is available at /stream.mjpeg
@@ -172,10 +232,23 @@ class ApiManager:
             self.stream_queues.remove(queue)
 
     async def get_proxy_assets(self, request: web.Request) -> web.Response:
+        """Returns a camera calibration image of a node.
+        Images sent over the cluster protocol are served from the cache of the master. Images of
+        older nodes and images whose chunks got lost are fetched from the assets of the node.
+
+        :param aiohttp.web.Request request: Request instance
+        :returns: Response
+        :rtype: aiohttp.web.Response
+        """
         image = request.match_info['image']
         node_id = int(request.rel_url.query['nodeId'])
         node = self.config.node_repository.get_node(node_id)
 
+        if self.cluster_master is not None:
+            data = self.cluster_master.calibration_images.get(node.ip_address, image)
+            if data is not None:
+                return web.Response(body=data, content_type='image/jpeg')
+
         async with ClientSession() as client:
             async with client.request(method='get', url='https://{}:8080/backend-assets/calibration/{}'.format(node.ip_address, image), ssl=False) as res:
                 proxied_response = web.Response(headers=res.headers, status=res.status)
@@ -4,6 +4,7 @@ import asyncio
 from time import time
 from typing import List
 from config import Config
+from metrics import TRACE
 from models.room import Room
 from models.speaker import Speaker
 from .sonos import Sonos
@@ -116,6 +117,8 @@ class BalancingManager:
                     index != self.room_info[speaker.room.room_id]['master_index']:
                 self.room_info[speaker.room.room_id]['master_index'] = index
 
+        TRACE.volumes(room.room_id, speaker_volumes)
+
         if self.room_info[room.room_id]['current_volume'] is None or \
                 self.room_info[room.room_id]['current_volume'] != speaker_volumes:
             # if the volume change is already confirmed by the speaker, set the next one
@@ -150,6 +153,7 @@ class BalancingManager:
         self.room_info[room.room_id]['current_volume'] = volumes
         self.room_info[room.room_id]['volume_confirmed'] = False
         self.room_info[room.room_id]['last_volume_change'] = time()
+        TRACE.command(room.room_id, volumes)
 
         command = SonosVolumeCommand(speakers, volumes)
         self.sonos.send_command(command)
@@ -180,6 +184,7 @@ class BalancingManager:
             if last_change_master_volume == event_volume and \
                     not self.room_info[room.room_id]['volume_confirmed']:
                 self.room_info[room.room_id]['volume_confirmed'] = True
+                TRACE.confirmation(room.room_id, event_volume)
 
                 # check if another change is already queued
                 if self.room_info[room.room_id]['next_volume'] is not None:
@@ -0,0 +1,138 @@
+"""Fuses the coordinates reported for the axes of a room into a single position."""
+
+import asyncio
+from typing import Dict, List, Set
+from metrics import REGISTRY
+
+DEFAULT_WINDOW = 0.1  # seconds to wait for the other axis after a coordinate has arrived
+DEFAULT_IDLE_TIMEOUT = 0.5  # seconds between the updates of a node until it is not waited for
+
+FUSED_POSITIONS = REGISTRY.counter('balancing_fused_positions_total',
+                                   'Positions passed to the balancing, complete if all axes of '
+                                   'the room have been updated, otherwise after the window',
+                                   ('room', 'reason'))
+
+
+class PositionFusion:
+    """Collects the coordinates of the axes of a room until all of them have been updated, so the
+    room is balanced once per position instead of once per axis.
+    The axes a room expects are learned from the updates of its online nodes. If not all of them
+    are updated within the window after the first pending coordinate has arrived, the room is
+    balanced with the coordinates received so far. The window starts on arrival, as the updates
+    only arrive after the detection latency of the nodes, which exceeds the window on a Raspberry
+    Pi. The capture times only decide whether coordinates belong to the same position: a
+    coordinate captured more than the window apart from the pending ones is not fused with
+    them. Nodes only send coordinates that
+    moved more than their deadband and otherwise just a keep-alive, so the axes of nodes whose
+    updates are further apart than the idle timeout are not waited for.
+
+    :param models.room.Room room: Room
+    :param callable balance: Coroutine balancing the room
+    :param float window: Seconds to wait for the other axes
+    :param float idle_timeout: Seconds between the updates of a node until it is not waited for
+    """
+
+    def __init__(self, room, balance: callable, window: float = DEFAULT_WINDOW,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.room = room
+        self.balance = balance
+        self.window = window
+        self.idle_timeout = idle_timeout
+        # coordinate per coordinate index (0 for x, 1 for y) that has not been applied yet
+        self.pending: Dict[int, int] = {}
+        self.pending_since = 0.0
+        # coordinate indices reported by each node
+        self.node_axes: Dict[int, Set[int]] = {}
+        # capture time of the latest update of each node and the interval to the one before
+        self.node_capture_times: Dict[int, float] = {}
+        self.node_intervals: Dict[int, float] = {}
+        self.timeout = None
+
+    @staticmethod
+    def from_json(room, balance: callable, data: dict):
+        """Creates the fusion of a room from the `fusion` section of the config.
+
+        :param models.room.Room room: Room
+        :param callable balance: Coroutine balancing the room
+        :param dict data: JSON data
+        :returns: Position fusion
+        :rtype: PositionFusion
+        """
+        return PositionFusion(room, balance, float(data.get('window', DEFAULT_WINDOW)),
+                              float(data.get('idle_timeout', DEFAULT_IDLE_TIMEOUT)))
+
+    def expected_axes(self) -> Set[int]:
+        """Returns the coordinate indices reported by the online nodes of the room that are
+        currently sending updates.
+
+        :returns: Coordinate indices
+        :rtype: Set[int]
+        """
+        axes = set()
+
+        for node in self.room.nodes:
+            if node.online and node.node_id in self.node_axes and self.is_active(node):
+                axes |= self.node_axes[node.node_id]
+
+        return axes
+
+    def is_active(self, node) -> bool:
+        """Returns whether a node recently sent updates in intervals shorter than the idle
+        timeout.
+
+        :param models.node.Node node: Node
+        :returns: True if the node is active
+        :rtype: bool
+        """
+        return self.node_intervals.get(node.node_id, self.idle_timeout) < self.idle_timeout and \
+            self.node_capture_times[node.node_id] + self.idle_timeout >= self.pending_since
+
+    async def update(self, node, coordinates: List[int], capture_time: float) -> None:
+        """Adds the coordinates of a position update and balances the room once all expected
+        axes have been updated.
+
+        :param models.node.Node node: Sending node
+        :param list coordinates: X and y coordinate, None for an axis not contained in the update
+        :param float capture_time: Capture time of the coordinates in master time
+        """
+        axes = {index for index, coordinate in enumerate(coordinates) if coordinate is not None}
+        self.node_axes[node.node_id] = axes
+        last_capture_time = self.node_capture_times.get(node.node_id)
+        if last_capture_time is None or capture_time > last_capture_time:
+            if last_capture_time is not None:
+                self.node_intervals[node.node_id] = capture_time - last_capture_time
+            self.node_capture_times[node.node_id] = capture_time
+
+        if len(self.pending) > 0 and abs(capture_time - self.pending_since) > self.window:
+            # the pending coordinates belong to another position
+            await self.flush('window')
+
+        if len(self.pending) == 0:
+            self.pending_since = capture_time
+        for index in axes:
+            self.pending[index] = coordinates[index]
+
+        if self.expected_axes() <= set(self.pending):
+            await self.flush('complete')
+        elif self.timeout is None:
+            self.timeout = asyncio.get_running_loop().call_later(
+                self.window, lambda: asyncio.create_task(self.flush('window')))
+
+    async def flush(self, reason: str) -> None:
+        """Applies the pending coordinates to the room and balances it.
+
+        :param str reason: Reason for the metrics, complete or window
+        """
+        if self.timeout is not None:
+            self.timeout.cancel()
+            self.timeout = None
+
+        if len(self.pending) == 0:
+            return
+
+        for index, coordinate in self.pending.items():
+            self.room.coordinates[index] = coordinate
+        self.pending.clear()
+
+        FUSED_POSITIONS.labels(str(self.room.room_id), reason).inc()
+        await self.balance(self.room)
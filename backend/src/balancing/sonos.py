@@ -1,11 +1,18 @@
 """Implements Sonos discovery and control"""
 import asyncio
+from time import perf_counter
 from config import Config
+from metrics import REGISTRY
 from models.speaker import Speaker
 from sonos.adapter import SonosAdapter
 from sonos.adapter_soco import SonosSocoAdapter
 from .sonos_command import SonosCommand
 
+COMMAND_QUEUE_DEPTH = REGISTRY.gauge('sonos_command_queue_depth',
+                                     'Sonos commands waiting to be executed')
+COMMAND_SECONDS = REGISTRY.histogram('sonos_command_seconds',
+                                     'Execution time of a Sonos command', ('command',))
+
 
 class Sonos:
     """Performs discovery for Sonos speakers and sends messages to control them."""
@@ -37,6 +44,7 @@ class Sonos:
                         elif existing_speaker is not None:
                             existing_speaker.name = speaker.name
                             existing_speaker.ip_address = speaker.ip_address
+                            self.config.speaker_repository.reindex()
                             existing_speaker.times_discovery_missed = -1
                             await self.config.speaker_repository.call_listeners()
                             continue
@@ -69,7 +77,10 @@ class Sonos:
         self.control_loop_exiting = False
         while not self.control_loop_exiting:
             command: SonosCommand = await self.control_queue.get()
+            COMMAND_QUEUE_DEPTH.set(self.control_queue.qsize())
+            started_at = perf_counter()
             command.run(self.sonos_adapter)
+            COMMAND_SECONDS.labels(type(command).__name__).observe(perf_counter() - started_at)
             self.control_queue.task_done()
 
     def stop_control_loop(self):
@@ -79,3 +90,4 @@ class Sonos:
     def send_command(self, command: SonosCommand):
         """Adds the command to the control queue"""
         self.control_queue.put_nowait(command)
+        COMMAND_QUEUE_DEPTH.set(self.control_queue.qsize())
@@ -0,0 +1,2 @@
+"""The benchmarks module contains benchmarks and load generators which can be run with
+`python -m benchmarks.<name>` from within the `src` folder."""
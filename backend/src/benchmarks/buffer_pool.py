@@ -0,0 +1,85 @@
+"""Soak benchmark of the frame processing path with and without the buffer pool.
+
+Runs the undistortion and the motion detector on synthetic frames and reports the processing
+time, the time spent in the garbage collector and the resident memory over time.
+
+Usage: python -m benchmarks.buffer_pool [--frames 2000] [--no-pool]
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+import gc
+import resource
+import numpy as np
+from tracking.buffer_pool import BUFFER_POOL
+from tracking.calibration import Calibration
+from tracking.motion_people_detector import MotionPeopleDetector
+
+FRAME_SIZE = (640, 480)
+REPORT_INTERVAL = 250
+
+
+class GcTimer:
+    """Measures the time spent in garbage collections."""
+
+    def __init__(self):
+        self.total = 0.0
+        self.started_at = 0.0
+        gc.callbacks.append(self.on_gc)
+
+    def on_gc(self, phase: str, _: dict) -> None:
+        """Garbage collector callback.
+
+        :param str phase: start or stop
+        """
+        if phase == 'start':
+            self.started_at = perf_counter()
+        else:
+            self.total += perf_counter() - self.started_at
+
+
+def rss_mb() -> float:
+    """Returns the current resident set size in MB.
+
+    :returns: Resident set size
+    :rtype: float
+    """
+    with open('/proc/self/statm', 'r') as statm:
+        pages = int(statm.read().split()[1])
+
+    return pages * resource.getpagesize() / 1024 / 1024
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--no-pool', action='store_true', help='allocate new buffers per frame')
+    args = parser.parse_args()
+
+    BUFFER_POOL.enabled = not args.no_pool
+    calibration = Calibration(FRAME_SIZE, None)
+    motion_detector = MotionPeopleDetector(None, None, None, None, 'average', None)
+    gc_timer = GcTimer()
+    # a bright block moving through the frame
+    frames = []
+    for position in range(0, 400, 100):
+        frame = np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+        frame[100:400, position:position + 120] = 200
+        frames.append(frame)
+
+    print('pool: {}'.format('disabled' if args.no_pool else 'enabled'))
+    started_at = perf_counter()
+
+    for index in range(args.frames):
+        frame = calibration.correct_frame(frames[index % len(frames)])
+        motion_detector.detect(frame)
+
+        if (index + 1) % REPORT_INTERVAL == 0:
+            elapsed = perf_counter() - started_at
+            print('{:6d} frames  {:7.2f} ms/frame  gc {:7.2f} ms  rss {:7.1f} MB'.format(
+                index + 1, elapsed / (index + 1) * 1000, gc_timer.total * 1000, rss_mb()))
+
+
+if __name__ == '__main__':
+    main()
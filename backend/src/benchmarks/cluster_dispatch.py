@@ -0,0 +1,114 @@
+"""Measures how many cluster messages per second are parsed and dispatched to their events.
+
+Feeds serialized position updates, pings and governor updates through
+`ClusterSocket.receive_message`. With `--legacy`, the events are resolved with the regular
+expression and attribute lookup per message used before the dispatch table.
+
+Usage: python -m benchmarks.cluster_dispatch [--messages 200000] [--legacy]
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+import asyncio
+from protocol.cluster_pb2 import Wrapper
+from protocol.socket import ClusterSocket, MESSAGE_TYPE_PATTERN
+
+
+class BenchmarkSocket(ClusterSocket):
+    """Socket with events that only count the received messages."""
+
+    def __init__(self):
+        super().__init__()
+        self.handled = 0
+
+    async def on_position_update(self, _: Wrapper, __: str) -> None:
+        """Counts a position update."""
+        self.handled += 1
+
+    async def on_ping(self, _: Wrapper, __: str) -> None:
+        """Counts a ping."""
+        self.handled += 1
+
+    async def on_governor_update(self, _: Wrapper, __: str) -> None:
+        """Counts a governor update."""
+        self.handled += 1
+
+
+class LegacyBenchmarkSocket(BenchmarkSocket):
+    """Resolves the events for every message like before the dispatch table."""
+
+    async def receive_message(self, data: bytes, call_events: bool = True, address: str = '') -> \
+            (Wrapper, str):
+        message = Wrapper()
+        message.ParseFromString(data)
+        await self.call_events(message, address)
+        return message, address
+
+    async def call_events(self, message: Wrapper, address: str) -> None:
+        message_type = MESSAGE_TYPE_PATTERN.sub('_', message.WhichOneof('message')).lower()
+        event_method = getattr(self, 'on_' + message_type, None)
+
+        if event_method is not None:
+            await event_method(message, address)
+
+
+def build_messages(socket: ClusterSocket) -> list:
+    """Builds a mix of serialized messages dominated by position updates.
+
+    :param ClusterSocket socket: Socket building the messages
+    :returns: Serialized messages
+    :rtype: list
+    """
+    messages = []
+
+    for coordinate in range(8):
+        message = socket.build_message()
+        message.positionUpdate.coordinate = coordinate * 10
+        message.positionUpdate.axes.add(axis='x', coordinate=coordinate * 10)
+        messages.append(message.SerializeToString())
+
+    message = socket.build_message()
+    message.ping.SetInParent()
+    messages.append(message.SerializeToString())
+
+    message = socket.build_message()
+    message.governorUpdate.level = 1
+    message.governorUpdate.detector = 'hog'
+    messages.append(message.SerializeToString())
+
+    return messages
+
+
+async def run(socket: ClusterSocket, count: int) -> float:
+    """Feeds the messages through the socket.
+
+    :param ClusterSocket socket: Socket
+    :param int count: Number of messages
+    :returns: Duration in seconds
+    :rtype: float
+    """
+    messages = build_messages(socket)
+    started_at = perf_counter()
+
+    for index in range(count):
+        await socket.receive_message(messages[index % len(messages)], address='127.0.0.1')
+
+    return perf_counter() - started_at
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    socket = LegacyBenchmarkSocket() if args.legacy else BenchmarkSocket()
+    duration = asyncio.run(run(socket, args.messages))
+
+    print('{} messages handled  {:.0f} messages/s  {:.2f} us/message'.format(
+        socket.handled, socket.handled / duration, duration / args.messages * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+"""Simulates many tracking nodes to load a cluster master.
+
+Starts a master and the given number of slaves in one process. Each slave binds its own loopback
+address (127.0.0.2, 127.0.0.3, ...), announces itself, gets acquired and streams position
+updates with the given rate and motion pattern. The Sonos speakers are replaced by a balancing
+stub, so no hardware is needed. Reports the ingest throughput of the master, the latency from the
+capture of a coordinate to the rebalancing of its room, how many positions were fused from all
+axes and the lag of the event loop.
+With a detection latency, the coordinates are sent that long after their capture time like on a
+real node, and the nodes of a room capture at the same time.
+
+Usage: python -m benchmarks.cluster_load [--nodes 8] [--rooms 4] [--rate 10] [--pattern walk]
+                                         [--duration 30] [--deadband 2] [--max-update-rate 15]
+                                         [--detection-latency 0.2]
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+import asyncio
+import json
+from config import Config
+from balancing.position_fusion import FUSED_POSITIONS
+from protocol.master import ClusterMaster
+from protocol.slave import ClusterSlave
+from tracking.frame_format import DEFAULT_FRAME_FORMAT
+from benchmarks.trace_report import percentiles
+
+LAG_INTERVAL = 0.01  # seconds the lag monitor sleeps
+ACQUISITION_TIMEOUT = 10.0  # seconds to wait for all slaves to be acquired
+SWEEP_PERIOD = 10.0  # seconds to cross the room and back
+WALK_STEP = 20  # maximum change of the coordinate per update
+JITTER = 0.03  # maximum seconds a node needs longer for the detection than the others
+
+
+def node_address(index: int) -> str:
+    """Returns the loopback address of a simulated node.
+
+    :param int index: Index of the node
+    :returns: IP address
+    :rtype: str
+    """
+    return '127.0.{}.{}'.format(index // 250, index % 250 + 2)
+
+
+def write_config(path: Path, data: dict) -> Config:
+    """Writes and loads a config.
+
+    :param Path path: Path of the config file
+    :param dict data: Config data
+    :returns: Config
+    :rtype: Config
+    """
+    with open(str(path), 'w') as file:
+        json.dump(data, file)
+
+    return Config(path)
+
+
+def master_config(path: Path, nodes: int, rooms: int, position_updates: dict) -> Config:
+    """Creates the config of the master with the simulated nodes assigned to the rooms.
+    The nodes of a room alternately track the x and y axis.
+
+    :param Path path: Path of the config file
+    :param int nodes: Number of nodes
+    :param int rooms: Number of rooms
+    :param dict position_updates: Limits for the position updates of the nodes
+    :returns: Config
+    :rtype: Config
+    """
+    data = {'type': 'master', 'rooms': [], 'nodes': [], 'speakers': [],
+            'position_updates': position_updates}
+
+    for room_id in range(1, rooms + 1):
+        data['rooms'].append({'id': room_id, 'name': 'Room {}'.format(room_id),
+                              'people_group': 'average', 'calibration_points': []})
+
+    for index in range(nodes):
+        data['nodes'].append({
+            'id': index + 1, 'name': 'sim-{}'.format(index), 'hostname': 'sim-{}'.format(index),
+            'ip': node_address(index), 'room_id': index % rooms + 1, 'detector': 'hog',
+            'coordinate_type': 'x' if (index // rooms) % 2 == 0 else 'y',
+        })
+
+    return write_config(path, data)
+
+
+class SimulatedGovernor:
+    """Governor of a simulated node, which never steps down."""
+
+    index = 0
+    reason = ''
+    fps = 0.0
+    temperature = None
+    load = None
+
+    def register_listener(self, listener: callable) -> None:
+        """Ignores the listener as the governor never changes."""
+
+    def level(self):  # pylint: disable=no-self-use
+        """Returns no level, as the node runs with its configured settings."""
+        return None
+
+
+class SimulatedPacing:
+    """Pacing of a simulated node.
+
+    :param float framerate: Rate of the position updates
+    """
+
+    def __init__(self, framerate: float):
+        self.framerate = framerate
+
+
+class SimulatedTracking:
+    """Tracking of a simulated node, whose coordinates are generated by the load generator.
+
+    :param float rate: Rate of the position updates
+    """
+
+    def __init__(self, rate: float):
+        self.governor = SimulatedGovernor()
+        self.pacing = SimulatedPacing(rate)
+        self.detector = 'simulated'
+
+    def set_detector(self, detector: str) -> None:
+        """Records the detector requested by the master.
+
+        :param str detector: Detector
+        """
+        self.detector = detector
+
+    def set_people_group(self, people_group: str) -> None:
+        """Ignores the people group requested by the master."""
+
+    def active_detector(self) -> str:
+        """Returns the detector requested by the master.
+
+        :returns: Detector
+        :rtype: str
+        """
+        return self.detector
+
+    def acquire_camera(self) -> None:
+        """Ignored, simulated nodes have no camera."""
+
+    def release_camera(self) -> None:
+        """Ignored, simulated nodes have no camera."""
+
+    def send_camera_calibration_request(self, *_) -> None:
+        """Ignored, simulated nodes cannot be calibrated."""
+
+
+class SimulatedBalancing:
+    """Replaces the balancing manager and measures the latency from the capture of the oldest
+    coordinate that has not been balanced yet to the rebalancing of its room.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.latencies = []
+
+    def on_position(self, room_id: int, capture_time: float) -> None:
+        """Records the capture time of a received coordinate.
+
+        :param int room_id: Id of the room
+        :param float capture_time: Capture time in master time
+        """
+        self.pending.setdefault(room_id, capture_time)
+
+    async def balance_room(self, room) -> None:
+        """Records the latency of the rebalancing.
+
+        :param models.room.Room room: Room
+        """
+        capture_time = self.pending.pop(room.room_id, None)
+        if capture_time is not None:
+            self.latencies.append(time() - capture_time)
+
+
+class LoadMaster(ClusterMaster):
+    """Master that counts the received position updates and passes the capture times of new
+    coordinates to the simulated balancing.
+    """
+
+    def __init__(self, config: Config, balancing: SimulatedBalancing):
+        super().__init__(config, None, balancing)
+        self.position_updates = 0
+        self.capture_times = {}
+
+    async def on_position_update(self, message, address: str) -> None:
+        self.position_updates += 1
+        capture_time = message.positionUpdate.capture_time
+        node = self.config.node_repository.get_node_by_ip(address)
+
+        # keep-alives repeat the capture time of the last coordinate
+        if node is not None and node.room is not None and \
+                capture_time > self.capture_times.get(address, 0.0):
+            self.capture_times[address] = capture_time
+            self.balancing_manager.on_position(node.room.room_id,
+                                               self.to_master_time(address, capture_time))
+
+        await super().on_position_update(message, address)
+
+
+def motion(pattern: str, random: Random, rate: float) -> callable:
+    """Returns a generator for the coordinates of a simulated person.
+
+    :param str pattern: static, sweep, walk or jump
+    :param Random random: Random number generator of the node
+    :param float rate: Rate of the position updates
+    :returns: Function returning the next coordinate
+    :rtype: callable
+    """
+    width = DEFAULT_FRAME_FORMAT.width
+    state = {'coordinate': random.randrange(width), 'step': 0}
+
+    def next_coordinate() -> int:
+        state['step'] += 1
+
+        if pattern == 'sweep':
+            phase = (state['step'] / rate / SWEEP_PERIOD) % 1.0
+            return int(width * (1.0 - abs(2.0 * phase - 1.0)))
+        if pattern == 'walk':
+            state['coordinate'] += random.randint(-WALK_STEP, WALK_STEP)
+            state['coordinate'] = max(0, min(width - 1, state['coordinate']))
+        elif pattern == 'jump':
+            state['coordinate'] = random.randrange(width)
+
+        return state['coordinate']
+
+    return next_coordinate
+
+
+async def drive(slave: ClusterSlave, next_coordinate: callable, rate: float,
+                counters: dict, latency: float = 0.0, jitter: float = 0.0) -> None:
+    """Feeds generated coordinates into a slave once it has been acquired.
+
+    :param ClusterSlave slave: Simulated slave
+    :param callable next_coordinate: Coordinate generator
+    :param float rate: Rate of the position updates
+    :param dict counters: Counters of the load generator
+    :param float latency: Seconds between the capture and the sending of a coordinate
+    :param float jitter: Additional seconds this node needs for the detection
+    """
+    interval = 1.0 / rate
+
+    while True:
+        if latency > 0:
+            # the cameras of all nodes capture at the same time, the detection takes a while
+            await asyncio.sleep(interval - time() % interval)
+            capture_time = time()
+            await asyncio.sleep(latency + jitter)
+        else:
+            capture_time = time()
+
+        if slave.master_ip is not None:
+            await slave.config.tracking_repository.update_coordinate(next_coordinate(), None,
+                                                                     capture_time)
+            counters['sent'] += 1
+
+        if latency == 0:
+            await asyncio.sleep(interval)
+
+
+def fused_positions() -> dict:
+    """Returns the positions fused by the master so far.
+
+    :returns: Positions of all rooms per reason, complete or window
+    :rtype: dict
+    """
+    counts = {'complete': 0.0, 'window': 0.0}
+
+    for (_, reason), counter in FUSED_POSITIONS.children.items():
+        counts[reason] += counter.get()
+
+    return counts
+
+
+async def monitor_lag(lags: list) -> None:
+    """Measures how late the event loop resumes a sleeping task.
+
+    :param list lags: Measured lags in seconds
+    """
+    while True:
+        started_at = perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(perf_counter() - started_at - LAG_INTERVAL, 0.0))
+
+
+async def run(args, directory: Path) -> None:
+    """Starts the master and the slaves and reports the measurements.
+
+    :param argparse.Namespace args: Arguments
+    :param Path directory: Folder for the config files
+    """
+    balancing = SimulatedBalancing()
+    position_updates = {}
+    if args.deadband is not None:
+        position_updates['deadband'] = args.deadband
+    if args.max_update_rate is not None:
+        position_updates['max_update_rate'] = args.max_update_rate
+    master = LoadMaster(master_config(directory / 'master.json', args.nodes, args.rooms,
+                                      position_updates), balancing)
+    tasks = [asyncio.create_task(master.start())]
+    slaves = []
+    counters = {'sent': 0}
+    lags = []
+
+    for index in range(args.nodes):
+        config = write_config(directory / 'slave-{}.json'.format(index),
+                              {'type': 'tracking', 'rooms': [], 'nodes': [], 'speakers': []})
+        slave = ClusterSlave(config, SimulatedTracking(args.rate))
+        slave.hostname = 'sim-{}'.format(index)
+        slave.bind_address = node_address(index)
+        slave.announcement_address = '127.0.0.1'
+        slaves.append(slave)
+
+        tasks.append(asyncio.create_task(slave.start()))
+        random = Random(index)
+        tasks.append(asyncio.create_task(drive(
+            slave, motion(args.pattern, random, args.rate), args.rate, counters,
+            args.detection_latency, random.uniform(0.0, JITTER) if args.detection_latency else 0.0)))
+
+    # wait until the master acquired all slaves before measuring
+    started_at = time()
+    while any(slave.master_ip is None for slave in slaves) and \
+            time() < started_at + ACQUISITION_TIMEOUT:
+        await asyncio.sleep(0.1)
+    acquired = sum(slave.master_ip is not None for slave in slaves)
+
+    counters['sent'] = 0
+    master.position_updates = 0
+    balancing.latencies.clear()
+    fused_before = fused_positions()
+    tasks.append(asyncio.create_task(monitor_lag(lags)))
+    await asyncio.sleep(args.duration)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # let the slaves close their connections before the event loop is closed
+    for slave in slaves:
+        master.connection_pool.close(slave.bind_address)
+    master.receive_socket.close()
+    await asyncio.sleep(0.1)
+
+    print('{} of {} nodes acquired, {} rooms, {} updates/s per node, {} motion, {} s'.format(
+        acquired, args.nodes, args.rooms, args.rate, args.pattern, args.duration))
+    print('position updates  {} generated  {} handled  {:.1f} handled/s  {:.1f}% throttled or '
+          'lost'.format(
+        counters['sent'], master.position_updates, master.position_updates / args.duration,
+        max(counters['sent'] - master.position_updates, 0) / max(counters['sent'], 1) * 100))
+    fused = {reason: count - fused_before[reason] for reason, count in fused_positions().items()}
+    print('fused positions   {:.0f} complete  {:.0f} after the window  {:.1f}% complete'.format(
+        fused['complete'], fused['window'],
+        fused['complete'] / max(fused['complete'] + fused['window'], 1) * 100))
+    print('balancing latency {}'.format(percentiles(balancing.latencies)))
+    print('event loop lag    {}'.format(percentiles(lags)))
+
+
+def main() -> None:
+    """Runs the load generator."""
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=8)
+    parser.add_argument('--rooms', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=10.0, help='updates per second per node')
+    parser.add_argument('--pattern', choices=('static', 'sweep', 'walk', 'jump'), default='walk')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to measure')
+    parser.add_argument('--deadband', type=int, help='pixels, defaults to the master default')
+    parser.add_argument('--max-update-rate', type=float,
+                        help='updates per second per node, defaults to the master default')
+    parser.add_argument('--detection-latency', type=float, default=0.0,
+                        help='seconds between the capture and the sending of a coordinate')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as directory:
+        asyncio.run(run(args, Path(directory)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Replays recorded frames through a people detector.
+
+Reads the segments written by the frame recorder, runs the detector's part of the tracking
+pipeline on every frame and compares the detection time and the confirmed people with the
+recording.
+
+Usage: python -m benchmarks.replay [--detector hog] [--path assets/recordings] [--axis x]
+"""
+
+from argparse import ArgumentParser
+from multiprocessing import RawValue
+from pathlib import Path
+from queue import Queue
+from statistics import mean
+from time import perf_counter
+from tracking.frame_recorder import RECORDINGS_PATH, replay
+from tracking.hog_people_detector import HogPeopleDetector
+from tracking.hog_grayscale_people_detector import HogGrayscalePeopleDetector
+from tracking.motion_people_detector import MotionPeopleDetector
+from tracking.yolo_people_detector import YoloPeopleDetector
+from tracking.pipeline import FrameContext
+from tracking.subscriptions import Subscriptions
+
+# the manager cannot be imported without a camera
+DETECTORS = {
+    'yolo': YoloPeopleDetector,
+    'hog': HogPeopleDetector,
+    'hog_gray': HogGrayscalePeopleDetector,
+    'motion': MotionPeopleDetector,
+}
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--detector', choices=DETECTORS.keys(), default='hog')
+    parser.add_argument('--people-group', choices=('average', 'track'), default='average')
+    parser.add_argument('--path', type=Path, default=RECORDINGS_PATH)
+    parser.add_argument('--axis', default=None, help='only replay the frames of this axis')
+    args = parser.parse_args()
+
+    detector = DETECTORS[args.detector](None, Queue(), Subscriptions(), Queue(),
+                                        args.people_group, RawValue('d', 0.0))
+    durations = []
+    matching = 0
+    recorded_people = 0
+    replayed_people = 0
+
+    for frame, metadata in replay(args.path):
+        if args.axis is not None and metadata['axis'] != args.axis:
+            continue
+
+        context = FrameContext(frame, metadata['axis'], detector.INPUT_FORMAT)
+        started_at = perf_counter()
+        detector.process_frame(context)
+        durations.append(perf_counter() - started_at)
+
+        recorded_people += len(metadata['people'])
+        replayed_people += len(context.people)
+        if (len(metadata['people']) > 0) == (len(context.people) > 0):
+            matching += 1
+
+    if len(durations) == 0:
+        print('No recorded frames found in {}'.format(args.path))
+        return
+
+    print('{} frames  {:7.2f} ms/frame  {:.1f}% matching frames  people recorded {}  '
+          'replayed {}'.format(len(durations), mean(durations) * 1000,
+                               matching / len(durations) * 100, recorded_people,
+                               replayed_people))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Measures loading the config and looking up nodes, rooms and speakers of a large installation.
+
+Generates a config with many rooms, nodes and speakers, loads it and looks up every model by
+the attributes used on incoming messages and during balancing. The lookups are compared with a
+linear scan over the model lists.
+
+Usage: python -m benchmarks.repositories [--rooms 50] [--nodes 4] [--speakers 6]
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import json
+from config import Config
+
+LOOKUPS = 100000
+
+
+def generate_config(path: Path, rooms: int, nodes: int, speakers: int) -> None:
+    """Writes a config with the given number of rooms and nodes and speakers per room.
+
+    :param Path path: Path of the config file
+    :param int rooms: Number of rooms
+    :param int nodes: Nodes per room
+    :param int speakers: Speakers per room
+    """
+    data = {'type': 'master', 'rooms': [], 'nodes': [], 'speakers': []}
+
+    for room_id in range(1, rooms + 1):
+        data['rooms'].append({'id': room_id, 'name': 'Room {}'.format(room_id),
+                              'people_group': 'average', 'calibration_points': []})
+
+        for index in range(nodes):
+            node_id = (room_id - 1) * nodes + index + 1
+            data['nodes'].append({
+                'id': node_id, 'name': 'Node {}'.format(node_id), 'room_id': room_id,
+                'hostname': 'node-{}'.format(node_id), 'detector': 'hog',
+                'ip': '10.{}.{}.{}'.format(node_id // 65536, node_id // 256 % 256, node_id % 256),
+                'coordinate_type': 'x' if index % 2 == 0 else 'y',
+            })
+
+        for index in range(speakers):
+            speaker_id = 'RINCON_{:06d}{:02d}'.format(room_id, index)
+            data['speakers'].append({'id': speaker_id, 'name': speaker_id, 'room_id': room_id,
+                                     'ip_address': '192.168.{}.{}'.format(room_id % 256, index)})
+
+    with open(str(path), 'w') as file:
+        json.dump(data, file)
+
+
+def measure(label: str, lookup: callable, values: list) -> None:
+    """Measures and prints the lookup of the given values.
+
+    :param str label: Label of the measurement
+    :param callable lookup: Lookup function
+    :param list values: Values to look up
+    """
+    started_at = perf_counter()
+    for value in values:
+        if lookup(value) is None:
+            raise RuntimeError('{} could not be found'.format(value))
+    duration = perf_counter() - started_at
+
+    print('  {:28s} {:10.2f} us/lookup'.format(label, duration / len(values) * 1e6))
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--nodes', type=int, default=4, help='nodes per room')
+    parser.add_argument('--speakers', type=int, default=6, help='speakers per room')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as directory:
+        path = Path(directory) / 'config.json'
+        generate_config(path, args.rooms, args.nodes, args.speakers)
+
+        started_at = perf_counter()
+        config = Config(path)
+        print('{} rooms, {} nodes, {} speakers loaded in {:.1f} ms'.format(
+            len(config.rooms), len(config.nodes), len(config.speakers),
+            (perf_counter() - started_at) * 1000))
+
+    random = Random(0)
+    ip_addresses = [random.choice(config.nodes).ip_address for _ in range(LOOKUPS)]
+    hostnames = [random.choice(config.nodes).hostname for _ in range(LOOKUPS)]
+    room_ids = [random.choice(config.rooms).room_id for _ in range(LOOKUPS)]
+    speaker_ids = [random.choice(config.speakers).speaker_id for _ in range(LOOKUPS)]
+
+    print('indexed')
+    measure('get_node_by_ip', config.node_repository.get_node_by_ip, ip_addresses)
+    measure('get_node_by_hostname', config.node_repository.get_node_by_hostname, hostnames)
+    measure('get_room', config.room_repository.get_room, room_ids)
+    measure('get_speaker', config.speaker_repository.get_speaker, speaker_ids)
+
+    print('linear scan')
+    measure('node by ip', lambda value: next(filter(
+        lambda n: n.ip_address == value, config.nodes), None), ip_addresses[:LOOKUPS // 10])
+    measure('node by hostname', lambda value: next(filter(
+        lambda n: n.hostname == value, config.nodes), None), hostnames[:LOOKUPS // 10])
+    measure('room', lambda value: next(filter(
+        lambda r: r.room_id == value, config.rooms), None), room_ids[:LOOKUPS // 10])
+    measure('speaker', lambda value: next(filter(
+        lambda s: s.speaker_id == value, config.speakers), None), speaker_ids[:LOOKUPS // 10])
+
+
+if __name__ == '__main__':
+    main()
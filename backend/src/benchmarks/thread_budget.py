@@ -0,0 +1,145 @@
+"""Benchmark of the detection latency with and without the thread budget.
+
+Runs a HOG detector process next to processes that simulate the camera (undistortion) and the
+main process (JPEG encoding for the stream) and reports the distribution of the detection time.
+
+Usage: python -m benchmarks.thread_budget [--frames 200] [--cpu-count 4]
+"""
+
+from argparse import ArgumentParser
+from multiprocessing import Process, Queue, Event
+from statistics import mean, pstdev
+from time import perf_counter
+import numpy as np
+import cv2
+from tracking.thread_budget import ThreadBudget
+
+FRAME_SIZE = (640, 480)
+
+
+def synthetic_frame() -> np.ndarray:
+    """Returns a noisy frame with some structure for the detectors to work on.
+
+    :returns: Color frame
+    :rtype: numpy.ndarray
+    """
+    random = np.random.default_rng(0)
+    frame = random.integers(0, 255, (FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+    cv2.rectangle(frame, (250, 100), (330, 400), (30, 30, 30), -1)
+    return frame
+
+
+def apply_budget(thread_budget: ThreadBudget, role: str) -> None:
+    """Applies the budget of the given role if a budget is used.
+
+    :param ThreadBudget thread_budget: Budget or None
+    :param str role: Role of the current process
+    """
+    if thread_budget is not None:
+        thread_budget.apply(role)
+
+
+def run_detector(thread_budget: ThreadBudget, frames: int, results: Queue) -> None:
+    """Detects people in the synthetic frame and reports the detection times.
+
+    :param ThreadBudget thread_budget: Budget or None
+    :param int frames: Number of frames to process
+    :param Queue results: Receives the list of detection times
+    """
+    apply_budget(thread_budget, 'detector')
+    hog = cv2.HOGDescriptor()
+    hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    frame = cv2.cvtColor(synthetic_frame(), cv2.COLOR_BGR2GRAY)
+    durations = []
+
+    for _ in range(frames):
+        started_at = perf_counter()
+        hog.detectMultiScale(frame, winStride=(3, 3), padding=(8, 8), scale=1.2)
+        durations.append(perf_counter() - started_at)
+
+    results.put(durations)
+
+
+def run_camera(thread_budget: ThreadBudget, stop: Event) -> None:
+    """Simulates the camera process by undistorting frames until stopped.
+
+    :param ThreadBudget thread_budget: Budget or None
+    :param Event stop: Stops the simulation
+    """
+    apply_budget(thread_budget, 'camera')
+    frame = synthetic_frame()
+    matrix = np.array([[600.0, 0, FRAME_SIZE[0] / 2], [0, 600.0, FRAME_SIZE[1] / 2], [0, 0, 1]])
+    distortion = np.array([-0.3, 0.1, 0, 0, 0])
+    map_x, map_y = cv2.initUndistortRectifyMap(matrix, distortion, None, matrix, FRAME_SIZE,
+                                               cv2.CV_16SC2)
+    dst = np.empty_like(frame)
+
+    while not stop.is_set():
+        cv2.remap(frame, map_x, map_y, cv2.INTER_LINEAR, dst=dst)
+
+
+def run_main(thread_budget: ThreadBudget, stop: Event) -> None:
+    """Simulates the main process by encoding stream frames until stopped.
+
+    :param ThreadBudget thread_budget: Budget or None
+    :param Event stop: Stops the simulation
+    """
+    apply_budget(thread_budget, 'main')
+    frame = synthetic_frame()
+
+    while not stop.is_set():
+        cv2.imencode('.jpg', frame)
+
+
+def run(thread_budget: ThreadBudget, frames: int) -> list:
+    """Runs the simulated processes and returns the detection times.
+
+    :param ThreadBudget thread_budget: Budget or None
+    :param int frames: Number of frames to detect
+    :returns: Detection times in seconds
+    :rtype: list
+    """
+    stop = Event()
+    results = Queue()
+    load = [Process(target=run_camera, args=(thread_budget, stop)),
+            Process(target=run_main, args=(thread_budget, stop))]
+    detector = Process(target=run_detector, args=(thread_budget, frames, results))
+
+    for process in load + [detector]:
+        process.start()
+
+    durations = results.get()
+    stop.set()
+    for process in load + [detector]:
+        process.join()
+
+    return durations
+
+
+def report(name: str, durations: list) -> None:
+    """Prints the distribution of the detection times.
+
+    :param str name: Name of the configuration
+    :param list durations: Detection times in seconds
+    """
+    durations = sorted(duration * 1000 for duration in durations)
+    print('{:10s} mean {:7.2f} ms  stdev {:6.2f} ms  p50 {:7.2f} ms  p95 {:7.2f} ms  '
+          'max {:7.2f} ms'.format(name, mean(durations), pstdev(durations),
+                                  durations[len(durations) // 2],
+                                  durations[int(len(durations) * 0.95)], durations[-1]))
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--cpu-count', type=int, default=None,
+                        help='number of cores the budget is calculated for')
+    args = parser.parse_args()
+
+    report('default', run(None, args.frames))
+    report('budget', run(ThreadBudget(cpu_count=args.cpu_count), args.frames))
+
+
+if __name__ == '__main__':
+    main()
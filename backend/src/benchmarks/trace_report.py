@@ -0,0 +1,81 @@
+"""Analyses the trace files recorded by the master.
+
+Reports the rate of position updates, volume calculations, commands and confirmations per room,
+the latency from a position update to the resulting volume command and the latency from a
+volume command to its confirmation by the speakers.
+
+Usage: python -m benchmarks.trace_report [--path assets/traces] [trace files...]
+"""
+
+from argparse import ArgumentParser
+from collections import defaultdict
+from pathlib import Path
+from metrics.trace import TRACES_PATH, KINDS, list_traces, read_trace
+
+
+def percentiles(latencies: list) -> str:
+    """Formats the distribution of the given latencies.
+
+    :param list latencies: Latencies in seconds
+    :returns: Formatted distribution
+    :rtype: str
+    """
+    if len(latencies) == 0:
+        return 'no samples'
+
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return '{} samples  p50 {:8.1f} ms  p95 {:8.1f} ms  max {:8.1f} ms'.format(
+        len(latencies), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)],
+        latencies[-1])
+
+
+def main() -> None:
+    """Runs the analysis."""
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--path', type=Path, default=TRACES_PATH)
+    parser.add_argument('files', type=Path, nargs='*')
+    args = parser.parse_args()
+
+    counts = defaultdict(lambda: defaultdict(int))
+    first_at = {}
+    last_at = {}
+    last_position_at = {}
+    pending_commands = {}
+    position_latencies = defaultdict(list)
+    confirmation_latencies = defaultdict(list)
+
+    for trace_file in args.files or list_traces(args.path):
+        for timestamp, kind, room_id, _, _ in read_trace(trace_file):
+            counts[room_id][kind] += 1
+            first_at.setdefault(room_id, timestamp)
+            last_at[room_id] = timestamp
+
+            if kind == 'position':
+                last_position_at[room_id] = timestamp
+            elif kind == 'command':
+                if room_id in last_position_at:
+                    position_latencies[room_id].append(timestamp - last_position_at[room_id])
+                pending_commands[room_id] = timestamp
+            elif kind == 'confirmation' and room_id in pending_commands:
+                confirmation_latencies[room_id].append(timestamp -
+                                                       pending_commands.pop(room_id))
+
+    if len(counts) == 0:
+        print('No trace records found')
+        return
+
+    for room_id in sorted(counts):
+        duration = max(last_at[room_id] - first_at[room_id], 1e-6)
+        print('room {} ({:.0f} s)'.format(room_id, duration))
+
+        for kind in KINDS.values():
+            print('  {:13s} {:8d} records  {:8.2f} /s'.format(
+                kind, counts[room_id][kind], counts[room_id][kind] / duration))
+
+        print('  position -> command       {}'.format(percentiles(position_latencies[room_id])))
+        print('  command -> confirmation   {}'.format(
+            percentiles(confirmation_latencies[room_id])))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from repositories.node import NodeRepository
 from repositories.speaker import SpeakerRepository
 from repositories.settings import SettingsRepository
 from repositories.tracking import TrackingRepository
+from tracking.camera_source import CameraSource
 from .node_type import NodeType
 
 
@@ -32,6 +33,12 @@ class Config:
         self.rooms: List[Room] = []
         self.nodes: List[Node] = []
         self.speakers: List[Speaker] = []
+        self.thread_budget: dict = {}
+        self.pipeline: dict = {}
+        self.recorder: dict = {}
+        self.fusion: dict = {}
+        self.position_updates: dict = {}
+        self.cameras: List[CameraSource] = [CameraSource()]
         self.room_repository = RoomRepository(self)
         self.node_repository = NodeRepository(self)
         self.speaker_repository = SpeakerRepository(self)
@@ -59,6 +66,15 @@ class Config:
     def load(self) -> None:
         """Loads the configuration file and parses it into class attributes."""
         self.type = NodeType[self.data.get('type').upper()]
+        self.thread_budget = self.data.get('thread_budget', {})
+        self.pipeline = self.data.get('pipeline', {})
+        self.recorder = self.data.get('recorder', {})
+        self.fusion = self.data.get('fusion', {})
+        self.position_updates = self.data.get('position_updates', {})
+
+        # load cameras attached to this node
+        if self.data.get('cameras'):
+            self.cameras = list(map(CameraSource.from_json, self.data.get('cameras')))
 
         # load rooms
         for room_data in self.data.get('rooms'):
@@ -89,6 +105,24 @@ class Config:
                                              self.speakers)))),
         }
 
+        if self.thread_budget:
+            data['thread_budget'] = self.thread_budget
+
+        if self.pipeline:
+            data['pipeline'] = self.pipeline
+
+        if self.recorder:
+            data['recorder'] = self.recorder
+
+        if self.fusion:
+            data['fusion'] = self.fusion
+
+        if self.position_updates:
+            data['position_updates'] = self.position_updates
+
+        if len(self.cameras) > 1 or self.cameras[0].axis is not None:
+            data['cameras'] = list(map(lambda camera: camera.to_json(), self.cameras))
+
         with open(str(self.path), 'w') as file:
             json.dump(data, file, indent=4)
 
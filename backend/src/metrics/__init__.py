@@ -0,0 +1,7 @@
+"""The metrics module collects runtime metrics and exposes them in the Prometheus text format."""
+
+from .registry import Registry, Counter, Gauge, Histogram
+from .trace import TraceLog
+
+REGISTRY = Registry()
+TRACE = TraceLog()
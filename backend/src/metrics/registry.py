@@ -0,0 +1,310 @@
+"""Implements counters, gauges and histograms which are cheap enough to record in every frame.
+
+Values are stored in shared memory without any lock. Metrics created before the tracking
+processes are started will therefore be visible in the main process as well. Each metric (and
+each labeled child) should only be written by a single process.
+"""
+
+from bisect import bisect_left
+from multiprocessing.sharedctypes import RawArray
+from typing import Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def escape_label_value(value: str) -> str:
+    """Escapes a label value for the Prometheus text format.
+
+    :param str value: Label value
+    :returns: Escaped label value
+    :rtype: str
+    """
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    """Formats a sample value for the Prometheus text format.
+
+    :param float value: Sample value
+    :returns: Formatted value
+    :rtype: str
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """Base class of all metric types.
+
+    :param str name: Name of the metric
+    :param str documentation: Help text of the metric
+    :param tuple label_names: Names of the labels. If set, values are recorded on the children
+                              returned by `labels`.
+    """
+
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.children: Dict[Tuple[str, ...], Metric] = {}
+        self.values = RawArray('d', self.value_count()) if len(self.label_names) == 0 else None
+
+    def value_count(self) -> int:  # pylint: disable=no-self-use
+        """Returns the number of values stored for this metric.
+
+        :returns: Number of values
+        :rtype: int
+        """
+        return 1
+
+    def create_child(self):
+        """Creates a new unlabeled metric of the same type.
+
+        :returns: Child metric
+        :rtype: Metric
+        """
+        return self.__class__(self.name, self.documentation)
+
+    def labels(self, *label_values):
+        """Returns the child metric for the given label values. Children created after the tracking
+        processes have been started are only visible within the process that created them.
+
+        :param label_values: One value for each label name
+        :returns: Child metric
+        :rtype: Metric
+        """
+        key = tuple(str(value) for value in label_values)
+        child = self.children.get(key)
+
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError('Metric {} expects the labels {}'.format(self.name,
+                                                                       self.label_names))
+            child = self.create_child()
+            self.children[key] = child
+
+        return child
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Returns the samples of this metric (without labels).
+
+        :returns: List of (suffix, extra labels, value)
+        :rtype: List[Tuple[str, str, float]]
+        """
+        return [('', '', self.values[0])]
+
+    def render(self) -> str:
+        """Renders the metric in the Prometheus text format.
+
+        :returns: Rendered metric
+        :rtype: str
+        """
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.TYPE),
+        ]
+
+        if len(self.label_names) == 0:
+            metrics = [('', self)]
+        else:
+            metrics = []
+            for key, child in list(self.children.items()):
+                labels = ','.join('{}="{}"'.format(name, escape_label_value(value))
+                                  for name, value in zip(self.label_names, key))
+                metrics.append((labels, child))
+
+        for labels, metric in metrics:
+            for suffix, extra_labels, value in metric.samples():
+                all_labels = ','.join(filter(None, (labels, extra_labels)))
+                lines.append('{}{}{} {}'.format(self.name, suffix,
+                                                '{' + all_labels + '}' if all_labels else '',
+                                                format_value(value)))
+
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A counter which can only go up."""
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increments the counter.
+
+        :param float amount: Amount to add
+        """
+        self.values[0] += amount
+
+    def get(self) -> float:
+        """Returns the current value.
+
+        :returns: Current value
+        :rtype: float
+        """
+        return self.values[0]
+
+
+class Gauge(Metric):
+    """A value which can go up and down."""
+
+    TYPE = 'gauge'
+
+    def set(self, value: float) -> None:
+        """Sets the gauge to the given value.
+
+        :param float value: New value
+        """
+        self.values[0] = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increments the gauge.
+
+        :param float amount: Amount to add
+        """
+        self.values[0] += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrements the gauge.
+
+        :param float amount: Amount to subtract
+        """
+        self.values[0] -= amount
+
+    def get(self) -> float:
+        """Returns the current value.
+
+        :returns: Current value
+        :rtype: float
+        """
+        return self.values[0]
+
+
+class Histogram(Metric):
+    """Counts observations in configurable buckets.
+
+    :param str name: Name of the metric
+    :param str documentation: Help text of the metric
+    :param tuple label_names: Names of the labels
+    :param tuple buckets: Upper bounds of the buckets in ascending order
+    """
+
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names)
+
+    def value_count(self) -> int:
+        """Returns the number of values stored for this histogram.
+
+        :returns: One value per bucket, one for +Inf, the sum and the count
+        :rtype: int
+        """
+        return len(self.buckets) + 3
+
+    def create_child(self):
+        """Creates a new unlabeled histogram with the same buckets.
+
+        :returns: Child histogram
+        :rtype: Histogram
+        """
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Records an observation.
+
+        :param float value: Observed value
+        """
+        values = self.values
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Returns the cumulative bucket samples, the sum and the count.
+
+        :returns: List of (suffix, extra labels, value)
+        :rtype: List[Tuple[str, str, float]]
+        """
+        values = self.values[:]
+        samples = []
+        cumulative = 0.0
+
+        for index, bound in enumerate(self.buckets + (float('inf'),)):
+            cumulative += values[index]
+            samples.append(('_bucket', 'le="{}"'.format(format_value(float(bound))), cumulative))
+
+        samples.append(('_sum', '', values[-2]))
+        samples.append(('_count', '', values[-1]))
+
+        return samples
+
+
+class Registry:
+    """Holds all metrics and renders them."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Registers a new metric.
+
+        :param Metric metric: Metric
+        :returns: The registered metric
+        :rtype: Metric
+        """
+        if metric.name in self.metrics:
+            raise ValueError('Metric {} is already registered'.format(metric.name))
+
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) \
+            -> Counter:
+        """Creates and registers a new counter.
+
+        :param str name: Name of the metric
+        :param str documentation: Help text of the metric
+        :param tuple label_names: Names of the labels
+        :returns: Counter
+        :rtype: Counter
+        """
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Gauge:
+        """Creates and registers a new gauge.
+
+        :param str name: Name of the metric
+        :param str documentation: Help text of the metric
+        :param tuple label_names: Names of the labels
+        :returns: Gauge
+        :rtype: Gauge
+        """
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Creates and registers a new histogram.
+
+        :param str name: Name of the metric
+        :param str documentation: Help text of the metric
+        :param tuple label_names: Names of the labels
+        :param tuple buckets: Upper bounds of the buckets
+        :returns: Histogram
+        :rtype: Histogram
+        """
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text format.
+
+        :returns: Rendered metrics
+        :rtype: str
+        """
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
@@ -0,0 +1,196 @@
+"""Records the coordinates and balancing decisions of the master in a compact binary log."""
+
+import mmap
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import time
+from typing import Iterator, List, Tuple
+
+TRACES_PATH: Path = (Path(__file__).resolve().parent / '..' / '..' / 'assets' /
+                     'traces').resolve()
+# time, kind, number of values, room id, source id (node or speaker count) and the values
+RECORD = struct.Struct('<dBBHH9h')
+MAX_VALUES = 9
+MISSING = -32768  # value of an axis which is not contained in a position update
+MIN_VALUE = -32767  # values are clamped to the packed range, keeping MISSING distinguishable
+MAX_VALUE = 32767
+MAX_ID = 65535
+FILE_RECORDS = 262144  # 8 MB per file, a new file is started once it is full
+RETENTION_DAYS = 7
+
+POSITION = 1
+VOLUMES = 2
+COMMAND = 3
+CONFIRMATION = 4
+KINDS = {
+    POSITION: 'position',
+    VOLUMES: 'volumes',
+    COMMAND: 'command',
+    CONFIRMATION: 'confirmation',
+}
+
+
+class TraceLog:
+    """Records the coordinates and balancing decisions of the master in a compact binary log.
+    The records have a fixed size and are written into a preallocated memory mapped file, so
+    writing one only packs a few values into memory. A new file is started every day and once
+    the current one is full. Files older than the retention time are deleted.
+    Nothing is recorded until the log is started.
+
+    :param Path path: Folder of the trace files
+    :param int file_records: Records per file
+    """
+
+    def __init__(self, path: Path = TRACES_PATH, file_records: int = FILE_RECORDS):
+        self.path = path
+        self.file_records = file_records
+        self.file = None
+        self.buffer = None
+        self.offset = 0
+        self.rotate_at = 0.0
+
+    def start(self) -> None:
+        """Starts recording."""
+        if self.buffer is None:
+            print('[Trace] Recording traces to {}'.format(self.path))
+            self.open()
+
+    def stop(self) -> None:
+        """Stops recording and truncates the current file to the written records."""
+        if self.buffer is not None:
+            self.buffer.flush()
+            self.buffer.close()
+            self.file.truncate(self.offset)
+            self.file.close()
+            self.buffer = None
+            self.file = None
+
+    def open(self) -> None:
+        """Opens a new trace file and deletes the outdated ones."""
+        now = datetime.now()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.delete_outdated(now)
+
+        file_name = self.path / 'trace-{}.bin'.format(now.strftime('%Y%m%d-%H%M%S-%f'))
+        self.file = open(file_name, 'w+b')
+        self.file.truncate(self.file_records * RECORD.size)
+        self.buffer = mmap.mmap(self.file.fileno(), self.file_records * RECORD.size)
+        self.offset = 0
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.rotate_at = tomorrow.timestamp()
+
+    def delete_outdated(self, now: datetime) -> None:
+        """Deletes the trace files older than the retention time.
+
+        :param datetime now: Current time
+        """
+        oldest = 'trace-{}'.format((now - timedelta(days=RETENTION_DAYS)).strftime('%Y%m%d'))
+
+        for trace_file in list_traces(self.path):
+            if trace_file.name < oldest:
+                trace_file.unlink()
+
+    def record(self, kind: int, room_id: int, source_id: int, values: List[int]) -> None:
+        """Appends a record to the log.
+
+        :param int kind: Kind of the record
+        :param int room_id: Id of the room
+        :param int source_id: Id of the node for positions, otherwise the number of speakers
+        :param list values: Up to nine values, further ones are dropped. Values outside of the
+                            16 bit range are clamped.
+        """
+        if self.buffer is None:
+            return
+
+        timestamp = time()
+        if timestamp >= self.rotate_at or self.offset >= len(self.buffer):
+            self.stop()
+            self.open()
+
+        count = min(len(values), MAX_VALUES)
+        # the received coordinates are unsigned 32 bit integers and must not break the recording
+        padded = [value if value == MISSING else clamp(value, MIN_VALUE, MAX_VALUE)
+                  for value in values[:count]] + [0] * (MAX_VALUES - count)
+        RECORD.pack_into(self.buffer, self.offset, timestamp, kind, count,
+                         clamp(room_id or 0, 0, MAX_ID), clamp(source_id or 0, 0, MAX_ID),
+                         *padded)
+        self.offset += RECORD.size
+
+    def position(self, room_id: int, node_id: int, coordinate_x: int, coordinate_y: int) -> None:
+        """Records a received position update.
+
+        :param int room_id: Id of the room of the node
+        :param int node_id: Id of the node
+        :param int coordinate_x: X coordinate or None if not contained in the update
+        :param int coordinate_y: Y coordinate or None if not contained in the update
+        """
+        self.record(POSITION, room_id, node_id, [
+            MISSING if coordinate_x is None else coordinate_x,
+            MISSING if coordinate_y is None else coordinate_y,
+        ])
+
+    def volumes(self, room_id: int, volumes: List[int]) -> None:
+        """Records the volumes calculated for the speakers of a room.
+
+        :param int room_id: Id of the room
+        :param list volumes: Volume per speaker
+        """
+        self.record(VOLUMES, room_id, len(volumes), volumes)
+
+    def command(self, room_id: int, volumes: List[int]) -> None:
+        """Records a volume command sent to the speakers of a room.
+
+        :param int room_id: Id of the room
+        :param list volumes: Volume per speaker
+        """
+        self.record(COMMAND, room_id, len(volumes), volumes)
+
+    def confirmation(self, room_id: int, volume: int) -> None:
+        """Records a volume change confirmed by a speaker.
+
+        :param int room_id: Id of the room
+        :param int volume: Confirmed volume of the coordinator
+        """
+        self.record(CONFIRMATION, room_id, 1, [volume])
+
+
+def clamp(value: int, minimum: int, maximum: int) -> int:
+    """Limits a value to the given range.
+
+    :param int value: Value
+    :param int minimum: Smallest allowed value
+    :param int maximum: Largest allowed value
+    :returns: Clamped value
+    :rtype: int
+    """
+    return min(max(int(value), minimum), maximum)
+
+
+def list_traces(path: Path = TRACES_PATH) -> List[Path]:
+    """Returns all trace files, starting with the oldest one.
+
+    :param Path path: Folder of the trace files
+    :returns: Trace files
+    :rtype: list
+    """
+    return sorted(path.glob('trace-*.bin'))
+
+
+def read_trace(trace_file: Path) -> Iterator[Tuple[float, str, int, int, List[int]]]:
+    """Reads the records of a trace file.
+
+    :param Path trace_file: Trace file
+    :returns: Time, kind, room id, source id and values of each record
+    :rtype: Iterator[Tuple[float, str, int, int, List[int]]]
+    """
+    with open(trace_file, 'rb') as input_file:
+        data = input_file.read()
+
+    for timestamp, kind, count, room_id, source_id, *values in RECORD.iter_unpack(
+            data[:len(data) - len(data) % RECORD.size]):
+        # the preallocated part of a file which is still written contains zeros
+        if timestamp == 0:
+            break
+
+        yield timestamp, KINDS.get(kind, str(kind)), room_id, source_id, values[:count]
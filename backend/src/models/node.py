@@ -30,6 +30,12 @@ class Node:
         self.detector = detector
         self.coordinate_type = coordinate_type
         self.acquired: bool = False
+        # last decision of the node's governor, if it had to step down
+        self.governor: dict = None
+        # sequence number and capture time of the last applied position update
+        self.position_sequence: int = 0
+        self.position_session: int = 0
+        self.position_capture_time: float = 0.0
 
     def has_coordinate_type(self) -> bool:
         """Returns if the node has a coordinate type set.
@@ -88,4 +94,7 @@ class Node:
         if live:
             json['online'] = self.online
 
+            if self.governor is not None:
+                json['governor'] = self.governor
+
         return json
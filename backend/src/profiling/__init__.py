@@ -0,0 +1,4 @@
+"""The profiling module implements a sampling profiler that can be started on demand."""
+
+from .sampler import Sampler, PROFILES_PATH, profile_file_name, start_profile, \
+    start_profile_listener
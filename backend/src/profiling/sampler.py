@@ -0,0 +1,138 @@
+"""Sampling profiler which periodically records the stacks of all threads of the current process."""
+
+from collections import Counter
+from pathlib import Path
+from threading import Thread, get_ident, enumerate as enumerate_threads
+from time import perf_counter, sleep, time
+from types import FrameType
+from uuid import uuid4
+import sys
+
+PROFILES_PATH: Path = (Path(__file__).resolve().parent / '..' / '..' / 'assets' /
+                       'profiles').resolve()
+DEFAULT_INTERVAL = 0.01
+
+
+class Sampler:
+    """Sampling profiler which periodically records the stacks of all threads of the current
+    process. The result is written in the collapsed stack format, which can be turned into a flame
+    graph by tools like `flamegraph.pl` or speedscope.
+
+    :param float interval: Time in seconds between two samples
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+
+    @staticmethod
+    def collapse(frame: FrameType) -> str:
+        """Converts a frame and its parents into a single collapsed stack line.
+
+        :param types.FrameType frame: Innermost frame
+        :returns: Frames separated by `;`, starting with the outermost one
+        :rtype: str
+        """
+        names = []
+
+        while frame is not None:
+            code = frame.f_code
+            names.append('{} ({}:{})'.format(code.co_name, Path(code.co_filename).name,
+                                             code.co_firstlineno))
+            frame = frame.f_back
+
+        return ';'.join(reversed(names))
+
+    def sample(self, duration: float) -> Counter:
+        """Samples the stacks of all other threads for the given duration.
+
+        :param float duration: Duration in seconds
+        :returns: Number of samples per collapsed stack
+        :rtype: collections.Counter
+        """
+        own_thread = get_ident()
+        ends_at = perf_counter() + duration
+
+        while perf_counter() < ends_at:
+            thread_names = {thread.ident: thread.name for thread in enumerate_threads()}
+
+            for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if thread_id == own_thread:
+                    continue
+
+                thread_name = thread_names.get(thread_id, str(thread_id))
+                self.stacks[thread_name + ';' + self.collapse(frame)] += 1
+
+            sleep(self.interval)
+
+        return self.stacks
+
+    def write(self, file_name: str) -> Path:
+        """Writes the recorded stacks to a file in the profiles folder.
+
+        :param str file_name: Name of the file
+        :returns: Path of the written file
+        :rtype: pathlib.Path
+        """
+        PROFILES_PATH.mkdir(parents=True, exist_ok=True)
+        path = PROFILES_PATH / file_name
+        temporary_path = PROFILES_PATH / (file_name + '.tmp')
+
+        with open(temporary_path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write('{} {}\n'.format(stack, count))
+
+        # rename at the end so readers never see a partially written profile
+        temporary_path.replace(path)
+
+        return path
+
+
+def profile_file_name(process: str) -> str:
+    """Returns a unique name for the result file of a profile, so concurrent profiles of the same
+    or of different processes never overwrite each other.
+
+    :param str process: Name of the profiled process
+    :returns: File name
+    :rtype: str
+    """
+    return '{}-{}-{}.txt'.format(process, int(time()), uuid4().hex[:8])
+
+
+def profile(duration: float, file_name: str) -> None:
+    """Profiles the current process and writes the result into the profiles folder.
+
+    :param float duration: Duration in seconds
+    :param str file_name: Name of the result file
+    """
+    print('[Profiling] Sampling for {}s into {}'.format(duration, file_name))
+    sampler = Sampler()
+    sampler.sample(duration)
+    sampler.write(file_name)
+
+
+def start_profile(duration: float, file_name: str) -> None:
+    """Starts profiling the current process in a background thread.
+
+    :param float duration: Duration in seconds
+    :param str file_name: Name of the result file
+    """
+    Thread(target=profile, args=(duration, file_name), name='profiler', daemon=True).start()
+
+
+def listen(requests) -> None:
+    """Waits for profiling requests and handles them one after another.
+
+    :param multiprocessing.Queue requests: Queue receiving (duration, file_name) tuples
+    """
+    while True:
+        duration, file_name = requests.get()
+        profile(duration, file_name)
+
+
+def start_profile_listener(requests) -> None:
+    """Starts a background thread that profiles the current process on request.
+
+    :param multiprocessing.Queue requests: Queue receiving (duration, file_name) tuples
+    """
+    Thread(target=listen, args=(requests,), name='profiler', daemon=True).start()
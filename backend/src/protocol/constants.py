@@ -1,9 +1,22 @@
 """Constants for the cluster protocol."""
 
 APP: int = 828369
-VERSION: int = 1
+VERSION: int = 3
+# nodes with an older version do not send keep-alives every heartbeat interval
+HEARTBEAT_VERSION: int = 2
+# masters with an older version fetch the calibration images from the assets of the slave
+CALIBRATION_IMAGE_VERSION: int = 3
+# bytes of a calibration image per message, so every chunk fits into a single datagram
+CALIBRATION_IMAGE_CHUNK_SIZE: int = 1200
+# larger images are not sent, the master only fetches them from the assets of the slave
+CALIBRATION_IMAGE_MAX_SIZE: int = 1024 * 1024
+CALIBRATION_IMAGE_MAX_CHUNKS: int = CALIBRATION_IMAGE_MAX_SIZE // CALIBRATION_IMAGE_CHUNK_SIZE + 1
+# chunks sent at once before the receiver gets time to empty its socket buffer
+CALIBRATION_IMAGE_BURST: int = 32
+CALIBRATION_IMAGE_BURST_INTERVAL: float = 0.005
 PORT: int = 5605
 NODE_AVAILABILITY_CHECK_INTERVAL: int = 35
 MASTER_AVAILABILITY_CHECK_INTERVAL: int = 65
-MASTER_PING_INTERVAL: int = 60
+CLOCK_SYNC_INTERVAL: int = 60
 SLAVE_PING_INTERVAL: int = 15
+HEARTBEAT_INTERVAL: float = 1.0
@@ -0,0 +1,103 @@
+"""Phi accrual failure detector for the nodes of the cluster."""
+
+from collections import deque
+from math import exp, log10, sqrt
+from time import monotonic
+from .constants import HEARTBEAT_INTERVAL
+
+PHI_THRESHOLD = 8.0  # suspicion level at which a node is considered to have failed
+MIN_STD_DEVIATION = 0.5  # seconds, so a few lost datagrams on a steady stream are tolerated
+HEARTBEAT_WINDOW = 100  # intervals the distribution is estimated from
+
+
+class PhiAccrualFailureDetector:
+    """Estimates how likely it is that a node has failed from the intervals between the messages
+    received from it.
+    Instead of a fixed timeout, the time since the last message is compared with the distribution
+    of the previous intervals. The suspicion level phi is the negative decimal logarithm of the
+    probability that the next message still arrives, so a phi of 8 means a chance of 1e-8.
+    As a silent node sends a keep-alive after the heartbeat interval, this interval is accepted
+    as a pause on top of the usual intervals.
+
+    :param float threshold: Phi at which the node is considered to have failed
+    :param float expected_interval: Interval assumed until the first intervals have been measured
+    :param float acceptable_pause: Pause accepted on top of the measured intervals
+    """
+
+    def __init__(self, threshold: float = PHI_THRESHOLD,
+                 expected_interval: float = HEARTBEAT_INTERVAL,
+                 acceptable_pause: float = HEARTBEAT_INTERVAL):
+        self.threshold = threshold
+        self.acceptable_pause = acceptable_pause
+        self.intervals = deque(maxlen=HEARTBEAT_WINDOW)
+        self.interval_sum = 0.0
+        self.squared_sum = 0.0
+        self.last_heartbeat = None
+
+        # start with a distribution around the expected interval
+        for interval in (expected_interval - expected_interval / 4,
+                         expected_interval + expected_interval / 4):
+            self.add_interval(interval)
+
+    def add_interval(self, interval: float) -> None:
+        """Adds a measured interval and removes the oldest one if the window is full.
+
+        :param float interval: Seconds between two messages
+        """
+        if len(self.intervals) == self.intervals.maxlen:
+            oldest = self.intervals[0]
+            self.interval_sum -= oldest
+            self.squared_sum -= oldest * oldest
+
+        self.intervals.append(interval)
+        self.interval_sum += interval
+        self.squared_sum += interval * interval
+
+    def heartbeat(self, now: float = None) -> None:
+        """Records a message received from the node.
+
+        :param float now: Monotonic time of the message, now if not specified
+        """
+        now = monotonic() if now is None else now
+
+        if self.last_heartbeat is not None:
+            self.add_interval(now - self.last_heartbeat)
+
+        self.last_heartbeat = now
+
+    def phi(self, now: float = None) -> float:
+        """Returns the current suspicion level.
+
+        :param float now: Monotonic time, now if not specified
+        :returns: Phi, 0 if no message has been received yet
+        :rtype: float
+        """
+        if self.last_heartbeat is None:
+            return 0.0
+
+        now = monotonic() if now is None else now
+        count = len(self.intervals)
+        mean = self.interval_sum / count
+        variance = max(self.squared_sum / count - mean * mean, 0.0)
+        std_deviation = max(sqrt(variance), MIN_STD_DEVIATION)
+
+        # logistic approximation of the cumulative normal distribution
+        value = (now - self.last_heartbeat - mean - self.acceptable_pause) / std_deviation
+        exponent = -value * (1.5976 + 0.070566 * value * value)
+
+        if exponent < -700:
+            # the probability is too small to be represented
+            return float('inf')
+        if exponent > 700:
+            return 0.0
+
+        return -log10(exp(exponent) / (1.0 + exp(exponent)))
+
+    def is_available(self, now: float = None) -> bool:
+        """Returns whether the node is considered to be available.
+
+        :param float now: Monotonic time, now if not specified
+        :returns: True if a message has been received and phi is below the threshold
+        :rtype: bool
+        """
+        return self.last_heartbeat is not None and self.phi(now) < self.threshold
@@ -0,0 +1,175 @@
+"""Delimits the messages of the cluster protocol within TCP streams and UDP datagrams."""
+
+from typing import List, Tuple
+from .cluster_pb2 import Wrapper
+
+FRAMING_VERSION: int = 2
+# identifies the handshake, the legacy slaves ignore it as it is not sent with the real stereo app
+HANDSHAKE_APP: int = 828370
+LEGACY_DELIMITER: bytes = '\r\n'.encode()
+MAX_FRAME_SIZE: int = 1024 * 1024
+# prefix of a datagram containing multiple length-prefixed messages, a single message always
+# starts with the app field instead
+BATCH_MAGIC: bytes = b'RSB'
+MAX_DATAGRAM_SIZE: int = 1400  # stays within the MTU, so a batch is not fragmented
+
+
+def encode_varint(value: int) -> bytes:
+    """Encodes an unsigned integer as a protobuf varint.
+
+    :param int value: Value
+    :returns: Varint
+    :rtype: bytes
+    """
+    encoded = bytearray()
+
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+
+    return bytes(encoded)
+
+
+def decode_varint(data, offset: int) -> Tuple[int, int]:
+    """Decodes a protobuf varint.
+
+    :param data: Bytes or memoryview
+    :param int offset: Position of the varint
+    :returns: Value and the position after the varint or None if the varint is incomplete
+    :rtype: (int, int)
+    """
+    value = 0
+    shift = 0
+
+    while offset < len(data):
+        byte = data[offset]
+        value |= (byte & 0x7f) << shift
+        offset += 1
+
+        if byte & 0x80 == 0:
+            return value, offset
+
+        shift += 7
+        if shift > 35:
+            raise ValueError('Invalid frame length')
+
+    return None
+
+
+def encode_frame(data: bytes) -> bytes:
+    """Prefixes a message with its length.
+
+    :param bytes data: Serialized message
+    :returns: Frame
+    :rtype: bytes
+    """
+    return encode_varint(len(data)) + data
+
+
+def handshake_message() -> bytes:
+    """Returns the handshake, which is sent by the master after connecting and answered by the
+    slave. It is terminated with the legacy delimiter, so legacy slaves read and ignore it.
+
+    :returns: Handshake including the delimiter
+    :rtype: bytes
+    """
+    hello = Wrapper()
+    hello.app = HANDSHAKE_APP
+    hello.version = FRAMING_VERSION
+
+    return hello.SerializeToString() + LEGACY_DELIMITER
+
+
+def parse_handshake(data) -> int:
+    """Returns the framing version of a handshake.
+
+    :param data: Received handshake without delimiter or length prefix
+    :returns: Framing version or None if the data is not a handshake
+    :rtype: int
+    """
+    try:
+        hello = Wrapper()
+        hello.ParseFromString(data)
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+    return hello.version if hello.app == HANDSHAKE_APP else None
+
+
+class FrameDecoder:
+    """Splits a stream of length-prefixed frames into messages.
+    The complete frames are returned as slices of the received chunk instead of copies, only an
+    incomplete frame at the end of a chunk is kept until the next one arrives.
+    """
+
+    def __init__(self):
+        self.pending = b''
+
+    def feed(self, data: bytes) -> List[memoryview]:
+        """Adds received data and returns the completed frames.
+
+        :param bytes data: Received data
+        :returns: Frames without the length prefix
+        :rtype: list
+        """
+        if len(self.pending) > 0:
+            data = self.pending + data
+
+        view = memoryview(data)
+        frames = []
+        offset = 0
+
+        while True:
+            header = decode_varint(view, offset)
+            if header is None:
+                break
+
+            length, start = header
+            if length > MAX_FRAME_SIZE:
+                raise ValueError('Frame of {} bytes exceeds the maximum size'.format(length))
+            if start + length > len(view):
+                break
+
+            frames.append(view[start:start + length])
+            offset = start + length
+
+        self.pending = bytes(view[offset:])
+        return frames
+
+
+def encode_batch(messages: List[bytes]) -> bytes:
+    """Packs multiple messages into a single datagram.
+
+    :param list messages: Serialized messages
+    :returns: Datagram
+    :rtype: bytes
+    """
+    return BATCH_MAGIC + bytes([FRAMING_VERSION]) + b''.join(map(encode_frame, messages))
+
+
+def decode_datagram(data: bytes) -> List:
+    """Returns the messages contained in a datagram.
+
+    :param bytes data: Datagram containing a single message or a batch
+    :returns: Serialized messages
+    :rtype: list
+    :raises ValueError: If the batch is truncated or of a newer framing version
+    """
+    if not data.startswith(BATCH_MAGIC):
+        return [data]
+
+    if len(data) <= len(BATCH_MAGIC):
+        raise ValueError('Batch without framing version')
+
+    version = data[len(BATCH_MAGIC)]
+    if version > FRAMING_VERSION:
+        raise ValueError('Batch of unsupported framing version {}'.format(version))
+
+    decoder = FrameDecoder()
+    frames = decoder.feed(data[len(BATCH_MAGIC) + 1:])
+
+    if len(decoder.pending) > 0:
+        raise ValueError('Batch ends with an incomplete message')
+
+    return frames
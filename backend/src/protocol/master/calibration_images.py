@@ -0,0 +1,116 @@
+"""Assembles and caches the camera calibration images sent by the slaves."""
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Tuple
+from metrics import REGISTRY
+from ..constants import CALIBRATION_IMAGE_CHUNK_SIZE, CALIBRATION_IMAGE_MAX_CHUNKS
+
+MAX_CACHED_IMAGES = 16  # images kept in memory, the oldest one is removed first
+MAX_TRANSFERS = 8  # images received at once, the oldest transfer is discarded first
+TRANSFER_TIMEOUT = 10.0  # seconds until an incomplete image is discarded
+
+CALIBRATION_IMAGES = REGISTRY.counter('cluster_calibration_images_total',
+                                      'Camera calibration images received from the nodes, '
+                                      'incomplete if chunks were lost, rejected if the chunks '
+                                      'exceeded the maximum image size',
+                                      ('result',))
+
+
+class CalibrationImageTransfer:
+    """Chunks of a calibration image that is being received.
+
+    :param int chunks: Number of chunks of the image
+    """
+
+    def __init__(self, chunks: int):
+        self.chunks = [None] * chunks
+        self.missing = chunks
+        self.started_at = monotonic()
+
+    def add_chunk(self, chunk: int, data: bytes) -> bool:
+        """Adds a chunk of the image.
+
+        :param int chunk: Index of the chunk
+        :param bytes data: Data of the chunk
+        :returns: True if all chunks have been received
+        :rtype: bool
+        """
+        if self.chunks[chunk] is None:
+            self.chunks[chunk] = data
+            self.missing -= 1
+
+        return self.missing == 0
+
+    def data(self) -> bytes:
+        """Returns the assembled image.
+
+        :returns: JPEG data
+        :rtype: bytes
+        """
+        return b''.join(self.chunks)
+
+
+class CalibrationImageCache:
+    """Assembles the chunks of the calibration images sent by the slaves and keeps the latest
+    images in memory, so they can be served to the browser without fetching them from the slave.
+    The chunks arrive in unauthenticated datagrams, so the size of an image and the number of
+    images received at once are limited.
+    """
+
+    def __init__(self):
+        self.transfers: Dict[Tuple[str, str], CalibrationImageTransfer] = {}
+        self.images: OrderedDict = OrderedDict()
+
+    def add_chunk(self, address: str, image: str, chunk: int, chunks: int, data: bytes) -> None:
+        """Adds a received chunk and caches the image once it is complete.
+
+        :param str address: IP address of the slave
+        :param str image: Name of the image
+        :param int chunk: Index of the chunk
+        :param int chunks: Number of chunks of the image
+        :param bytes data: Data of the chunk
+        """
+        key = (address, image)
+        if chunks > CALIBRATION_IMAGE_MAX_CHUNKS or len(data) > CALIBRATION_IMAGE_CHUNK_SIZE:
+            CALIBRATION_IMAGES.labels('rejected').inc()
+            return
+        if chunk >= chunks or key in self.images:
+            return
+
+        if key not in self.transfers:
+            self.discard_expired()
+            if len(self.transfers) >= MAX_TRANSFERS:
+                del self.transfers[next(iter(self.transfers))]
+                CALIBRATION_IMAGES.labels('incomplete').inc()
+            self.transfers[key] = CalibrationImageTransfer(chunks)
+
+        transfer = self.transfers[key]
+        if len(transfer.chunks) != chunks or not transfer.add_chunk(chunk, data):
+            return
+
+        del self.transfers[key]
+        self.images[key] = transfer.data()
+        CALIBRATION_IMAGES.labels('complete').inc()
+
+        while len(self.images) > MAX_CACHED_IMAGES:
+            self.images.popitem(last=False)
+
+    def discard_expired(self) -> None:
+        """Discards the images whose chunks did not arrive within the transfer timeout."""
+        now = monotonic()
+
+        for key, transfer in list(self.transfers.items()):
+            if transfer.started_at + TRANSFER_TIMEOUT < now:
+                del self.transfers[key]
+                CALIBRATION_IMAGES.labels('incomplete').inc()
+
+    def get(self, address: str, image: str) -> bytes:
+        """Returns a cached image.
+
+        :param str address: IP address of the slave
+        :param str image: Name of the image
+        :returns: JPEG data or None if the image has not been received
+        :rtype: bytes
+        """
+        return self.images.get((address, image))
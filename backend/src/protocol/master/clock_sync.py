@@ -0,0 +1,113 @@
+"""Estimates the clock offsets of the slaves relative to the master."""
+
+from collections import deque
+from metrics import REGISTRY
+
+CLOCK_SAMPLES = 8  # ping exchanges used for the estimation, one exchange per ping interval
+MIN_DRIFT_SPAN = 120.0  # seconds the samples have to span until the drift is estimated
+MAX_DRIFT = 500e-6  # seconds per second, larger estimates are caused by noise
+STEP_THRESHOLD = 0.5  # seconds, larger changes of the offset mean the slave clock has been set
+
+CLOCK_OFFSET = REGISTRY.gauge('cluster_clock_offset_seconds',
+                              'Estimated offset of the clock of a node to the master clock',
+                              ('node',))
+CLOCK_DELAY = REGISTRY.gauge('cluster_clock_delay_seconds',
+                             'Round trip delay of the ping exchange used for the clock offset',
+                             ('node',))
+
+
+class ClockSync:
+    """Estimates the clock offset and drift of a single slave, similar to NTP.
+    Each sample is a ping exchange: the master sends a ping at its origin time, the slave
+    receives it at its receive time and echoes both with its transmit time in the next position
+    update, which arrives at the master at its arrival time. The sample with the lowest round
+    trip delay gives the most accurate offset, the drift is fitted over all samples.
+
+    :param str node: Label of the node in the metrics
+    :param int samples: Number of samples kept
+    """
+
+    def __init__(self, node: str = '', samples: int = CLOCK_SAMPLES):
+        self.node = node
+        # master time, offset and delay of each exchange
+        self.samples = deque(maxlen=samples)
+        # slave clock minus master clock at the reference time
+        self.offset = 0.0
+        self.reference_time = 0.0
+        self.drift = 0.0
+        self.delay = None
+
+    def is_synchronized(self) -> bool:
+        """Returns whether an offset has been estimated.
+
+        :returns: True if at least one exchange has been completed
+        :rtype: bool
+        """
+        return len(self.samples) > 0
+
+    def add_sample(self, origin_time: float, receive_time: float, transmit_time: float,
+                   arrival_time: float) -> None:
+        """Adds a completed ping exchange.
+
+        :param float origin_time: Master time at which the ping has been sent
+        :param float receive_time: Slave time at which the ping has been received
+        :param float transmit_time: Slave time at which the response has been sent
+        :param float arrival_time: Master time at which the response has been received
+        """
+        delay = (arrival_time - origin_time) - (transmit_time - receive_time)
+        if delay < 0:
+            # one of the clocks has been set during the exchange
+            return
+
+        offset = ((receive_time - origin_time) + (transmit_time - arrival_time)) / 2
+
+        if self.is_synchronized() and \
+                abs(offset - self.offset_at(arrival_time)) > STEP_THRESHOLD + delay:
+            print('[Cluster Master] Clock of {} has been set, resetting its offset'.format(
+                self.node))
+            self.samples.clear()
+
+        self.samples.append((arrival_time, offset, delay))
+        self.update()
+
+    def update(self) -> None:
+        """Updates the offset and the drift from the samples."""
+        self.reference_time, self.offset, self.delay = min(self.samples,
+                                                            key=lambda sample: sample[2])
+
+        span = self.samples[-1][0] - self.samples[0][0]
+        if len(self.samples) >= 3 and span >= MIN_DRIFT_SPAN:
+            # least squares fit of the offsets over the master time
+            count = len(self.samples)
+            mean_time = sum(sample[0] for sample in self.samples) / count
+            mean_offset = sum(sample[1] for sample in self.samples) / count
+            covariance = sum((sample[0] - mean_time) * (sample[1] - mean_offset)
+                             for sample in self.samples)
+            variance = sum((sample[0] - mean_time) ** 2 for sample in self.samples)
+            self.drift = max(-MAX_DRIFT, min(MAX_DRIFT, covariance / variance))
+        else:
+            self.drift = 0.0
+
+        CLOCK_OFFSET.labels(self.node).set(self.offset)
+        CLOCK_DELAY.labels(self.node).set(self.delay)
+
+    def offset_at(self, master_time: float) -> float:
+        """Returns the estimated offset of the slave clock at the given time.
+
+        :param float master_time: Master time
+        :returns: Slave clock minus master clock in seconds
+        :rtype: float
+        """
+        return self.offset + self.drift * (master_time - self.reference_time)
+
+    def to_master_time(self, slave_time: float) -> float:
+        """Converts a timestamp of the slave into master time.
+        The drift is a function of the master time, so the offset is not evaluated at the slave
+        time, which can be far off, but solved for the master time it corresponds to.
+
+        :param float slave_time: Slave time
+        :returns: Master time
+        :rtype: float
+        """
+        # slave_time = master_time + offset + drift * (master_time - reference_time)
+        return (slave_time - self.offset + self.drift * self.reference_time) / (1.0 + self.drift)
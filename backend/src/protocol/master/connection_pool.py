@@ -0,0 +1,211 @@
+"""Non-blocking TCP connections from the master to its slaves."""
+
+import asyncio
+from time import monotonic
+from typing import Dict, List
+from metrics import REGISTRY
+from ..constants import PORT
+from ..framing import FrameDecoder, encode_frame, handshake_message, parse_handshake, \
+    LEGACY_DELIMITER
+
+CONNECT_TIMEOUT = 3.0  # seconds until a connection attempt is given up
+SEND_TIMEOUT = 3.0  # seconds until a send to a slave that does not read is given up
+HANDSHAKE_TIMEOUT = 1.0  # seconds until a slave is assumed to only understand the legacy framing
+SEND_QUEUE_SIZE = 32  # messages per slave, the oldest one is dropped if the queue is full
+BACKOFF_BASE = 0.5  # seconds until the first reconnect, doubled on each failure
+BACKOFF_MAX = 30.0
+BREAKER_THRESHOLD = 3  # consecutive failures until the circuit opens
+BREAKER_TIMEOUT = 30.0  # seconds the messages are dropped while the circuit is open
+
+TCP_SEND_FAILURES = REGISTRY.counter('cluster_tcp_send_failures_total',
+                                     'Messages the master failed to send to a slave')
+TCP_MESSAGES_DROPPED = REGISTRY.counter('cluster_tcp_messages_dropped_total',
+                                        'Messages dropped because a send queue was full or the '
+                                        'circuit of a slave was open')
+TCP_CIRCUITS_OPEN = REGISTRY.gauge('cluster_tcp_circuits_open',
+                                   'Slaves to which no messages are sent after repeated failures')
+
+
+class SlaveConnection:
+    """Connection to a single slave with its own send queue.
+    The messages are sent by a worker task, so sending never blocks the event loop. Failed
+    connections are reopened with an exponential backoff. After repeated failures, the circuit
+    opens and messages are dropped right away until a single message is tried again after the
+    breaker timeout.
+    After connecting, a handshake determines whether the slave understands length-prefixed
+    frames. Otherwise the legacy delimiter is used. All messages queued while a write is running
+    are sent with the next write.
+
+    :param str address: IP address of the slave
+    :param int port: Port of the slave
+    """
+
+    def __init__(self, address: str, port: int = PORT):
+        self.address = address
+        self.port = port
+        self.queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.reader = None
+        self.writer = None
+        self.framed = False
+        self.failures = 0
+        self.open_until = 0.0
+        self.task = None
+
+    def is_open(self) -> bool:
+        """Returns whether the circuit is open and messages are dropped.
+
+        :returns: True if the circuit is open
+        :rtype: bool
+        """
+        return self.open_until > monotonic()
+
+    def send(self, data: bytes) -> None:
+        """Queues the given message to be sent to the slave.
+
+        :param bytes data: Serialized message
+        """
+        if self.is_open():
+            TCP_MESSAGES_DROPPED.inc()
+            return
+
+        if self.queue.full():
+            self.queue.get_nowait()
+            TCP_MESSAGES_DROPPED.inc()
+
+        self.queue.put_nowait(data)
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        """Sends the queued messages until the queue is empty."""
+        while not self.queue.empty():
+            batch = []
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            while not await self.write(batch):
+                if self.is_open():
+                    # drop everything queued until the breaker timeout is over
+                    while not self.queue.empty():
+                        self.queue.get_nowait()
+                        TCP_MESSAGES_DROPPED.inc()
+                    return
+
+                await asyncio.sleep(min(BACKOFF_BASE * 2 ** (self.failures - 1), BACKOFF_MAX))
+
+    async def write(self, batch: List[bytes]) -> bool:
+        """Writes the messages to the slave and opens the connection if necessary.
+
+        :param list batch: Serialized messages
+        :returns: True if the messages have been sent
+        :rtype: bool
+        """
+        try:
+            # the slave only writes during the handshake, so an eof means that it has closed the
+            # connection
+            if self.writer is None or self.reader.at_eof() or self.writer.is_closing():
+                self.close()
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.address, self.port), CONNECT_TIMEOUT)
+                self.framed = await self.handshake()
+
+            if self.framed:
+                self.writer.write(b''.join(map(encode_frame, batch)))
+            else:
+                self.writer.write(LEGACY_DELIMITER.join(batch) + LEGACY_DELIMITER)
+            await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as error:
+            self.on_failure(error)
+            return False
+
+        if self.failures >= BREAKER_THRESHOLD:
+            print('[Cluster Master] Connection to {} recovered'.format(self.address))
+            TCP_CIRCUITS_OPEN.dec()
+        self.failures = 0
+        return True
+
+    async def handshake(self) -> bool:
+        """Offers the length-prefixed framing to the slave.
+
+        :returns: True if the slave answered the handshake
+        :rtype: bool
+        """
+        self.writer.write(handshake_message())
+        await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+
+        try:
+            data = await asyncio.wait_for(self.reader.read(64), HANDSHAKE_TIMEOUT)
+        except asyncio.TimeoutError:
+            print('[Cluster Master] {} does not answer the handshake, using the legacy framing'
+                  .format(self.address))
+            return False
+
+        if len(data) == 0:
+            raise ConnectionResetError('Connection closed during the handshake')
+
+        frames = FrameDecoder().feed(data)
+        return len(frames) > 0 and parse_handshake(frames[0]) is not None
+
+    def on_failure(self, error: Exception) -> None:
+        """Closes the connection after a failure and opens the circuit if it failed repeatedly.
+
+        :param Exception error: Cause of the failure
+        """
+        self.close()
+        self.failures += 1
+        TCP_SEND_FAILURES.inc()
+        print('[Cluster Master] Unable to send message to {}: {}'.format(
+            self.address, str(error) or type(error).__name__))
+
+        if self.failures >= BREAKER_THRESHOLD:
+            if self.failures == BREAKER_THRESHOLD:
+                TCP_CIRCUITS_OPEN.inc()
+            self.open_until = monotonic() + BREAKER_TIMEOUT
+            print('[Cluster Master] Dropping messages to {} for {} seconds'.format(
+                self.address, BREAKER_TIMEOUT))
+
+    def close(self) -> None:
+        """Closes the connection, queued messages are kept."""
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = None
+            self.writer = None
+
+    def stop(self) -> None:
+        """Closes the connection and stops the worker."""
+        if self.task is not None:
+            self.task.cancel()
+        if self.failures >= BREAKER_THRESHOLD:
+            TCP_CIRCUITS_OPEN.dec()
+        self.close()
+
+
+class ConnectionPool:
+    """Holds one connection per slave.
+
+    :param int port: Port of the slaves
+    """
+
+    def __init__(self, port: int = PORT):
+        self.port = port
+        self.connections: Dict[str, SlaveConnection] = {}
+
+    def send(self, address: str, data: bytes) -> None:
+        """Queues the given data to be sent to a slave. The connection is opened if necessary.
+
+        :param str address: IP address of the slave
+        :param bytes data: Serialized message
+        """
+        if address not in self.connections:
+            self.connections[address] = SlaveConnection(address, self.port)
+
+        self.connections[address].send(data)
+
+    def close(self, address: str) -> None:
+        """Closes the connection to a slave, e.g. once it is offline.
+
+        :param str address: IP address of the slave
+        """
+        if address in self.connections:
+            self.connections.pop(address).stop()
@@ -1,15 +1,44 @@
 """Master for the cluster protocol."""
 
-from socket import socket, AF_INET, SOCK_STREAM, MSG_DONTWAIT, MSG_PEEK
+from time import time
+from typing import Dict
 import asyncio
 import asyncio_dgram
+from google.protobuf.message import DecodeError
 from config import Config
 from balancing.manager import BalancingManager
+from balancing.position_fusion import PositionFusion
 from networking.helpers import get_hostname
+from metrics import REGISTRY, TRACE
 from ..socket import ClusterSocket
 from ..constants import PORT
 from ..cluster_pb2 import Wrapper
+from ..framing import decode_datagram
+from ..position_throttle import PositionThrottle
 from .node_registry import NodeRegistry
+from .connection_pool import ConnectionPool
+from .clock_sync import ClockSync
+from .calibration_images import CalibrationImageCache
+
+UDP_MESSAGES_RECEIVED = REGISTRY.counter('cluster_udp_messages_received_total',
+                                         'UDP messages received by the master per node', ('node',))
+POSITION_UPDATES_DROPPED = REGISTRY.counter('cluster_position_updates_dropped_total',
+                                            'Position updates dropped because they arrived out of '
+                                            'order or repeated an applied one', ('node',))
+MALFORMED_DATAGRAMS = REGISTRY.counter('cluster_udp_malformed_datagrams_total',
+                                       'UDP datagrams or batched messages received by the master '
+                                       'which could not be decoded', ('node',))
+
+
+def is_newer_sequence(sequence: int, last_sequence: int) -> bool:
+    """Returns whether a sequence number follows the last one, allowing it to wrap around.
+
+    :param int sequence: Received sequence number
+    :param int last_sequence: Sequence number of the last applied update
+    :returns: True if the sequence number is newer
+    :rtype: bool
+    """
+    return 0 < (sequence - last_sequence) % 0x100000000 < 0x80000000
 
 
 class ClusterMaster(ClusterSocket):
@@ -23,8 +52,14 @@ class ClusterMaster(ClusterSocket):
         self.balancing_manager = balancing_manager
         self.node_registry = NodeRegistry(config, self)
         self.hostname = get_hostname()
-        self.slave_sockets = {}
+        self.connection_pool = ConnectionPool()
+        # clock of each slave by its ip address
+        self.clocks: Dict[str, ClockSync] = {}
+        self.position_fusions: Dict[int, PositionFusion] = {}
+        # time of the last message sent to each slave
+        self.last_sent: Dict[str, float] = {}
         self.camera_calibration_response_listener = None
+        self.calibration_images = CalibrationImageCache()
 
         if self.direct_slave is not None:
             self.direct_slave.direct_master = self
@@ -47,58 +82,47 @@ class ClusterMaster(ClusterSocket):
         """Run logic of the master socket."""
         while self.running:
             data, address = await self.receive_socket.recv()
-            await self.receive_message(data, address=address[0])
-
-    def get_slave_socket(self, address: str) -> None:
-        """Returns a TCP socket for the given slave.
-        If it doesn't already exist or is no longer open, a new connection will be opened.
-
-        :param str address: IP Address of the slave
-        """
-        if address not in self.slave_sockets or self.is_socket_closed(self.slave_sockets[address]):
-            slave_socket = socket(family=AF_INET, type=SOCK_STREAM)
-            slave_socket.connect((address, PORT))
-            self.slave_sockets[address] = slave_socket
 
-        return self.slave_sockets[address]
+            # a datagram contains either a single message or a batch of messages
+            try:
+                messages = decode_datagram(data)
+            except ValueError as error:
+                MALFORMED_DATAGRAMS.labels(address[0]).inc()
+                print('[Cluster] Ignoring malformed datagram from {}: {}'.format(address[0], error))
+                continue
 
-    def is_socket_closed(self, sock: socket) -> bool:  # pylint: disable=no-self-use
-        """Checks whether a socket is closed or still open.
+            for message in messages:
+                UDP_MESSAGES_RECEIVED.labels(address[0]).inc()
 
-        :param socket.socket socket: Socket to check
-        """
-        try:
-            # this will try to read bytes without blocking and also without removing
-            # them from buffer (peek only)
-            data = sock.recv(16, MSG_DONTWAIT | MSG_PEEK)
-            if len(data) == 0:
-                return True
-        except BlockingIOError:
-            # socket is open and reading from it would block
-            return False
-        except ConnectionResetError:
-            # socket was closed for some other reason
-            return True
-        except Exception as error:  # pylint: disable=broad-except
-            print('[Cluster Master] unexpected exception when checking if a socket is closed')
-            print(error)
-            return False
-        return False
+                try:
+                    await self.receive_message(message, address=address[0])
+                except DecodeError as error:
+                    MALFORMED_DATAGRAMS.labels(address[0]).inc()
+                    print('[Cluster] Ignoring malformed message from {}: {}'.format(address[0],
+                                                                                  error))
 
     def send_message(self, address: str, message: Wrapper) -> None:
         """Sends a message to the specified address.
+        The message is only queued, so a slave that is not reachable does not block the master.
 
         :param str address: IP Address of the receiver
         :param protocol.cluster_pb2.Wrapper message: Message
         """
-        try:
-            if self.direct_slave is not None and address == self.node_registry.master_ip:
-                asyncio.create_task(self.direct_slave.call_events(message, address))
-            else:
-                self.get_slave_socket(address).sendall(
-                    message.SerializeToString() + '\r\n'.encode())
-        except ConnectionRefusedError:
-            print('[Cluster Master] Unable to send message, connection refused')
+        if self.direct_slave is not None and address == self.node_registry.master_ip:
+            asyncio.create_task(self.direct_slave.call_events(message, address))
+        else:
+            self.last_sent[address] = time()
+            self.connection_pool.send(address, message.SerializeToString())
+
+    async def call_events(self, message: Wrapper, address: str) -> None:
+        """Records every received message as a sign of life of the sender before calling the
+        `on_` events.
+
+        :param protocol.cluster_pb2.Wrapper message: Received message
+        :param str address: IP address of sender
+        """
+        self.node_registry.on_message(address, message.version)
+        await super().call_events(message, address)
 
     def send_acquisition(self, address: str) -> None:
         """Sends a service acquisition message to a node.
@@ -117,8 +141,17 @@ class ClusterMaster(ClusterSocket):
                 len(node.room.people_group) > 0:
             message.serviceAcquisition.people_group = node.room.people_group
 
+        self.position_throttle().to_message(message.serviceAcquisition)
         self.send_message(address, message)
 
+    def position_throttle(self) -> PositionThrottle:
+        """Returns the limits for the position updates of the nodes defined in the config.
+
+        :returns: Position throttle
+        :rtype: protocol.position_throttle.PositionThrottle
+        """
+        return PositionThrottle.from_json(self.config.position_updates)
+
     def send_release(self, address: str) -> None:
         """Sends a service release message to a node.
 
@@ -128,13 +161,16 @@ class ClusterMaster(ClusterSocket):
         message.serviceRelease.hostname = self.hostname
         self.send_message(address, message)
 
-    def send_ping(self, address: str) -> None:
+    def send_ping(self, address: str, clock_sync: bool = True) -> None:
         """Sends a ping message to a node.
 
         :param str address: IP Address of the node
+        :param bool clock_sync: If true, the ping is used to synchronise the clock of the node
         """
         message = self.build_message()
         message.ping.hostname = self.hostname
+        if clock_sync:
+            message.ping.origin_time = time()
         self.send_message(address, message)
 
     def send_service_update(self, address: str, track: bool = None) -> None:
@@ -158,6 +194,7 @@ class ClusterMaster(ClusterSocket):
                 len(node.room.people_group) > 0:
             message.serviceUpdate.people_group = node.room.people_group
 
+        self.position_throttle().to_message(message.serviceUpdate)
         self.send_message(address, message)
 
     def send_camera_calibration_request(self, address: str, start: bool, finish: bool,
@@ -188,18 +225,107 @@ class ClusterMaster(ClusterSocket):
         await self.node_registry.on_service_announcement(message, address)
 
     async def on_position_update(self, message: Wrapper, address: str) -> None:
-        """Handle position updates. Also, record a received ping.
+        """Handle position updates.
 
         :param protocol.cluster_pb2.Wrapper message: Message
         :param str address: Sender IP
         """
-        self.node_registry.on_ping(address)
+        # the slave echoes the last ping with its first position update after it
+        if message.positionUpdate.ping_origin_time > 0:
+            if address not in self.clocks:
+                self.clocks[address] = ClockSync(address)
+            self.clocks[address].add_sample(message.positionUpdate.ping_origin_time,
+                                            message.positionUpdate.ping_receive_time,
+                                            message.positionUpdate.transmit_time, time())
 
         node = self.config.node_repository.get_node_by_ip(address)
-        if node.room is not None and node.has_coordinate_type:
+        if node.room is None or self.is_stale_position(node, message.positionUpdate):
+            return
+
+        coordinates = [None, None]
+
+        # nodes with multiple cameras report one coordinate per axis
+        if len(message.positionUpdate.axes) > 0:
+            for position in message.positionUpdate.axes:
+                coordinate_id = 0 if position.axis == 'x' else 1
+                coordinates[coordinate_id] = position.coordinate
+        elif node.has_coordinate_type():
             coordinate_id = 0 if node.coordinate_type == 'x' else 1
-            node.room.coordinates[coordinate_id] = message.positionUpdate.coordinate
-            await self.balancing_manager.balance_room(node.room)
+            coordinates[coordinate_id] = message.positionUpdate.coordinate
+        else:
+            return
+
+        TRACE.position(node.room.room_id, node.node_id, coordinates[0], coordinates[1])
+
+        # updates of older nodes do not contain a capture time
+        capture_time = time()
+        if message.positionUpdate.capture_time > 0:
+            capture_time = self.to_master_time(address, message.positionUpdate.capture_time)
+
+        await self.get_position_fusion(node.room).update(node, coordinates, capture_time)
+
+    def get_position_fusion(self, room) -> PositionFusion:
+        """Returns the position fusion of a room and creates it if necessary.
+
+        :param models.room.Room room: Room
+        :returns: Position fusion
+        :rtype: balancing.position_fusion.PositionFusion
+        """
+        fusion = self.position_fusions.get(room.room_id)
+
+        if fusion is None or fusion.room is not room:
+            fusion = PositionFusion.from_json(room, self.balancing_manager.balance_room,
+                                              self.config.fusion)
+            self.position_fusions[room.room_id] = fusion
+
+        return fusion
+
+    def to_master_time(self, address: str, timestamp: float) -> float:
+        """Converts a timestamp of a slave, e.g. a capture time, into master time.
+        Timestamps of slaves without a completed ping exchange are returned unchanged.
+
+        :param str address: IP Address of the slave
+        :param float timestamp: Unix time of the slave clock
+        :returns: Unix time of the master clock
+        :rtype: float
+        """
+        if address in self.clocks:
+            return self.clocks[address].to_master_time(timestamp)
+
+        return timestamp
+
+    def is_stale_position(self, node, update) -> bool:  # pylint: disable=no-self-use
+        """Checks whether a position update is older than the last applied one of the node.
+        Within a session of the node, updates are ordered by their sequence number only, so a
+        slave clock that is set back does not hold back its updates. The first update of a new
+        session, e.g. after a restart, is always accepted. Updates of nodes without sessions are
+        ordered by their capture time and then by their sequence number, and updates of nodes
+        without sequence numbers are always applied.
+
+        :param models.node.Node node: Sending node
+        :param protocol.cluster_pb2.PositionUpdate update: Position update
+        :returns: True if the update has to be dropped
+        :rtype: bool
+        """
+        if update.sequence == 0:
+            return False
+
+        if update.session != 0 and update.session == node.position_session:
+            stale = not is_newer_sequence(update.sequence, node.position_sequence)
+        elif update.session == 0:
+            stale = (update.capture_time, update.sequence) <= (node.position_capture_time,
+                                                               node.position_sequence)
+        else:
+            stale = False
+
+        if stale:
+            POSITION_UPDATES_DROPPED.labels(node.ip_address).inc()
+            return True
+
+        node.position_session = update.session
+        node.position_capture_time = update.capture_time
+        node.position_sequence = update.sequence
+        return False
 
     async def on_camera_calibration_response(self, message: Wrapper, address: str) -> None:
         """Handle camera calibration response.
@@ -210,7 +336,45 @@ class ClusterMaster(ClusterSocket):
         node = self.config.node_repository.get_node_by_ip(address)
         count = message.cameraCalibrationResponse.count
         image = message.cameraCalibrationResponse.image
+        status = message.cameraCalibrationResponse.status
 
         if self.camera_calibration_response_listener is not None:
             await self.camera_calibration_response_listener(  # pylint: disable=not-callable
-                node, count, image)
+                node, count, image, status)
+
+    async def on_camera_calibration_image(self, message: Wrapper, address: str) -> None:
+        """Handle a chunk of a camera calibration image.
+
+        :param protocol.cluster_pb2.Wrapper message: Message
+        :param str address: Sender IP
+        """
+        image = message.cameraCalibrationImage
+        self.calibration_images.add_chunk(address, image.image, image.chunk, image.chunks,
+                                          image.data)
+
+    async def on_governor_update(self, message: Wrapper, address: str) -> None:
+        """Handle a decision of the governor of a node.
+
+        :param protocol.cluster_pb2.Wrapper message: Message
+        :param str address: Sender IP
+        """
+        node = self.config.node_repository.get_node_by_ip(address)
+        if node is None:
+            return
+
+        update = message.governorUpdate
+        node.governor = {
+            'level': update.level,
+            'detector': update.detector,
+            'input_width': update.input_width,
+            'input_height': update.input_height,
+            'framerate': update.framerate,
+            'motion_gated': update.motion_gated,
+            'reason': update.reason,
+            'temperature': update.temperature,
+            'load': update.load,
+            'fps': update.fps,
+        }
+        print('[Cluster Master] {} governor level {} ({}): {}'.format(
+            node.hostname, update.level, update.reason, update.detector))
+        await self.config.node_repository.call_listeners()
@@ -1,11 +1,18 @@
 """Holds information about all available nodes and their state."""
-from time import time
+from time import monotonic, time
+from typing import Dict
 import asyncio
 from config import Config
+from metrics import REGISTRY
 from models.node import Node
 from networking.helpers import get_hostname, get_ip_address
-from ..constants import MASTER_PING_INTERVAL, NODE_AVAILABILITY_CHECK_INTERVAL
+from ..constants import CLOCK_SYNC_INTERVAL, HEARTBEAT_INTERVAL, HEARTBEAT_VERSION, \
+    NODE_AVAILABILITY_CHECK_INTERVAL
 from ..cluster_pb2 import Wrapper
+from ..failure_detector import PhiAccrualFailureDetector
+
+NODE_PHI = REGISTRY.gauge('cluster_node_phi', 'Suspicion level of the failure detector per node',
+                          ('node',))
 
 
 class NodeRegistry:
@@ -19,7 +26,10 @@ class NodeRegistry:
         self.running = True
         self.config = config
         self.master = master
-        self.last_pings = {}
+        # failure detector and protocol version of each node by its ip address
+        self.detectors: Dict[str, PhiAccrualFailureDetector] = {}
+        self.versions: Dict[str, int] = {}
+        self.last_clock_syncs: Dict[str, float] = {}
         self.master_ip = ''
 
         # add repository change listeners
@@ -55,6 +65,7 @@ class NodeRegistry:
                         self.master.direct_slave.tracking.set_people_group(node.room.people_group)
 
                 node.acquired = True
+                self.reset_detector(node.ip_address)
                 self.log(node, 'acquired')
 
             # release if necessary
@@ -71,19 +82,45 @@ class NodeRegistry:
             if node.acquired and node.online and node.ip_address != self.master_ip:
                 self.master.send_service_update(node.ip_address)
 
+    def is_available(self, address: str, acquired: bool = True) -> bool:
+        """Returns whether a node is considered to be available.
+
+        :param str address: IP address of the node
+        :param bool acquired: Whether the node has been acquired by this master
+        :returns: True if the node is available
+        :rtype: bool
+        """
+        detector = self.detectors.get(address)
+        if detector is None:
+            return False
+
+        if not acquired or self.versions.get(address, 0) < HEARTBEAT_VERSION:
+            # older and unacquired nodes only send an announcement every 15 seconds
+            return detector.last_heartbeat + NODE_AVAILABILITY_CHECK_INTERVAL >= monotonic()
+
+        NODE_PHI.labels(address).set(min(detector.phi(), 1000.0))
+        return detector.is_available()
+
     async def check_availability(self) -> None:
-        """Checks if all nodes are still available or marks them offline if not."""
+        """Checks if all nodes are still available or marks them offline if not.
+        Nodes marked offline that are available again are acquired again.
+        """
 
         while self.running:
-            for node in self.config.nodes:
-                # check if the node is still marked as online but didn't send a ping recently
-                if node.ip_address != self.master_ip \
-                    and (node.ip_address not in self.last_pings
-                         or self.last_pings[node.ip_address] +
-                         NODE_AVAILABILITY_CHECK_INTERVAL < time()):
+            for node in list(self.config.nodes):
+                if node.ip_address == self.master_ip:
+                    continue
+
+                if self.is_available(node.ip_address, node.acquired):
+                    if not node.online and node.room is not None:
+                        await self.update_node(node.hostname, node.ip_address, acquire=True)
+
+                # check if the node is still marked as online but didn't send a message recently
+                else:
                     if node.online:
                         node.online = False
                         node.acquired = False
+                        self.master.connection_pool.close(node.ip_address)
                         await self.config.node_repository.call_listeners()
                         await self.config.room_repository.call_listeners()
                         self.log(node, 'is offline')
@@ -93,16 +130,29 @@ class NodeRegistry:
                         await self.config.node_repository.remove_node(node.node_id)
                         self.log(node, 'removed from registry')
 
-            await asyncio.sleep(NODE_AVAILABILITY_CHECK_INTERVAL / 2)
+            await asyncio.sleep(HEARTBEAT_INTERVAL / 4)
 
     async def ping_slaves(self) -> None:
-        """Send a ping message to all slaves."""
+        """Sends a ping message to all slaves to which no other message has been sent within the
+        heartbeat interval. Once per clock sync interval, the ping is used to synchronise the
+        clocks.
+        """
         while self.running:
+            now = time()
+
             for node in self.config.nodes:
                 if node.online and node.ip_address != self.master_ip and node.acquired:
-                    self.master.send_ping(node.ip_address)
+                    clock_sync = self.last_clock_syncs.get(node.ip_address, 0) + \
+                        CLOCK_SYNC_INTERVAL <= now
+
+                    if clock_sync or self.master.last_sent.get(node.ip_address, 0) + \
+                            HEARTBEAT_INTERVAL <= now:
+                        self.master.send_ping(node.ip_address, clock_sync)
+
+                    if clock_sync:
+                        self.last_clock_syncs[node.ip_address] = now
 
-            await asyncio.sleep(MASTER_PING_INTERVAL)
+            await asyncio.sleep(HEARTBEAT_INTERVAL / 4)
 
     async def add_self(self) -> None:
         """Adds the master as a node since it also runs a camera node instance."""
@@ -127,7 +177,6 @@ class NodeRegistry:
 
         # update node
         await self.update_node(hostname, address, acquire=True)
-        self.last_pings[address] = time()
 
     async def update_node(self, hostname: str, ip_address: str, acquire: bool = False) -> None:
         """Updates the given node or creates a new one if it does not yet exist.
@@ -145,7 +194,11 @@ class NodeRegistry:
             await self.config.node_repository.add_node(node)
             self.log(node, 'added to registry')
         elif node.ip_address != ip_address:
+            self.master.connection_pool.close(node.ip_address)
+            self.master.clocks.pop(node.ip_address, None)
+            self.detectors.pop(node.ip_address, None)
             node.ip_address = ip_address
+            self.config.node_repository.reindex()
             await self.config.node_repository.call_listeners()
             self.log(node, 'ip address has changed')
 
@@ -163,15 +216,44 @@ class NodeRegistry:
                     self.master.send_acquisition(node.ip_address)
 
                 node.acquired = True
+                self.reset_detector(node.ip_address)
                 self.log(node, 'acquired')
             elif acquire and node.ip_address != self.master_ip:
                 # re-acquire if announcement is received again (e.g. in case of a restart)
                 self.master.send_acquisition(node.ip_address)
                 self.log(node, 're-acquired')
 
-    def on_ping(self, address: str) -> None:
-        """Records a new ping received from the given ip address.
+    def on_message(self, address: str, version: int) -> None:
+        """Records a message received from the given ip address.
 
         :param str address: Sender IP address
+        :param int version: Protocol version of the sender
         """
-        self.last_pings[address] = time()
+        if address not in self.detectors:
+            self.detectors[address] = self.create_detector()
+
+        self.detectors[address].heartbeat()
+        self.versions[address] = version
+
+    def create_detector(self) -> PhiAccrualFailureDetector:
+        """Creates a failure detector expecting the keep-alive interval of the nodes.
+
+        :returns: Failure detector
+        :rtype: PhiAccrualFailureDetector
+        """
+        # a node only repeats its position after the keep-alive interval
+        keep_alive_interval = self.master.position_throttle().keep_alive_interval
+        return PhiAccrualFailureDetector(expected_interval=keep_alive_interval,
+                                         acceptable_pause=keep_alive_interval)
+
+    def reset_detector(self, address: str) -> None:
+        """Restarts the failure detector of a node which has just been acquired, so the intervals
+        between its announcements do not widen the distribution of its keep-alives.
+
+        :param str address: IP address of the node
+        """
+        detector = self.detectors.get(address)
+
+        if detector is not None:
+            self.detectors[address] = self.create_detector()
+            self.detectors[address].last_heartbeat = detector.last_heartbeat
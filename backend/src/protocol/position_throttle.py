@@ -0,0 +1,107 @@
+"""Limits the position updates a slave sends to its master."""
+
+from time import monotonic
+from typing import Dict
+from .constants import HEARTBEAT_INTERVAL
+
+DEFAULT_DEADBAND = 2  # pixels a coordinate has to move before it is sent again
+DEFAULT_MAX_UPDATE_RATE = 15.0  # position updates per second
+DEFAULT_KEEP_ALIVE_INTERVAL = HEARTBEAT_INTERVAL  # seconds until the last position is repeated
+
+
+class PositionThrottle:
+    """Decides which coordinates of the tracking are sent to the master.
+    Coordinates that moved less than the deadband since the last update are not sent, and
+    updates are spaced according to the maximum update rate. A coordinate arriving too early is
+    sent once the rate allows it, so the last position is never lost. If nothing has been sent
+    within the keep-alive interval, the last position is sent again.
+    The master defines the settings in the `position_updates` section of its config and sends
+    them to the slaves. Until a master sends them, every coordinate is sent.
+
+    :param int deadband: Pixels a coordinate has to move, 0 to send every coordinate
+    :param float max_update_rate: Position updates per second, 0 for no limit
+    :param float keep_alive_interval: Seconds until the last position is sent again
+    """
+
+    def __init__(self, deadband: int = 0, max_update_rate: float = 0.0,
+                 keep_alive_interval: float = HEARTBEAT_INTERVAL):
+        self.deadband = deadband
+        self.max_update_rate = max_update_rate
+        self.keep_alive_interval = keep_alive_interval
+        # coordinates of the last update per axis, None for the coordinate of a single camera
+        self.last_coordinates: Dict[str, int] = {}
+        self.last_update = 0.0
+
+    @staticmethod
+    def from_json(data: dict):
+        """Creates the throttle from the `position_updates` section of the config.
+
+        :param dict data: JSON data
+        :returns: Position throttle
+        :rtype: PositionThrottle
+        """
+        return PositionThrottle(int(data.get('deadband', DEFAULT_DEADBAND)),
+                                float(data.get('max_update_rate', DEFAULT_MAX_UPDATE_RATE)),
+                                float(data.get('keep_alive_interval',
+                                               DEFAULT_KEEP_ALIVE_INTERVAL)))
+
+    def to_message(self, message) -> None:
+        """Writes the settings into a service acquisition or service update message.
+
+        :param message: ServiceAcquisition or ServiceUpdate message
+        """
+        message.deadband = self.deadband
+        message.max_update_rate = self.max_update_rate
+        message.keep_alive_interval = self.keep_alive_interval
+
+    def from_message(self, message) -> None:
+        """Applies the settings of a service acquisition or service update message.
+        Masters without these settings send zeros, which disable the deadband and the rate limit
+        and keep the default keep-alive interval.
+
+        :param message: ServiceAcquisition or ServiceUpdate message
+        """
+        self.deadband = message.deadband
+        self.max_update_rate = message.max_update_rate
+        self.keep_alive_interval = message.keep_alive_interval or HEARTBEAT_INTERVAL
+
+    def reset(self) -> None:
+        """Forgets the last update, so the next coordinate is sent in any case."""
+        self.last_coordinates = {}
+        self.last_update = 0.0
+
+    def has_moved(self, coordinates: Dict[str, int]) -> bool:
+        """Returns whether a coordinate moved at least the deadband since the last update.
+
+        :param dict coordinates: Current coordinates per axis, None for a single camera
+        :returns: True if the coordinates should be sent
+        :rtype: bool
+        """
+        for axis, coordinate in coordinates.items():
+            last_coordinate = self.last_coordinates.get(axis)
+            if last_coordinate is None or abs(coordinate - last_coordinate) >= self.deadband:
+                return True
+
+        return False
+
+    def delay(self, now: float = None) -> float:
+        """Returns the seconds until the rate limit allows the next update.
+
+        :param float now: Monotonic time, now if not specified
+        :returns: Seconds to wait, 0 if the update can be sent immediately
+        :rtype: float
+        """
+        if self.max_update_rate <= 0:
+            return 0.0
+
+        now = monotonic() if now is None else now
+        return max(self.last_update + 1.0 / self.max_update_rate - now, 0.0)
+
+    def on_update(self, coordinates: Dict[str, int], now: float = None) -> None:
+        """Records a sent position update.
+
+        :param dict coordinates: Sent coordinates per axis
+        :param float now: Monotonic time, now if not specified
+        """
+        self.last_coordinates = dict(coordinates)
+        self.last_update = monotonic() if now is None else now
@@ -1,13 +1,21 @@
 """Slave for the cluster protocol."""
 
 import asyncio
-from time import time
+from random import SystemRandom
+from time import monotonic, time
 from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_BROADCAST
 from config import NodeType
 from networking.helpers import get_hostname
 from ..socket import ClusterSocket
-from ..constants import PORT, SLAVE_PING_INTERVAL, MASTER_AVAILABILITY_CHECK_INTERVAL
+from ..constants import PORT, SLAVE_PING_INTERVAL, MASTER_AVAILABILITY_CHECK_INTERVAL, \
+    HEARTBEAT_INTERVAL, HEARTBEAT_VERSION, CALIBRATION_IMAGE_VERSION, \
+    CALIBRATION_IMAGE_CHUNK_SIZE, CALIBRATION_IMAGE_BURST, CALIBRATION_IMAGE_BURST_INTERVAL, \
+    CALIBRATION_IMAGE_MAX_SIZE
 from ..cluster_pb2 import Wrapper
+from ..failure_detector import PhiAccrualFailureDetector
+from ..position_throttle import PositionThrottle
+from ..framing import FrameDecoder, encode_batch, encode_frame, handshake_message, \
+    parse_handshake, LEGACY_DELIMITER, MAX_DATAGRAM_SIZE, FRAMING_VERSION
 
 
 class ClusterSlave(ClusterSocket):
@@ -19,12 +27,32 @@ class ClusterSlave(ClusterSocket):
         self.tracking = tracking
         self.receive_socket = None
         self.send_socket = None
+        # can be overridden to run multiple slaves on one host, e.g. for load tests
+        self.hostname = get_hostname()
+        self.bind_address = '0.0.0.0'
+        self.announcement_address = '<broadcast>'
         self.direct_master = None
         self.master_ip = None
-        self.last_ping = None
+        # failure detector and protocol version of the master that acquired this slave
+        self.master_detector = None
+        self.master_version = 0
+        self.last_sent = 0.0
+        self.position_sequence = 0
+        # identifies the updates of this process, so the master detects a restarted sequence
+        self.position_session = SystemRandom().randint(1, 0xffffffff)
+        # deadband, rate limit and keep-alive of the position updates, set by the master
+        self.position_throttle = PositionThrottle()
+        self.pending_position_update = None
+        # origin time of the last ping of the master and when it has been received
+        self.ping_origin_time = 0.0
+        self.ping_receive_time = 0.0
+        # messages are only batched once the master has shown to understand batches
+        self.batch_datagrams = False
+        self.pending_datagrams = {}
 
         # register listeners
         self.config.tracking_repository.register_listener(self.on_tracking_repository_changed)
+        self.tracking.governor.register_listener(self.on_governor_changed)
 
     async def init(self) -> None:
         """Initializes the slave socket and starts listening."""
@@ -34,6 +62,7 @@ class ClusterSlave(ClusterSocket):
         self.running = True
         self.send_socket = socket(family=AF_INET, type=SOCK_DGRAM)
         self.send_socket.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+        self.send_socket.bind((self.bind_address, 0))
 
         self.log('Listening on port ' + str(PORT))
 
@@ -41,7 +70,22 @@ class ClusterSlave(ClusterSocket):
 
     async def on_tracking_repository_changed(self) -> None:
         """Updates the coordinate when the tracking repository has been changed."""
-        self.send_position_update(self.config.tracking_repository.coordinate)
+        if not self.position_throttle.has_moved(self.current_coordinates()):
+            return
+
+        delay = self.position_throttle.delay()
+        if delay > 0:
+            # the update sends the latest coordinates once the rate limit allows it
+            if self.pending_position_update is None:
+                self.pending_position_update = asyncio.get_running_loop().call_later(
+                    delay, self.send_position_update)
+        else:
+            self.send_position_update()
+
+    async def on_governor_changed(self) -> None:
+        """Reports the decision of the governor to the master."""
+        if self.master_ip is not None:
+            self.send_governor_update()
 
     def log(self, message: str) -> None:  # pylint: disable=no-self-use
         """Prints a log message to the console.
@@ -53,24 +97,52 @@ class ClusterSlave(ClusterSocket):
     async def update_state(self) -> None:
         """Update state of the slave socket."""
         message = self.build_message()
-        message.serviceAnnouncement.hostname = get_hostname()
+        message.serviceAnnouncement.hostname = self.hostname
+        last_announcement = 0.0
 
         while self.running:
-            # send service announcement if not yet acquired
+            # send service announcement every 15s if not yet acquired
             if self.master_ip is None:
-                self.send_message(message, address='<broadcast>')
+                if last_announcement + SLAVE_PING_INTERVAL <= time():
+                    self.send_message(message, address=self.announcement_address)
+                    last_announcement = time()
+
+            # check if the master is assumed to be offline
+            elif not self.is_master_available():
+                self.log(self.master_ip + ' is offline')
+                await self.on_service_release(None, self.master_ip)
+
+            # send last position update as a keep-alive if nothing else has been sent recently
+            elif self.last_sent + self.position_throttle.keep_alive_interval <= time():
+                self.send_position_update()
+
+            await asyncio.sleep(min(HEARTBEAT_INTERVAL,
+                                    self.position_throttle.keep_alive_interval) / 4)
+
+    def is_master_available(self) -> bool:
+        """Returns whether the master that acquired this slave is considered to be available.
 
-            else:
-                # check if the master didn't send a ping recently and so is assumed to be offline
-                if self.last_ping + MASTER_AVAILABILITY_CHECK_INTERVAL < time():
-                    self.log(self.master_ip + ' is offline')
-                    await self.on_service_release(None, self.master_ip)
+        :returns: True if the master is available
+        :rtype: bool
+        """
+        if self.master_version < HEARTBEAT_VERSION:
+            # older masters only send a ping every 60 seconds
+            return self.master_detector.last_heartbeat + MASTER_AVAILABILITY_CHECK_INTERVAL >= \
+                monotonic()
+
+        return self.master_detector.is_available()
 
-                # send last position update as a ping message if older than 15s
-                else:
-                    self.send_position_update(self.config.tracking_repository.coordinate)
+    async def call_events(self, message: Wrapper, address: str) -> None:
+        """Records every message of the master as a sign of life before calling the `on_`
+        events.
+
+        :param protocol.cluster_pb2.Wrapper message: Received message
+        :param str address: IP address of sender
+        """
+        if address == self.master_ip and self.master_detector is not None:
+            self.master_detector.heartbeat()
 
-            await asyncio.sleep(SLAVE_PING_INTERVAL)
+        await super().call_events(message, address)
 
     def send_message(self, message: Wrapper, address: str = '') -> None:
         """Sends a message to the master or specified address.
@@ -80,65 +152,250 @@ class ClusterSlave(ClusterSocket):
         """
         receiver_address = address if len(address) > 0 else self.master_ip
 
+        if receiver_address == self.master_ip:
+            self.last_sent = time()
+
         if self.direct_master is not None:
             asyncio.create_task(self.direct_master.call_events(message, receiver_address))
+        elif self.batch_datagrams and receiver_address == self.master_ip:
+            # messages sent during the same iteration of the event loop share a datagram
+            pending = self.pending_datagrams.setdefault(receiver_address, [])
+            if len(pending) == 0:
+                asyncio.get_running_loop().call_soon(self.flush_datagrams, receiver_address)
+            pending.append(message.SerializeToString())
         else:
-            try:
-                self.send_socket.sendto(message.SerializeToString(), (receiver_address, PORT))
-            except OSError as error:
-                self.log('Unable to send message: {}'.format(str(error)))
+            self.send_datagram(message.SerializeToString(), receiver_address)
+
+    def send_datagram(self, data: bytes, address: str) -> None:
+        """Sends a datagram to the given address.
+
+        :param bytes data: Datagram
+        :param str address: IP Address of the receiver
+        """
+        try:
+            self.send_socket.sendto(data, (address, PORT))
+        except OSError as error:
+            self.log('Unable to send message: {}'.format(str(error)))
+
+    def flush_datagrams(self, address: str) -> None:
+        """Sends the pending messages for an address in as few datagrams as possible.
+
+        :param str address: IP Address of the receiver
+        """
+        batch = []
+        size = 0
+
+        for data in self.pending_datagrams.pop(address, []):
+            # batch header plus up to three bytes of length prefix per message
+            if len(batch) > 0 and size + len(data) + 3 > MAX_DATAGRAM_SIZE - 4:
+                self.send_batch(batch, address)
+                batch = []
+                size = 0
+
+            batch.append(data)
+            size += len(data) + 3
+
+        if len(batch) > 0:
+            self.send_batch(batch, address)
+
+    def send_batch(self, batch: list, address: str) -> None:
+        """Sends one or more messages in a single datagram.
+
+        :param list batch: Serialized messages
+        :param str address: IP Address of the receiver
+        """
+        self.send_datagram(batch[0] if len(batch) == 1 else encode_batch(batch), address)
 
     async def receive(self) -> None:
         """Starts the receiving socket server."""
-        await asyncio.start_server(self.handle_client, host='0.0.0.0', port=PORT, family=AF_INET)
+        await asyncio.start_server(self.handle_client, host=self.bind_address, port=PORT,
+                                   family=AF_INET)
 
     async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) \
             -> None:
-        """Receive logic of the slave socket."""
+        """Receive logic of the slave socket.
+        A master that supports length-prefixed frames starts the connection with a handshake,
+        otherwise the messages are delimited by the legacy delimiter.
+        """
+        address = writer.get_extra_info('peername')[0]
+
+        try:
+            data = await reader.readuntil(LEGACY_DELIMITER)
+        except asyncio.IncompleteReadError:
+            return
+
+        version = parse_handshake(data[:-len(LEGACY_DELIMITER)])
+        if version is None:
+            await self.receive_message(data[:-len(LEGACY_DELIMITER)], address=address)
+            await self.receive_delimited(reader, address)
+        else:
+            hello = handshake_message()[:-len(LEGACY_DELIMITER)]
+            writer.write(encode_frame(hello))
+            self.batch_datagrams = version >= FRAMING_VERSION
+            await self.receive_frames(reader, address)
+
+    async def receive_delimited(self, reader: asyncio.StreamReader, address: str) -> None:
+        """Receives messages delimited by the legacy delimiter.
+
+        :param asyncio.StreamReader reader: Stream of the master
+        :param str address: IP Address of the master
+        """
         while self.running and not reader.at_eof():
             try:
-                data = await reader.readuntil('\r\n'.encode())
-                address = writer.get_extra_info('peername')
+                data = await reader.readuntil(LEGACY_DELIMITER)
 
                 # remove message delimiter
                 data = data[:-2]
 
-                await self.receive_message(data, address=address[0])
+                await self.receive_message(data, address=address)
             except asyncio.IncompleteReadError:
                 break
             except RuntimeError as error:
                 print(error)
 
-    def send_position_update(self, coordinate: int) -> None:
-        """Sends a position update to the master.
+    async def receive_frames(self, reader: asyncio.StreamReader, address: str) -> None:
+        """Receives length-prefixed messages.
+
+        :param asyncio.StreamReader reader: Stream of the master
+        :param str address: IP Address of the master
+        """
+        decoder = FrameDecoder()
+
+        while self.running:
+            data = await reader.read(65536)
+            if len(data) == 0:
+                break
+
+            try:
+                for frame in decoder.feed(data):
+                    await self.receive_message(frame, address=address)
+            except ValueError as error:
+                self.log('Closing connection to {}: {}'.format(address, str(error)))
+                break
+            except RuntimeError as error:
+                print(error)
+
+    def current_coordinates(self) -> dict:
+        """Returns the current coordinates of the tracking.
 
-        :param int coordinate: Coordinate
+        :returns: Coordinates per axis, None for the coordinate of a single camera
+        :rtype: dict
         """
+        coordinates = dict(self.config.tracking_repository.axis_coordinates)
+        coordinates[None] = self.config.tracking_repository.coordinate
+        return coordinates
+
+    def send_position_update(self) -> None:
+        """Sends the current coordinates to the master."""
+        if self.pending_position_update is not None:
+            self.pending_position_update.cancel()
+            self.pending_position_update = None
+        self.position_throttle.on_update(self.current_coordinates())
+
+        # the sequence starts at 1 as 0 marks updates of nodes without sequence numbers
+        self.position_sequence = self.position_sequence % 0xffffffff + 1
         message = self.build_message()
-        message.positionUpdate.coordinate = coordinate
+        message.positionUpdate.coordinate = self.config.tracking_repository.coordinate
+        message.positionUpdate.sequence = self.position_sequence
+        message.positionUpdate.session = self.position_session
+        message.positionUpdate.capture_time = self.config.tracking_repository.capture_time
+
+        # echo the last ping once, so the master can estimate the offset of the clocks
+        if self.ping_origin_time > 0:
+            message.positionUpdate.ping_origin_time = self.ping_origin_time
+            message.positionUpdate.ping_receive_time = self.ping_receive_time
+            message.positionUpdate.transmit_time = time()
+            self.ping_origin_time = 0.0
+
+        for axis, coordinate in self.config.tracking_repository.axis_coordinates.items():
+            message.positionUpdate.axes.add(axis=axis, coordinate=coordinate)
+
+        self.send_message(message, self.master_ip)
+
+    def send_governor_update(self) -> None:
+        """Sends the current level of the governor to the master."""
+        governor = self.tracking.governor
+        level = governor.level()
+        message = self.build_message()
+        message.governorUpdate.level = governor.index
+        message.governorUpdate.detector = self.tracking.active_detector()
+        message.governorUpdate.framerate = self.tracking.pacing.framerate
+        message.governorUpdate.reason = governor.reason
+        message.governorUpdate.fps = governor.fps
+
+        if level is not None:
+            message.governorUpdate.motion_gated = level.motion_gated
+            if level.input_format is not None:
+                message.governorUpdate.input_width = level.input_format.width
+                message.governorUpdate.input_height = level.input_format.height
+
+        if governor.temperature is not None:
+            message.governorUpdate.temperature = governor.temperature
+        if governor.load is not None:
+            message.governorUpdate.load = governor.load
+
         self.send_message(message, self.master_ip)
 
-    def send_camera_calibration_response(self, count: int, image: str) -> None:
+    def send_camera_calibration_response(self, count: int, image: str, status: str) -> None:
         """Sends a camera calibration response to the master.
 
         :param int count: Count param
         :param str image: Image param
+        :param str status: Status of the calibration
         """
         message = self.build_message()
         message.cameraCalibrationResponse.count = count
         message.cameraCalibrationResponse.image = image
+        message.cameraCalibrationResponse.status = status
         self.send_message(message, self.master_ip)
 
+    async def send_camera_calibration_image(self, image: str, data: bytes) -> bool:
+        """Sends a camera calibration image in chunks to the master, which caches it for the
+        interface. It has to be sent before the response referencing the image. The chunks are
+        sent in bursts, so they do not overflow the receive buffer of the master. If chunks get
+        lost, the master fetches the image from the assets instead.
+
+        :param str image: Name of the image
+        :param bytes data: JPEG data
+        :returns: False if the master is too old to receive images or the image is too large
+        :rtype: bool
+        """
+        if self.master_version < CALIBRATION_IMAGE_VERSION or \
+                len(data) > CALIBRATION_IMAGE_MAX_SIZE:
+            return False
+
+        chunks = max((len(data) + CALIBRATION_IMAGE_CHUNK_SIZE - 1) //
+                     CALIBRATION_IMAGE_CHUNK_SIZE, 1)
+
+        for chunk in range(chunks):
+            if chunk > 0 and chunk % CALIBRATION_IMAGE_BURST == 0:
+                await asyncio.sleep(CALIBRATION_IMAGE_BURST_INTERVAL)
+
+            message = self.build_message()
+            message.cameraCalibrationImage.image = image
+            message.cameraCalibrationImage.chunk = chunk
+            message.cameraCalibrationImage.chunks = chunks
+            message.cameraCalibrationImage.data = data[chunk * CALIBRATION_IMAGE_CHUNK_SIZE:
+                                                       (chunk + 1) * CALIBRATION_IMAGE_CHUNK_SIZE]
+            self.send_message(message, self.master_ip)
+
+        return True
+
     async def on_service_acquisition(self, message: Wrapper, address: str) -> None:
         """Handle service acquisition message.
 
         :param protocol.cluster_pb2.Wrapper message: Received message
         :param str address: IP Address of the master that acquired this service
         """
-        self.last_ping = time()
+        self.master_detector = PhiAccrualFailureDetector()
+        self.master_detector.heartbeat()
+        self.master_version = message.version
         self.master_ip = address
         self.log('Acquired by ' + address)
 
+        self.position_throttle.from_message(message.serviceAcquisition)
+        self.position_throttle.reset()
+
         if message.serviceAcquisition.detector is not None and \
                 len(message.serviceAcquisition.detector) > 0:
             self.tracking.set_detector(message.serviceAcquisition.detector)
@@ -158,6 +415,7 @@ class ClusterSlave(ClusterSocket):
         """
         if address == self.master_ip:
             self.config.balance = message.serviceUpdate.track
+            self.position_throttle.from_message(message.serviceUpdate)
             await self.config.setting_repository.call_listeners()
 
             if message.serviceUpdate.detector is not None and \
@@ -182,14 +440,16 @@ class ClusterSlave(ClusterSocket):
                 self.config.balance = False
                 await self.config.setting_repository.call_listeners()
 
-    async def on_ping(self, _: Wrapper, address: str) -> None:
+    async def on_ping(self, message: Wrapper, address: str) -> None:
         """Handle ping message.
 
         :param protocol.cluster_pb2.Wrapper message: Received message
         :param str address: IP Address of the master that pinged this service
         """
-        if address == self.master_ip:
-            self.last_ping = time()
+        # pings only prove that the master is alive unless they are used for the clock sync
+        if address == self.master_ip and message.ping.origin_time > 0:
+            self.ping_origin_time = message.ping.origin_time
+            self.ping_receive_time = time()
 
     async def on_camera_calibration_request(self, message: Wrapper, address: str) -> None:
         """Handle camera calibration request message.
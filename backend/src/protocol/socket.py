@@ -1,16 +1,46 @@
 """Base socket logic and message parsing."""
 
 import re
+from typing import Dict
 from .cluster_pb2 import Wrapper
 from .constants import APP, VERSION
 
+MESSAGE_TYPE_PATTERN = re.compile(r'(?<!^)(?=[A-Z])')
+# event method names per class, resolved once instead of for every message
+EVENT_NAMES: Dict[type, Dict[str, str]] = {}
+MAX_FREE_WRAPPERS = 8
+
+
+def event_names(socket_class: type) -> Dict[str, str]:
+    """Returns the names of the implemented `on_` events of a class per message type.
+
+    :param type socket_class: Class implementing the events
+    :returns: Event method name per message field of the wrapper
+    :rtype: Dict[str, str]
+    """
+    if socket_class not in EVENT_NAMES:
+        names = {}
+
+        for field in Wrapper.DESCRIPTOR.oneofs_by_name['message'].fields:
+            # convert camelCase to snake_case
+            event = 'on_' + MESSAGE_TYPE_PATTERN.sub('_', field.name).lower()
+            if callable(getattr(socket_class, event, None)):
+                names[field.name] = event
+
+        EVENT_NAMES[socket_class] = names
+
+    return EVENT_NAMES[socket_class]
+
 
 class ClusterSocket:
     """Base socket logic and message parsing."""
 
     def __init__(self):
-        self.message_type_pattern = re.compile(r'(?<!^)(?=[A-Z])')
         self.running = False
+        self.events = {message_type: getattr(self, event)
+                       for message_type, event in event_names(type(self)).items()}
+        # parsed wrappers are reused once their events have been handled
+        self.free_wrappers = []
 
     async def start(self) -> None:
         """Starts the socket."""
@@ -40,26 +70,33 @@ class ClusterSocket:
         """Waits until the next message and parses it.
 
         :param bytes data: Received bytes
-        :param bool call_events: If true, the `on_` events will be called on the class.
+        :param bool call_events: If true, the `on_` events will be called on the class. The
+                                 message is reused afterwards, so the events must not keep it
+                                 and it is not returned.
         :param str address: Address of the sender if already known
-        :returns: Message and the sending IP
+        :returns: Message and the sending IP, the message is None if the events have been called
         :rtype: (protocol.cluster_pb2.Wrapper, str)
         """
+        message = self.free_wrappers.pop() if len(self.free_wrappers) > 0 else Wrapper()
+
         try:
-            message = Wrapper()
             message.ParseFromString(data)
 
-            # ignore message if it is not from real stereo
+            # ignore message if it is not from real stereo
             if message.app != APP:
                 return None, address
 
             if call_events:
                 await self.call_events(message, address)
+                return None, address
 
             return message, address
         except RuntimeError as error:
             print(error)
             return None, None
+        finally:
+            if call_events and len(self.free_wrappers) < MAX_FREE_WRAPPERS:
+                self.free_wrappers.append(message)
 
     async def call_events(self, message: Wrapper, address: str) -> None:
         """Calls the `on_` events on the class for the given message.
@@ -69,14 +106,8 @@ class ClusterSocket:
         :param protocol.cluster_pb2.Wrapper message: Received message
         :param str address: IP address of sender
         """
-        message_type = message.WhichOneof('message')
-
-        # convert camelCase to snake_case
-        message_type = self.message_type_pattern.sub('_', message_type).lower()
-
         # check if the event has been implemented
-        event = 'on_' + message_type
-        event_method = getattr(self, event, None)
+        event_method = self.events.get(message.WhichOneof('message'))
 
         if event_method is not None:
             await event_method(message, address)
@@ -0,0 +1,50 @@
+"""Hash index over the models of a repository."""
+
+
+class Index:
+    """Hash index over the models of a repository by a single attribute.
+    The repositories invalidate their indexes when models are added, removed or renamed. As the
+    model lists are also changed directly (e.g. while loading the config), the index is rebuilt
+    as well if the number of models has changed or the found model no longer has the value.
+    If multiple models have the same value, the first one in the list is returned.
+
+    :param callable models: Function returning the current list of models
+    :param str attribute: Attribute of the models to index
+    """
+
+    def __init__(self, models: callable, attribute: str):
+        self.models = models
+        self.attribute = attribute
+        self.entries = {}
+        self.size = -1
+
+    def invalidate(self) -> None:
+        """Rebuilds the index on the next lookup."""
+        self.size = -1
+
+    def rebuild(self) -> None:
+        """Rebuilds the index from the current list of models."""
+        models = self.models()
+        self.entries = {}
+
+        for model in models:
+            self.entries.setdefault(getattr(model, self.attribute), model)
+
+        self.size = len(models)
+
+    def get(self, value):
+        """Returns the model with the given value.
+
+        :param value: Value of the attribute
+        :returns: Model or None if no model has this value
+        """
+        if self.size != len(self.models()):
+            self.rebuild()
+
+        model = self.entries.get(value)
+
+        if model is not None and getattr(model, self.attribute) != value:
+            self.rebuild()
+            model = self.entries.get(value)
+
+        return model
@@ -1,6 +1,7 @@
 """Node repository."""
 
 from models.node import Node
+from .index import Index
 from .repository import Repository
 
 
@@ -13,6 +14,13 @@ class NodeRepository(Repository):
     def __init__(self, config):
         super().__init__()
         self.config = config
+        self.indexes = {attribute: Index(lambda: self.config.nodes, attribute)
+                        for attribute in ('node_id', 'name', 'hostname', 'ip_address')}
+
+    def reindex(self) -> None:
+        """Rebuilds the indexes, e.g. after a node has been renamed or its ip address changed."""
+        for index in self.indexes.values():
+            index.invalidate()
 
     def get_node(self, node_id: int) -> Node:
         """Returns the node with the specified id.
@@ -21,7 +29,7 @@ class NodeRepository(Repository):
         :returns: Node or None if no node could be found with this id
         :rtype: models.node.Node
         """
-        return next(filter(lambda r: r.node_id == node_id, self.config.nodes), None)
+        return self.indexes['node_id'].get(node_id)
 
     def get_node_by_name(self, name: str) -> Node:
         """Returns the node with the given name.
@@ -30,7 +38,7 @@ class NodeRepository(Repository):
         :returns: Node or None if no node could be found with this name
         :rtype: models.node.Node
         """
-        return next(filter(lambda n: n.name == name, self.config.nodes), None)
+        return self.indexes['name'].get(name)
 
     def get_node_by_hostname(self, hostname: str) -> Node:
         """Returns the node with the given hostname.
@@ -39,7 +47,7 @@ class NodeRepository(Repository):
         :returns: Node or None if no node could be found with this hostname
         :rtype: models.node.Node
         """
-        return next(filter(lambda n: n.hostname == hostname, self.config.nodes), None)
+        return self.indexes['hostname'].get(hostname)
 
     def get_node_by_ip(self, ip_address: str) -> Node:
         """Returns the node with the given ip address.
@@ -48,7 +56,7 @@ class NodeRepository(Repository):
         :returns: Node or None if no node could be found with this ip address
         :rtype: models.node.Node
         """
-        return next(filter(lambda n: n.ip_address == ip_address, self.config.nodes), None)
+        return self.indexes['ip_address'].get(ip_address)
 
     async def add_node(self, node: Node) -> None:
         """Adds a new node and stores the config file.
@@ -68,6 +76,7 @@ class NodeRepository(Repository):
             await self.config.room_repository.call_listeners()
 
         self.config.nodes.append(node)
+        self.reindex()
         await self.call_listeners()
 
     async def remove_node(self, node_id: int) -> bool:
@@ -83,6 +92,7 @@ class NodeRepository(Repository):
         if node is not None:
             # remove node
             self.config.nodes.remove(node)
+            self.reindex()
 
             # remove reference on room
             if node.room is not None:
@@ -1,6 +1,7 @@
 """Room repository."""
 
 from models.room import Room
+from .index import Index
 from .repository import Repository
 
 
@@ -13,6 +14,13 @@ class RoomRepository(Repository):
     def __init__(self, config):
         super().__init__()
         self.config = config
+        self.indexes = {attribute: Index(lambda: self.config.rooms, attribute)
+                        for attribute in ('room_id', 'name')}
+
+    def reindex(self) -> None:
+        """Rebuilds the indexes, e.g. after a room has been renamed."""
+        for index in self.indexes.values():
+            index.invalidate()
 
     def get_room(self, room_id: int, fail: bool = False) -> Room:
         """Returns the room with the specified id.
@@ -22,7 +30,7 @@ class RoomRepository(Repository):
         :returns: Room or None if no room could be found with this id
         :rtype: models.room.Room
         """
-        room = next(filter(lambda r: r.room_id == room_id, self.config.rooms), None)
+        room = self.indexes['room_id'].get(room_id)
 
         if fail and room is None:
             raise ValueError('Room with id ' + str(room_id) + ' could not be found')
@@ -36,7 +44,7 @@ class RoomRepository(Repository):
         :returns: Room or None if no room could be found with this name
         :rtype: models.room.Room
         """
-        return next(filter(lambda r: r.name == name, self.config.rooms), None)
+        return self.indexes['name'].get(name)
 
     async def add_room(self, room: Room) -> None:
         """Adds a new room and stores the config file.
@@ -50,6 +58,7 @@ class RoomRepository(Repository):
                 rooms_sorted) == 0 else rooms_sorted[0].room_id + 1
 
         self.config.rooms.append(room)
+        self.reindex()
         await self.call_listeners()
 
     async def remove_room(self, room_id: int) -> bool:
@@ -65,6 +74,7 @@ class RoomRepository(Repository):
         if room is not None:
             # remove room
             self.config.rooms.remove(room)
+            self.reindex()
 
             # remove nodes with this room
             nodes_to_remove = list(filter(lambda n: n.room.room_id ==
@@ -73,6 +83,7 @@ class RoomRepository(Repository):
                 self.config.nodes.remove(node)
 
             if len(nodes_to_remove) > 0:
+                self.config.node_repository.reindex()
                 await self.config.node_repository.call_listeners()
 
             # remove speakers with this room
@@ -82,6 +93,7 @@ class RoomRepository(Repository):
                 self.config.speakers.remove(speaker)
 
             if len(speakers_to_remove) > 0:
+                self.config.speaker_repository.reindex()
                 await self.config.speaker_repository.call_listeners()
 
             await self.call_listeners()
@@ -1,6 +1,7 @@
 """Speaker repository."""
 
 from models.speaker import Speaker
+from .index import Index
 from .repository import Repository
 
 
@@ -13,6 +14,13 @@ class SpeakerRepository(Repository):
     def __init__(self, config):
         super().__init__()
         self.config = config
+        self.indexes = {attribute: Index(lambda: self.config.speakers, attribute)
+                        for attribute in ('speaker_id', 'name')}
+
+    def reindex(self) -> None:
+        """Rebuilds the indexes, e.g. after a speaker has been renamed."""
+        for index in self.indexes.values():
+            index.invalidate()
 
     def get_speaker(self, speaker_id: str) -> Speaker:
         """Returns the speaker with the specified id.
@@ -21,7 +29,7 @@ class SpeakerRepository(Repository):
         :returns: Speaker or None if no speaker could be found with this id
         :rtype: models.speaker.Speaker
         """
-        return next(filter(lambda s: s.speaker_id == speaker_id, self.config.speakers), None)
+        return self.indexes['speaker_id'].get(speaker_id)
 
     def get_speaker_by_name(self, name: str) -> Speaker:
         """Returns the speaker with the given name.
@@ -30,7 +38,7 @@ class SpeakerRepository(Repository):
         :returns: Speaker or None if no speaker could be found with this name
         :rtype: models.speaker.Speaker
         """
-        return next(filter(lambda s: s.name == name, self.config.speakers), None)
+        return self.indexes['name'].get(name)
 
     async def remove_speaker(self, speaker_id: str, delete_from_runtime_store: bool = False) -> bool:
         """Removes a speaker and stores the config file.
@@ -50,6 +58,7 @@ class SpeakerRepository(Repository):
             speaker.room = None
             if delete_from_runtime_store:
                 self.config.speakers.remove(speaker)
+                self.reindex()
             await self.call_listeners()
 
             return True
@@ -66,6 +75,7 @@ class SpeakerRepository(Repository):
             raise ValueError('Speaker id already exists in repository')
 
         self.config.speakers.append(speaker)
+        self.reindex()
         await self.call_listeners()
 
     def to_json(self) -> dict:
@@ -1,5 +1,7 @@
 """Tracking repository."""
 
+from time import time
+from typing import Dict
 from .repository import Repository
 from tracking.people_detector import DEFAULT_COORDINATE
 
@@ -14,11 +16,24 @@ class TrackingRepository(Repository):
         super().__init__()
         self.config = config
         self.coordinate = DEFAULT_COORDINATE
+        # coordinates of cameras tracking a specific axis
+        self.axis_coordinates: Dict[str, int] = {}
+        # unix time at which the frame of the latest coordinate has been captured
+        self.capture_time: float = time()
 
-    async def update_coordinate(self, coordinate: int) -> None:
+    async def update_coordinate(self, coordinate: int, axis: str = None,
+                                capture_time: float = None) -> None:
         """Update the coordinate and call all listeners.
 
         :param int coordinate: New coordinate
+        :param str axis: Axis (x or y) of the camera or None if the node's coordinate type is used
+        :param float capture_time: Unix time at which the frame has been captured
         """
-        self.coordinate = coordinate
+        self.capture_time = time() if capture_time is None else capture_time
+
+        if axis is None:
+            self.coordinate = coordinate
+        else:
+            self.axis_coordinates[axis] = coordinate
+
         await self.call_listeners()
@@ -0,0 +1,46 @@
+"""Provides preallocated frame buffers to avoid allocations in the frame processing loops."""
+
+from typing import Dict, Tuple
+import numpy as np
+
+
+class BufferPool:
+    """Provides preallocated frame buffers keyed by their shape and type.
+    A buffer is reused each time it is requested again, so its content is only valid until the
+    same buffer is requested the next time (usually for the next frame).
+
+    :param bool enabled: If false, a new buffer will be allocated for every request
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.buffers: Dict[Tuple[str, Tuple[int, ...], str], np.ndarray] = {}
+
+    def get(self, shape: Tuple[int, ...], dtype=np.uint8, tag: str = '') -> np.ndarray:
+        """Returns the buffer for the given shape and type.
+
+        :param tuple shape: Shape of the buffer
+        :param dtype: Numpy data type of the buffer
+        :param str tag: Distinguishes multiple buffers of the same shape used within one frame
+        :returns: Buffer with undefined content
+        :rtype: numpy.ndarray
+        """
+        if not self.enabled:
+            return np.empty(shape, dtype)
+
+        key = (tag, tuple(shape), np.dtype(dtype).str)
+        buffer = self.buffers.get(key)
+
+        if buffer is None:
+            buffer = np.empty(shape, dtype)
+            self.buffers[key] = buffer
+
+        return buffer
+
+    def clear(self) -> None:
+        """Releases all buffers."""
+        self.buffers = {}
+
+
+# each tracking process works on its own copy of the pool after it has been started
+BUFFER_POOL = BufferPool()
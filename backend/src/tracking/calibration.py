@@ -2,32 +2,46 @@
 from time import time
 from pathlib import Path
 from math import ceil
-from multiprocessing import Queue
+from multiprocessing import Queue, Process
 import pickle
 import shutil
 import cv2
 import numpy as np
+from .buffer_pool import BUFFER_POOL
+from .chessboard_search import ChessboardSearch, CHESSBOARD_SIZE
 
-CHESSBOARD_SIZE = (7, 7)  #  inner size
 PREPARATION_TIME = 5
-CORNER_WINDOW_SIZE = (11, 11)
-CORNER_ZERO_ZONE = (-1, -1)
-CORNER_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+STATUS_FOUND = 'found'
+STATUS_SOLVING = 'solving'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
 ASSETS_PATH: Path = (Path(__file__).resolve().parent / '..' / '..' / 'assets').resolve()
 IMAGE_PATH: Path = ASSETS_PATH / 'calibration'
 
 
 class Calibration:
-    """Implements camera calibration."""
+    """Implements camera calibration.
 
-    def __init__(self, frame_size, calibration_responses: Queue):
+    :param (int, int) frame_size: Size of the calibration frames
+    :param Queue calibration_responses: Receives the calibration responses
+    :param str file_suffix: Distinguishes the calibration files of multiple cameras
+    """
+
+    def __init__(self, frame_size, calibration_responses: Queue, file_suffix: str = ''):
         self.frame_size = frame_size
+        self.file_suffix = file_suffix
         self.calibration_responses = calibration_responses
         self.calibrating = False
         self.calibration = None
+        self.undistort_maps = {}
         self.next_chessboard_at = None
         self.object_points = []
         self.image_points = []
+        # incremented with every request to discard chessboards found for a previous step
+        self.generation = 0
+        self.search = None
+        self.solver = None
+        self.loaded_at = None
         self.load_calibration()
 
     def handle_request(self, start: bool = False, finish: bool = False, repeat: bool = False) \
@@ -38,6 +52,8 @@ class Calibration:
         :param bool finish: If true, the current calibration will be finished
         :param bool repeat: If true, the current step will be repeated
         """
+        self.generation += 1
+
         if start:
             print('[Camera Calibration] Starting calibration')
 
@@ -55,8 +71,7 @@ class Calibration:
             self.calibrating = False
 
             if not repeat:
-                self.store_calibration()
-                self.load_calibration()
+                self.start_solver()
 
             # cleanup files
             try:
@@ -71,36 +86,46 @@ class Calibration:
 
     def handle_frame(self, frame) -> None:
         """Handle a camera frame by searching for the chessboard.
+        The search runs in a worker thread, the frame is only copied once the next chessboard is
+        due and no search is running.
 
         :param array frame: Camera frame
         """
-        if self.next_chessboard_at is None or self.next_chessboard_at > time():
-            if self.next_chessboard_at is not None:
-                time_left = ceil(self.next_chessboard_at - time())
-                cv2.putText(frame, str(time_left), (int(self.frame_size[0] / 2) - 10,
-                                                    int(self.frame_size[1] / 2) - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 255, 0), 3)
+        self.collect_search_results()
+
+        if self.next_chessboard_at is None:
             return
 
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.next_chessboard_at > time():
+            time_left = ceil(self.next_chessboard_at - time())
+            cv2.putText(frame, str(time_left), (int(self.frame_size[0] / 2) - 10,
+                                                int(self.frame_size[1] / 2) - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 255, 0), 3)
+            return
 
-        # find the chess board corners
-        ret, corners = cv2.findChessboardCorners(gray_frame, CHESSBOARD_SIZE, None)
+        if self.search is None:
+            self.search = ChessboardSearch()
+        self.search.search(frame, self.generation)
 
-        # process if chessboard was found
-        if ret is True:
-            print('[Camera Calibration] Chessboard found ({})'.format(len(self.object_points) + 1))
-            self.next_chessboard_at = None
+    def collect_search_results(self) -> None:
+        """Adds the chessboards found by the worker thread and sends the responses."""
+        if self.search is None:
+            return
 
-            # improve corner detection
-            improved_corners = cv2.cornerSubPix(gray_frame, corners, CORNER_WINDOW_SIZE,
-                                                CORNER_ZERO_ZONE, CORNER_CRITERIA)
-            self.add_points(improved_corners)
+        result = self.search.result()
+        while result is not None:
+            generation, corners, file_name, data = result
 
-            file_name = self.save_chessboard_image(frame, improved_corners)
+            # ignore chessboards of an outdated step
+            if generation == self.generation and self.next_chessboard_at is not None:
+                print('[Camera Calibration] Chessboard found ({})'.format(
+                    len(self.object_points) + 1))
+                self.next_chessboard_at = None
+                self.add_points(corners)
+                self.calibration_responses.put_nowait((len(self.object_points), file_name,
+                                                       STATUS_FOUND, data))
 
-            # send response
-            self.calibration_responses.put_nowait((len(self.object_points), file_name))
+            result = self.search.result()
 
     def add_points(self, image_points) -> None:
         """Add the found chessboard points to the results.
@@ -115,27 +140,9 @@ class Calibration:
         # 2d point on the image
         self.image_points.append(image_points)
 
-    def save_chessboard_image(self, frame, corners) -> str:
-        """Saves the image including the found chessboard to a file.
-
-        :param array frame: Camera frame
-        :param array corners: Found corners
-        :returns: Filename of the image
-        :rtype: str
-        """
-        # draw chessboard on image
-        chessboard_image = cv2.drawChessboardCorners(frame, CHESSBOARD_SIZE, corners, True)
-
-        # save file
-        file_name = str(int(time())) + '.jpg'
-        IMAGE_PATH.mkdir(exist_ok=True)
-        cv2.imwrite(str(IMAGE_PATH / file_name), chessboard_image)
-
-        return file_name
-
     def load_calibration(self) -> None:
         """Loads the current calibration from a file."""
-        custom_file = ASSETS_PATH / 'custom_calibration.pkl'
+        custom_file = ASSETS_PATH / 'custom_calibration{}.pkl'.format(self.file_suffix)
         default_file = ASSETS_PATH / 'default_calibration.pkl'
 
         if not custom_file.exists() and not default_file.exists():
@@ -143,43 +150,134 @@ class Calibration:
             return
 
         file_name = custom_file if custom_file.exists() else default_file
+        self.loaded_at = file_name.stat().st_mtime
 
         with open(file_name, 'rb') as input_data:
             self.calibration = pickle.load(input_data)
+            self.undistort_maps = {}
 
         print('[Camera Calibration] ' + ('Custom' if custom_file.exists() else 'Default') +
               ' configuration loaded')
 
-    def store_calibration(self) -> None:
-        """Stores the current calibration into a file."""
-        _, mtx, dist, _, _ = cv2.calibrateCamera(self.object_points, self.image_points,
-                                                 self.frame_size, None, None)
-        width = self.frame_size[0]
-        height = self.frame_size[1]
-        camera_matrix, _ = cv2.getOptimalNewCameraMatrix(mtx, dist, (width, height), 0,
-                                                         (width, height))
+    def refresh(self) -> None:
+        """Loads the calibration again if a new one has been stored by another process."""
+        custom_file = ASSETS_PATH / 'custom_calibration{}.pkl'.format(self.file_suffix)
 
-        data = {
-            'camera_matrix': camera_matrix,
-            'mtx': mtx,
-            'dist': dist,
-        }
+        try:
+            if custom_file.stat().st_mtime != self.loaded_at:
+                self.load_calibration()
+        except FileNotFoundError:
+            pass
+
+    def start_solver(self) -> None:
+        """Solves the calibration from the found chessboards in a background process.
+        The capture continues with the previous calibration until the new one is stored.
+        """
+        if len(self.object_points) == 0:
+            print('[Camera Calibration] No chessboards found, keeping the current calibration')
+            return
+
+        print('[Camera Calibration] Solving calibration ({} images)'.format(
+            len(self.object_points)))
+        file_name = ASSETS_PATH / 'custom_calibration{}.pkl'.format(self.file_suffix)
+        self.solver = Process(target=solve_calibration,
+                              args=(self.object_points, self.image_points, self.frame_size,
+                                    file_name),
+                              name='calibration-solver', daemon=True)
+        self.solver.start()
+        self.calibration_responses.put_nowait((len(self.object_points), '', STATUS_SOLVING,
+                                               b''))
+
+    def poll_solver(self) -> None:
+        """Loads the new calibration once the background solve has finished."""
+        if self.solver is None or self.solver.is_alive():
+            return
 
-        file_name = ASSETS_PATH / 'custom_calibration.pkl'
+        succeeded = self.solver.exitcode == 0
+        self.solver = None
+
+        if succeeded:
+            self.load_calibration()
+        else:
+            print('[Camera Calibration] Solving the calibration failed')
+
+        self.calibration_responses.put_nowait((len(self.object_points), '',
+                                               STATUS_DONE if succeeded else STATUS_FAILED, b''))
+
+    def get_undistort_maps(self, width: int, height: int) -> tuple:
+        """Returns the pixel maps to undistort frames of the given size.
+        They are only calculated once per calibration instead of on every frame. If the frames are
+        resized by the camera, the calibration is scaled accordingly.
+
+        :param int width: Frame width
+        :param int height: Frame height
+        :returns: Maps for `cv2.remap`
+        :rtype: tuple
+        """
+        size = (width, height)
 
-        if file_name.exists():
-            file_name.unlink()
+        if size not in self.undistort_maps:
+            scale = np.array([[width / self.frame_size[0], 0, width / self.frame_size[0]],
+                              [0, height / self.frame_size[1], height / self.frame_size[1]],
+                              [0, 0, 1]])
+            self.undistort_maps[size] = cv2.initUndistortRectifyMap(
+                self.calibration['mtx'] * scale, self.calibration['dist'], None,
+                self.calibration['camera_matrix'] * scale, size, cv2.CV_16SC2)
 
-        with open(file_name, 'wb') as output:
-            pickle.dump(data, output, pickle.HIGHEST_PROTOCOL)
+        return self.undistort_maps[size]
 
-    def correct_frame(self, frame):
+    def correct_frame(self, frame, tag: str = 'undistort'):
         """Corrects a input frame using the loaded calibration data.
+        The corrected frame is written into a pooled buffer which is reused for the next frame.
 
         :param array frame: Camera frame
+        :param str tag: Buffer pool tag, if multiple frames are corrected at once
         """
         if self.calibration is None:
             return frame
 
-        return cv2.undistort(frame, self.calibration['mtx'], self.calibration['dist'], None,
-                             self.calibration['camera_matrix'])
+        height, width = frame.shape[:2]
+        map_x, map_y = self.get_undistort_maps(width, height)
+        corrected_frame = BUFFER_POOL.get(frame.shape, frame.dtype, tag=tag)
+
+        return cv2.remap(frame, map_x, map_y, cv2.INTER_LINEAR, dst=corrected_frame)
+
+
+def solve_calibration(object_points: list, image_points: list, frame_size: tuple,
+                      file_name: Path) -> None:
+    """Solves the camera calibration and stores it into a file.
+    Runs in a background process, as solving takes multiple seconds on a Raspberry Pi.
+
+    :param list object_points: Points of the chessboards in the real world
+    :param list image_points: Points of the chessboards within the images
+    :param (int, int) frame_size: Size of the frames
+    :param Path file_name: Calibration file
+    """
+    _, mtx, dist, _, _ = cv2.calibrateCamera(object_points, image_points, frame_size, None, None)
+    width = frame_size[0]
+    height = frame_size[1]
+    camera_matrix, _ = cv2.getOptimalNewCameraMatrix(mtx, dist, (width, height), 0,
+                                                     (width, height))
+
+    data = {
+        'camera_matrix': camera_matrix,
+        'mtx': mtx,
+        'dist': dist,
+    }
+
+    # replace the file at once, so the camera never loads a partially written calibration
+    temporary_file = file_name.with_suffix('.tmp')
+    with open(temporary_file, 'wb') as output:
+        pickle.dump(data, output, pickle.HIGHEST_PROTOCOL)
+    temporary_file.replace(file_name)
+
+
+def save_image(file_name: str, data: bytes) -> None:
+    """Stores a calibration image in the assets. Older masters fetch it from there, newer ones
+    if not all chunks sent over the cluster protocol have arrived.
+
+    :param str file_name: Name of the image
+    :param bytes data: JPEG data
+    """
+    IMAGE_PATH.mkdir(exist_ok=True)
+    (IMAGE_PATH / file_name).write_bytes(data)
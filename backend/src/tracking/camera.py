@@ -1,81 +1,189 @@
 """Camera module implements the camera connection and person detection."""
 
-from time import sleep
-from multiprocessing import Queue, Event
+from time import perf_counter
+from multiprocessing import Queue
 from queue import Empty
-from picamera.array import PiRGBArray  # pylint: disable=import-error
 from picamera import PiCamera  # pylint: disable=import-error
-import cv2
 from .calibration import Calibration
+from .camera_output import PooledBGRArray, LatestFrameOutput
+from .frame_format import FrameFormat, DEFAULT_FRAME_FORMAT
+from .frame_pacer import FramePacer, MotionCheck, PacingSettings
+from .instrumentation import FRAMES_DROPPED, CAPTURE_IDLE
+from .subscriptions import Subscriptions, DETECTOR, STREAM
+from .camera_source import CameraSource
+from .pipeline import FrameContext, PipelineLayout
+from .stages import SourceStage, GateStage, UndistortStage
+
+DETECTOR_SPLITTER_PORT = 1  # port recording the copy of the frames in the detector input format
 
 
 class Camera:
     """The Camera class continuously reads frames from the given camera and performs
     feature detection on them.
+    Frames are only processed and published for the currently subscribed consumers.
+    While the detector runs and nobody has been detected for the idle timeout, the frame rate is
+    throttled until a cheap motion check or the detector reports activity again.
+    If multiple cameras are attached, only the primary one feeds the stream and the calibration.
+    The frames are processed by the camera's part of the tracking pipeline and then handed off to
+    the detector process. They are always captured in the default format, so the stream and the
+    tracking work in the same pixel space. If the detector requests another input format, the
+    camera records a second, resized copy on another splitter port, which is handed to the
+    detector along with the frame.
     """
 
-    FRAME_WIDTH: int = 640
-    FRAME_HEIGHT: int = 480
+    FRAME_WIDTH: int = DEFAULT_FRAME_FORMAT.width
+    FRAME_HEIGHT: int = DEFAULT_FRAME_FORMAT.height
     FRAMERATE: int = 5
+    IDLE_FRAMERATE: int = 1
+    IDLE_TIMEOUT: float = 30.0
 
-    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, return_frame: Event,
-                 detection_active: Event, calibration_requests: Queue,
-                 calibration_responses: Queue):
+    def __init__(self, frame_queue: Queue, frame_result_queue: Queue,
+                 subscriptions: Subscriptions, calibration_requests: Queue,
+                 calibration_responses: Queue, frame_format: FrameFormat,
+                 frame_format_requests: Queue, last_activity, pacing: PacingSettings,
+                 source: CameraSource, primary: bool, layout: PipelineLayout):
+        self.source = source
+        self.primary = primary
         self.frame_queue = frame_queue
         self.frame_result_queue = frame_result_queue
-        self.return_frame = return_frame
-        self.detection_active = detection_active
+        self.subscriptions = subscriptions
         self.calibration_requests = calibration_requests
         self.calibration_responses = calibration_responses
+        # input format of the detector, which is passed on with every frame
+        self.frame_format = frame_format
+        self.frame_format_requests = frame_format_requests
+        self.detector_output = None
         self.on_frame = None
-        self.calibration = Calibration((self.FRAME_WIDTH, self.FRAME_HEIGHT), calibration_responses)
-        self.camera = PiCamera()
+        self.pacer = FramePacer(last_activity, pacing, 1 / self.IDLE_FRAMERATE)
+        self.motion_check = MotionCheck()
+        self.calibration = Calibration((self.FRAME_WIDTH, self.FRAME_HEIGHT), calibration_responses,
+                                       source.calibration_suffix)
+        self.undistort = UndistortStage(self.calibration)
+        self.pipeline = layout.build('camera', {
+            'source': lambda: SourceStage(self),
+            'gate': lambda: GateStage(self),
+            'undistort': lambda: self.undistort,
+        }, self.handoff)
+        self.camera = PiCamera(camera_num=source.camera_num)
         self.camera.resolution = (self.FRAME_WIDTH, self.FRAME_HEIGHT)
         self.camera.framerate = self.FRAMERATE
 
+    def is_streaming(self) -> bool:
+        """Returns whether the frames of this camera should be sent to the stream.
+
+        :returns: True if the stream is subscribed and this is the primary camera
+        :rtype: bool
+        """
+        return self.primary and self.subscriptions.is_subscribed(STREAM)
+
+    def is_idle(self) -> bool:
+        """Returns whether the capture can be throttled.
+        The capture is throttled if nobody consumes the frames or if only the detector does and
+        nothing happened for a while. A stream or calibration always receives the full frame rate.
+
+        :returns: True if the capture can be throttled
+        :rtype: bool
+        """
+        if self.calibration.calibrating or self.is_streaming():
+            return False
+
+        return not self.subscriptions.any() or self.pacer.is_idle()
+
+    def handle_requests(self) -> None:
+        """Processes pending calibration and frame format requests."""
+        while not self.calibration_requests.empty():
+            try:
+                start, finish, repeat = self.calibration_requests.get_nowait()
+                self.calibration.handle_request(start, finish, repeat)
+            except Empty:
+                pass
+
+        self.calibration.poll_solver()
+
+        while not self.frame_format_requests.empty():
+            try:
+                self.frame_format = self.frame_format_requests.get_nowait()
+            except Empty:
+                pass
+
+    def update_detector_output(self) -> None:
+        """Records the copy for the detector in its input format. The copy is only needed if the
+        format differs from the captured one, the recording is restarted if it has changed.
+        """
+        output = self.detector_output
+        if output is not None and output.frame_format == self.frame_format:
+            return
+
+        if output is not None:
+            self.camera.stop_recording(splitter_port=DETECTOR_SPLITTER_PORT)
+            self.detector_output = None
+
+        if self.frame_format != DEFAULT_FRAME_FORMAT:
+            output = LatestFrameOutput(self.camera, self.frame_format)
+            self.camera.start_recording(output, format=output.recording_format,
+                                        resize=self.frame_format.size,
+                                        splitter_port=DETECTOR_SPLITTER_PORT)
+            self.detector_output = output
+            print('[Camera] Recording detector frames in {}'.format(self.frame_format))
+
     def process(self) -> None:
         """Processes the camera frames."""
         try:
-            raw_capture = PiRGBArray(self.camera, size=(self.FRAME_WIDTH, self.FRAME_HEIGHT))
-            for frame in self.camera.capture_continuous(raw_capture, format='bgr',
-                                                        use_video_port=True):
-                frame_data = frame.array
-
-                # process calibration requests
-                while not self.calibration_requests.empty():
-                    try:
-                        start, finish, repeat = self.calibration_requests.get_nowait()
-                        self.calibration.handle_request(start, finish, repeat)
-                    except Empty:
-                        pass
-
-                if self.calibration.calibrating:
-                    self.calibration.handle_frame(frame_data)
-                    cv2.putText(frame_data, 'Calibrating Camera', (10, self.FRAME_HEIGHT - 20),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                else:
-                    frame_data = self.calibration.correct_frame(frame_data)
-
-                    # clear current frame queue
-                    while not self.frame_queue.empty():
-                        try:
-                            self.frame_queue.get_nowait()
-                        except Empty:
-                            pass
-
-                    # add frame to the queue
-                    self.frame_queue.put_nowait(frame_data)
-
-                if self.return_frame.is_set() and not self.detection_active.is_set():
-                    # call frame listener
-                    self.frame_result_queue.put_nowait(frame_data)
-
-                # clear stream for next frame
-                raw_capture.truncate(0)
-
-                sleep(0.1)
+            self.capture()
         finally:
+            if self.detector_output is not None:
+                self.camera.stop_recording(splitter_port=DETECTOR_SPLITTER_PORT)
             self.camera.close()
 
-        if self.return_frame.is_set():
+        if self.is_streaming():
             self.frame_result_queue.put_nowait(None)
+
+    def capture(self) -> None:
+        """Captures and processes frames in the default format, along with the latest copy
+        recorded in the input format of the detector.
+        """
+        raw_capture = PooledBGRArray(self.camera, size=DEFAULT_FRAME_FORMAT.size)
+        self.update_detector_output()
+
+        capture_started_at = perf_counter()
+        for frame in self.camera.capture_continuous(raw_capture, format='bgr',
+                                                    use_video_port=True):
+            # the time spent waiting for the frame is accounted to the source stage
+            context = FrameContext(frame.array, self.source.axis, self.frame_format)
+            if self.detector_output is not None and self.subscriptions.is_subscribed(DETECTOR):
+                context.input_frame = self.detector_output.latest()
+            self.pipeline.run(context, capture_started_at)
+            # apply a changed input format requested while running the source stage
+            self.update_detector_output()
+
+            CAPTURE_IDLE.set(1 if self.is_idle() else 0)
+
+            # clear stream for next frame
+            raw_capture.truncate(0)
+
+            self.pacer.wait(self.is_idle())
+            capture_started_at = perf_counter()
+
+    def handoff(self, context: FrameContext) -> None:
+        """Hands the processed frame off to the detector or, if it is not running, to the stream.
+
+        :param FrameContext context: Frame context
+        """
+        if self.subscriptions.is_subscribed(DETECTOR):
+            # clear current frame queue
+            while not self.frame_queue.empty():
+                try:
+                    self.frame_queue.get_nowait()
+                    FRAMES_DROPPED.inc()
+                except Empty:
+                    pass
+
+            # add frame to the queue
+            self.frame_queue.put_nowait(context)
+        elif self.is_streaming():
+            # the stream receives corrected frames, even if the detector undistorts them
+            if self.undistort not in self.pipeline.stages:
+                self.undistort.process(context)
+
+            # call frame listener
+            self.frame_result_queue.put_nowait(context.frame)
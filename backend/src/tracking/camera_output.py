@@ -0,0 +1,104 @@
+"""Camera outputs that write captured frames into preallocated buffers."""
+
+from threading import Lock
+from picamera.array import PiArrayOutput, raw_resolution  # pylint: disable=import-error
+from picamera.array import PiAnalysisOutput  # pylint: disable=import-error
+import numpy as np
+from numpy import ndarray
+from .buffer_pool import BUFFER_POOL
+from .frame_format import FrameFormat, COLOR_GRAY
+
+
+class PooledBGRArray(PiArrayOutput):
+    """Captures BGR frames into a preallocated buffer instead of creating a new array per frame.
+    After each capture, `array` references the same buffer which is overwritten by the next one.
+
+    :param picamera.PiCamera camera: Camera instance
+    :param tuple size: Size (width, height) of the captured frames
+    """
+
+    def __init__(self, camera, size):
+        super().__init__(camera, size)
+        width, height = size
+        self.raw_size = raw_resolution(size)
+        self.buffer = BUFFER_POOL.get((height, width, 3), tag='capture')
+
+    def flush(self) -> None:
+        """Copies the captured bytes into the buffer."""
+        super().flush()
+        raw_width, raw_height = self.raw_size
+        height, width = self.buffer.shape[:2]
+        view = self.getbuffer()
+
+        try:
+            raw = np.frombuffer(view, dtype=np.uint8, count=raw_width * raw_height * 3)
+            np.copyto(self.buffer, raw.reshape((raw_height, raw_width, 3))[:height, :width])
+            del raw
+        finally:
+            # the view has to be released before the stream can be truncated again
+            view.release()
+
+        self.array = self.buffer
+
+
+class LatestFrameOutput(PiAnalysisOutput):
+    """Keeps the latest frame of a recording on a splitter port in a preallocated buffer.
+    The camera resizes the frames, and for grayscale frames only the luma plane of the YUV data
+    is copied, so no conversion is left to the CPU. The recording writes from a thread of the
+    camera, so the frame is copied out under a lock.
+
+    :param picamera.PiCamera camera: Camera instance
+    :param FrameFormat frame_format: Format of the recorded frames
+    """
+
+    def __init__(self, camera, frame_format: FrameFormat):
+        super().__init__(camera, frame_format.size)
+        self.frame_format = frame_format
+        self.raw_size = raw_resolution(frame_format.size)
+        self.channels = 1 if frame_format.color == COLOR_GRAY else 3
+        shape = (frame_format.height, frame_format.width)
+        if self.channels == 3:
+            shape += (3,)
+        self.buffer = BUFFER_POOL.get(shape, tag='input-capture')
+        self.lock = Lock()
+        self.has_frame = False
+
+    @property
+    def recording_format(self) -> str:
+        """Returns the format to record in.
+
+        :returns: `yuv` for grayscale frames, otherwise `bgr`
+        :rtype: str
+        """
+        return 'yuv' if self.channels == 1 else 'bgr'
+
+    def write(self, b) -> int:
+        """Copies a recorded frame into the buffer.
+
+        :param b: Frame data, for YUV starting with the luma plane
+        :returns: Number of bytes consumed
+        :rtype: int
+        """
+        raw_width, raw_height = self.raw_size
+        count = raw_width * raw_height * self.channels
+
+        if len(b) >= count:
+            raw = np.frombuffer(b, dtype=np.uint8, count=count)
+            height, width = self.buffer.shape[:2]
+            raw_shape = (raw_height, raw_width) if self.channels == 1 else \
+                (raw_height, raw_width, 3)
+
+            with self.lock:
+                np.copyto(self.buffer, raw.reshape(raw_shape)[:height, :width])
+                self.has_frame = True
+
+        return len(b)
+
+    def latest(self) -> ndarray:
+        """Returns a copy of the latest frame.
+
+        :returns: Frame or None if no frame has been recorded yet
+        :rtype: numpy.ndarray
+        """
+        with self.lock:
+            return self.buffer.copy() if self.has_frame else None
@@ -0,0 +1,51 @@
+"""Describes a camera attached to the node."""
+
+AXES = ('x', 'y')
+
+
+class CameraSource:
+    """Describes a camera attached to the node.
+
+    :param int camera_num: Port of the camera
+    :param str axis: Coordinate axis (x or y) tracked by this camera. If None, the coordinate
+                     type of the node is used.
+    """
+
+    def __init__(self, camera_num: int = 0, axis: str = None):
+        if axis is not None and axis not in AXES:
+            raise ValueError('Unknown coordinate axis: {}'.format(axis))
+
+        self.camera_num = camera_num
+        self.axis = axis
+
+    @property
+    def calibration_suffix(self) -> str:
+        """Returns the suffix of the calibration file of this camera.
+
+        :returns: Empty for the first camera to keep the existing file names
+        :rtype: str
+        """
+        return '' if self.camera_num == 0 else '_{}'.format(self.camera_num)
+
+    @staticmethod
+    def from_json(data: dict):
+        """Reads data from a JSON object and returns a new camera source instance.
+
+        :param dict data: JSON data
+        :returns: Camera source
+        :rtype: CameraSource
+        """
+        return CameraSource(camera_num=data.get('camera', 0), axis=data.get('axis'))
+
+    def to_json(self) -> dict:
+        """Creates a JSON serializable object.
+
+        :returns: JSON serializable object
+        :rtype: dict
+        """
+        json = {'camera': self.camera_num}
+
+        if self.axis is not None:
+            json['axis'] = self.axis
+
+        return json
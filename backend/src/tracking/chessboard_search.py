@@ -0,0 +1,110 @@
+"""Searches chessboards for the camera calibration in a worker thread."""
+
+from queue import Queue, Empty, Full
+from threading import Thread
+from time import time
+import cv2
+import numpy as np
+
+CHESSBOARD_SIZE = (7, 7)  # inner size
+SEARCH_SCALE = 0.5  # the chessboard is searched in a downscaled frame first
+SEARCH_FLAGS = cv2.CALIB_CB_FAST_CHECK | cv2.CALIB_CB_ADAPTIVE_THRESH | \
+    cv2.CALIB_CB_NORMALIZE_IMAGE
+CORNER_WINDOW_SIZE = (11, 11)
+CORNER_ZERO_ZONE = (-1, -1)
+CORNER_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+JPEG_QUALITY = 80  # the image is only a preview for the interface
+
+
+class ChessboardSearch:
+    """Searches chessboards for the camera calibration in a worker thread, so the capture loop
+    is not blocked. The chessboard is searched in a downscaled frame and only the found corners
+    are refined in the full size frame. The images of the found chessboards are encoded in
+    memory and sent to the master without touching the disk.
+    """
+
+    def __init__(self):
+        self.frames = Queue(maxsize=1)
+        self.results = Queue()
+        self.searching = False
+        self.thread = Thread(target=self.run, name='chessboard-search', daemon=True)
+        self.thread.start()
+
+    def search(self, frame: np.ndarray, generation: int) -> bool:
+        """Starts searching a chessboard in the given frame, unless a search is still running.
+
+        :param numpy.ndarray frame: Color frame, which will be copied
+        :param int generation: Identifies the calibration step the frame belongs to
+        :returns: True if the search has been started
+        :rtype: bool
+        """
+        if self.searching:
+            return False
+
+        try:
+            self.searching = True
+            self.frames.put_nowait((frame.copy(), generation))
+            return True
+        except Full:
+            return False
+
+    def result(self) -> tuple:
+        """Returns the next search result.
+
+        :returns: (generation, corners, file name, JPEG data) or None if no result is available
+        :rtype: tuple
+        """
+        try:
+            return self.results.get_nowait()
+        except Empty:
+            return None
+
+    def run(self) -> None:
+        """Processes the frames to search."""
+        while True:
+            frame, generation = self.frames.get()
+
+            try:
+                corners = self.find_corners(frame)
+                if corners is not None:
+                    self.results.put((generation, corners) + self.encode_image(frame, corners))
+            except cv2.error as error:  # pylint: disable=catching-non-exception
+                print('[Camera Calibration] Chessboard search failed: {}'.format(error))
+            finally:
+                self.searching = False
+
+    @staticmethod
+    def find_corners(frame: np.ndarray) -> np.ndarray:
+        """Finds the chessboard corners in the given frame.
+
+        :param numpy.ndarray frame: Color frame
+        :returns: Refined corners in full size frame coordinates or None if no chessboard is found
+        :rtype: numpy.ndarray
+        """
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small_frame = cv2.resize(gray_frame, None, fx=SEARCH_SCALE, fy=SEARCH_SCALE,
+                                 interpolation=cv2.INTER_AREA)
+
+        found, corners = cv2.findChessboardCorners(small_frame, CHESSBOARD_SIZE, None,
+                                                   SEARCH_FLAGS)
+        if not found:
+            return None
+
+        # refine the scaled up corners in the full size frame
+        corners = corners / SEARCH_SCALE
+        return cv2.cornerSubPix(gray_frame, corners.astype(np.float32), CORNER_WINDOW_SIZE,
+                                CORNER_ZERO_ZONE, CORNER_CRITERIA)
+
+    @staticmethod
+    def encode_image(frame: np.ndarray, corners: np.ndarray) -> tuple:
+        """Encodes the image including the found chessboard as JPEG.
+
+        :param numpy.ndarray frame: Color frame
+        :param numpy.ndarray corners: Found corners
+        :returns: (file name, JPEG data) of the image
+        :rtype: tuple
+        """
+        chessboard_image = cv2.drawChessboardCorners(frame, CHESSBOARD_SIZE, corners, True)
+        _, data = cv2.imencode('.jpg', chessboard_image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+
+        return str(int(time())) + '.jpg', data.tobytes()
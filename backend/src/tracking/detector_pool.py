@@ -0,0 +1,39 @@
+"""Runs the people detectors of all cameras within a single process."""
+
+from queue import Empty
+from time import sleep
+
+IDLE_INTERVAL = 0.005  # seconds to wait if none of the cameras has delivered a frame
+
+
+class DetectorPool:
+    """Runs the people detectors of all cameras within a single process.
+    The cameras are polled one after another without waiting, so a camera that does not deliver
+    any frames does not block the others. The pool only sleeps if no camera has a frame ready.
+
+    :param list detectors: One people detector per camera
+    """
+
+    def __init__(self, detectors: list):
+        self.detectors = detectors
+
+    def process(self) -> None:
+        """Starts people detection for all cameras."""
+        if len(self.detectors) == 1:
+            self.detectors[0].process()
+            return
+
+        while True:
+            processed = False
+
+            for detector in self.detectors:
+                try:
+                    context = detector.frame_queue.get_nowait()
+                except Empty:
+                    continue
+
+                detector.process_frame(context)
+                processed = True
+
+            if not processed:
+                sleep(IDLE_INTERVAL)
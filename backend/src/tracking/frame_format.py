@@ -0,0 +1,41 @@
+"""Describes the size and color format in which frames are captured."""
+
+COLOR_BGR = 'bgr'
+COLOR_GRAY = 'gray'
+
+
+class FrameFormat:
+    """Describes the size and color format in which frames are captured.
+
+    :param int width: Frame width
+    :param int height: Frame height
+    :param str color: Either `bgr` for color frames or `gray` for the luma plane only
+    """
+
+    def __init__(self, width: int, height: int, color: str = COLOR_BGR):
+        if color not in (COLOR_BGR, COLOR_GRAY):
+            raise ValueError('Unknown color format: {}'.format(color))
+
+        self.width = width
+        self.height = height
+        self.color = color
+
+    @property
+    def size(self) -> (int, int):
+        """Returns the size of the frames.
+
+        :returns: (width, height)
+        :rtype: (int, int)
+        """
+        return (self.width, self.height)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FrameFormat) and self.width == other.width and \
+            self.height == other.height and self.color == other.color
+
+    def __repr__(self) -> str:
+        return '{}x{} {}'.format(self.width, self.height, self.color)
+
+
+# all coordinates are reported relative to the default frame width
+DEFAULT_FRAME_FORMAT = FrameFormat(640, 480, COLOR_BGR)
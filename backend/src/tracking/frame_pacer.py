@@ -0,0 +1,136 @@
+"""Paces the frame capture and throttles it while nothing happens in front of the camera."""
+
+from time import monotonic, sleep
+import multiprocessing
+import cv2
+from numpy import ndarray
+from .buffer_pool import BUFFER_POOL
+
+
+MOTION_THUMBNAIL_SIZE = (80, 60)
+MOTION_THRESHOLD = 6.0  # mean absolute difference of the thumbnails in gray levels
+
+
+class PacingSettings:
+    """Frame rate and idle timeout of the capture, shared with the camera process so they can be
+    changed while it is running.
+
+    :param float framerate: Frame rate while there is activity
+    :param float idle_timeout: Seconds without activity until the capture is throttled
+    """
+
+    def __init__(self, framerate: float, idle_timeout: float):
+        self.values = multiprocessing.RawArray('d', [framerate, idle_timeout])
+
+    @property
+    def framerate(self) -> float:
+        """Returns the frame rate while there is activity.
+
+        :returns: Frames per second
+        :rtype: float
+        """
+        return self.values[0]
+
+    @framerate.setter
+    def framerate(self, framerate: float) -> None:
+        self.values[0] = framerate
+
+    @property
+    def idle_timeout(self) -> float:
+        """Returns the seconds without activity until the capture is throttled.
+
+        :returns: Idle timeout in seconds
+        :rtype: float
+        """
+        return self.values[1]
+
+    @idle_timeout.setter
+    def idle_timeout(self, idle_timeout: float) -> None:
+        self.values[1] = idle_timeout
+
+
+class FramePacer:
+    """Paces the frame capture to a target frame interval.
+    The interval is measured from the start of one frame to the start of the next one, so the
+    processing time of a frame does not lower the frame rate. While no activity (detected people
+    or motion) has been reported for the idle timeout, the longer idle interval is used.
+
+    :param multiprocessing.RawValue last_activity: Shared monotonic time of the last activity
+    :param PacingSettings settings: Frame rate and idle timeout while there is activity
+    :param float idle_interval: Frame interval in seconds while idle
+    """
+
+    def __init__(self, last_activity, settings: PacingSettings, idle_interval: float):
+        self.last_activity = last_activity
+        self.settings = settings
+        self.idle_interval = idle_interval
+        self.frame_started_at = monotonic()
+        self.activity()
+
+    def activity(self) -> None:
+        """Reports activity, which switches back to the active frame interval."""
+        self.last_activity.value = monotonic()
+
+    def is_idle(self) -> bool:
+        """Returns whether no activity has been reported for the idle timeout.
+
+        :returns: True if idle
+        :rtype: bool
+        """
+        return monotonic() - self.last_activity.value > self.settings.idle_timeout
+
+    def wait(self, idle: bool) -> None:
+        """Waits until the next frame is due.
+
+        :param bool idle: If true, the idle interval will be used
+        """
+        interval = self.idle_interval if idle else 1 / self.settings.framerate
+        next_frame_at = self.frame_started_at + interval
+        now = monotonic()
+
+        if next_frame_at > now:
+            sleep(next_frame_at - now)
+            self.frame_started_at = next_frame_at
+        else:
+            # the frame took longer than the interval, do not try to catch up
+            self.frame_started_at = now
+
+
+class MotionCheck:
+    """Cheap motion check on small thumbnails of consecutive frames, used to wake up from idle."""
+
+    def __init__(self):
+        self.thumbnail_index = 0
+        self.last_thumbnail = None
+
+    def reset(self) -> None:
+        """Forgets the last frame, so an outdated frame is never compared."""
+        self.last_thumbnail = None
+
+    def changed(self, frame: ndarray) -> bool:
+        """Returns whether the frame differs noticeably from the last checked one.
+
+        :param numpy.ndarray frame: Color or grayscale frame
+        :returns: True if motion has been detected
+        :rtype: bool
+        """
+        # the thumbnails alternate between two buffers as the last one is still needed
+        self.thumbnail_index = 1 - self.thumbnail_index
+        shape = (MOTION_THUMBNAIL_SIZE[1], MOTION_THUMBNAIL_SIZE[0])
+        thumbnail = BUFFER_POOL.get(shape, tag='motion_check' + str(self.thumbnail_index))
+
+        if frame.ndim == 3:
+            small = cv2.resize(frame, MOTION_THUMBNAIL_SIZE, dst=BUFFER_POOL.get(
+                shape + (3,), tag='motion_check_color'), interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=thumbnail)
+        else:
+            cv2.resize(frame, MOTION_THUMBNAIL_SIZE, dst=thumbnail, interpolation=cv2.INTER_AREA)
+
+        last_thumbnail = self.last_thumbnail
+        self.last_thumbnail = thumbnail
+        if last_thumbnail is None:
+            return False
+
+        diff = cv2.absdiff(last_thumbnail, thumbnail, dst=BUFFER_POOL.get(shape,
+                                                                          tag='motion_check_diff'))
+        return cv2.mean(diff)[0] > MOTION_THRESHOLD
@@ -0,0 +1,210 @@
+"""Records the frames and detection results of the tracking for offline evaluation."""
+
+import json
+import zlib
+from pathlib import Path
+from queue import Queue, Full
+from threading import Thread
+from time import time
+from typing import Iterator, List, Tuple
+import numpy as np
+from .pipeline import FrameContext
+
+RECORDINGS_PATH: Path = (Path(__file__).resolve().parent / '..' / '..' / 'assets' /
+                         'recordings').resolve()
+QUEUE_SIZE = 10  # frames waiting for the writer, further frames are skipped
+COMPRESSION_LEVEL = 1  # fast compression, the frames are written at the detector frame rate
+DEFAULT_SEGMENT_FRAMES = 150  # about 30 seconds at 5 FPS
+DEFAULT_SEGMENTS = 8
+DEFAULT_QUOTA_MB = 1024
+
+
+class FrameRecorder:
+    """Records the frames and detection results of the tracking into a ring of segment files.
+    Each segment consists of a data file with the compressed frames and an index file with one
+    JSON line per frame. Both are only appended to. Once a segment is full, the oldest one is
+    deleted if the ring is complete. The compression and writing happen in a worker thread, so
+    the detector only copies the frame. If the recordings reach the disk quota, the recorder
+    stops.
+
+    :param Path path: Folder of the segment files
+    :param int segment_frames: Frames per segment
+    :param int segments: Number of segments kept
+    :param float quota_mb: Maximum size of all segments in MB
+    """
+
+    def __init__(self, path: Path = RECORDINGS_PATH, segment_frames: int = DEFAULT_SEGMENT_FRAMES,
+                 segments: int = DEFAULT_SEGMENTS, quota_mb: float = DEFAULT_QUOTA_MB):
+        self.path = path
+        self.segment_frames = segment_frames
+        self.segments = segments
+        self.quota = quota_mb * 1024 * 1024
+        self.frames = Queue(maxsize=QUEUE_SIZE)
+        self.skipped = 0
+        self.stopped = False
+        self.data_file = None
+        self.index_file = None
+        self.segment_frame_count = 0
+        self.thread = Thread(target=self.run, name='frame-recorder', daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def from_json(data: dict):
+        """Creates a recorder from the config, if it is enabled.
+
+        :param dict data: JSON data, e.g. `{"segment_frames": 150, "segments": 8, "quota_mb": 1024}`
+        :returns: Frame recorder or None if no recorder is configured
+        :rtype: FrameRecorder
+        """
+        if not data:
+            return None
+
+        return FrameRecorder(segment_frames=data.get('segment_frames', DEFAULT_SEGMENT_FRAMES),
+                             segments=data.get('segments', DEFAULT_SEGMENTS),
+                             quota_mb=data.get('quota_mb', DEFAULT_QUOTA_MB))
+
+    def record(self, context: FrameContext) -> None:
+        """Records the frame and the detection results of the given context.
+        Frames are skipped while the writer is busy.
+
+        :param FrameContext context: Frame context which passed the pipeline
+        """
+        if self.stopped:
+            return
+
+        metadata = {
+            'time': time(),
+            'axis': context.axis,
+            'regions': [list(map(int, rect)) for rect in context.regions],
+            'people': [list(map(int, rect)) for rect in context.people],
+            'coordinate': context.coordinate,
+        }
+
+        try:
+            # the frame may be a pooled buffer, which is overwritten by the next frame
+            self.frames.put_nowait((context.frame.copy(), metadata))
+        except Full:
+            self.skipped += 1
+
+    def run(self) -> None:
+        """Compresses and writes the queued frames."""
+        while True:
+            frame, metadata = self.frames.get()
+
+            try:
+                self.write(frame, metadata)
+            except OSError as error:
+                print('[Recorder] Writing the recording failed, stopping: {}'.format(error))
+                self.stop()
+
+    def write(self, frame: np.ndarray, metadata: dict) -> None:
+        """Appends a frame to the current segment.
+
+        :param numpy.ndarray frame: Frame
+        :param dict metadata: Detection results
+        """
+        if self.stopped:
+            return
+
+        if self.data_file is None:
+            self.start_segment()
+
+        data = zlib.compress(frame.tobytes(), COMPRESSION_LEVEL)
+        metadata['offset'] = self.data_file.tell()
+        metadata['length'] = len(data)
+        metadata['shape'] = list(frame.shape)
+        metadata['dtype'] = str(frame.dtype)
+        metadata['skipped'] = self.skipped
+        self.skipped = 0
+
+        self.data_file.write(data)
+        self.index_file.write(json.dumps(metadata) + '\n')
+        self.segment_frame_count += 1
+
+        if self.segment_frame_count >= self.segment_frames:
+            self.close_segment()
+
+    def start_segment(self) -> None:
+        """Starts a new segment and deletes the oldest ones outside of the ring or the quota."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        segments = list_segments(self.path)
+
+        while len(segments) >= self.segments:
+            oldest = segments.pop(0)
+            oldest.unlink()
+            try:
+                oldest.with_suffix('.idx').unlink()
+            except FileNotFoundError:
+                pass
+
+        if sum(segment_size(segment) for segment in segments) >= self.quota:
+            print('[Recorder] Disk quota of {} MB reached, stopping'.format(
+                self.quota / 1024 / 1024))
+            self.stop()
+            return
+
+        name = 'segment-{}'.format(int(time() * 1000))
+        print('[Recorder] Recording {}'.format(name))
+        self.data_file = open(self.path / (name + '.bin'), 'ab')
+        self.index_file = open(self.path / (name + '.idx'), 'a', buffering=1)
+        self.segment_frame_count = 0
+
+    def close_segment(self) -> None:
+        """Closes the current segment."""
+        if self.data_file is not None:
+            self.data_file.close()
+            self.index_file.close()
+            self.data_file = None
+            self.index_file = None
+
+    def stop(self) -> None:
+        """Stops the recording."""
+        self.stopped = True
+        self.close_segment()
+
+
+def list_segments(path: Path) -> List[Path]:
+    """Returns the data files of all segments, starting with the oldest one.
+
+    :param Path path: Folder of the segment files
+    :returns: Data files
+    :rtype: list
+    """
+    return sorted(path.glob('segment-*.bin'))
+
+
+def segment_size(segment: Path) -> int:
+    """Returns the size of a segment including its index.
+
+    :param Path segment: Data file of the segment
+    :returns: Size in bytes
+    :rtype: int
+    """
+    index = segment.with_suffix('.idx')
+    return segment.stat().st_size + (index.stat().st_size if index.exists() else 0)
+
+
+def replay(path: Path = RECORDINGS_PATH) -> Iterator[Tuple[np.ndarray, dict]]:
+    """Reads the recorded frames of all segments in the order they were recorded.
+    Frames of a segment that is still written are only returned up to the last complete one.
+
+    :param Path path: Folder of the segment files
+    :returns: Frame and its detection results
+    :rtype: Iterator[Tuple[numpy.ndarray, dict]]
+    """
+    for segment in list_segments(path):
+        with open(segment.with_suffix('.idx'), 'r') as index_file, \
+                open(segment, 'rb') as data_file:
+            for line in index_file:
+                try:
+                    metadata = json.loads(line)
+                except ValueError:
+                    break
+
+                data_file.seek(metadata['offset'])
+                data = data_file.read(metadata['length'])
+                if len(data) < metadata['length']:
+                    break
+
+                frame = np.frombuffer(zlib.decompress(data), dtype=metadata['dtype'])
+                yield frame.reshape(metadata['shape']), metadata
@@ -0,0 +1,236 @@
+"""Steps the people detection down to cheaper settings when a node runs out of headroom."""
+
+import asyncio
+import os
+from pathlib import Path
+from time import monotonic
+from .frame_format import FrameFormat
+from .instrumentation import DETECTOR_FPS, CAPTURE_IDLE
+
+CHECK_INTERVAL = 5  # seconds between two checks
+SETTLE_TIME = 20  # seconds after a change until the detector fps is meaningful again
+STEP_DOWN_CHECKS = 3  # consecutive checks under pressure until stepping down
+STEP_UP_CHECKS = 12  # consecutive checks with headroom until stepping up
+TEMPERATURE_HIGH = 75.0  # the soc throttles itself at 80 degrees
+TEMPERATURE_LOW = 65.0
+LOAD_HIGH = 1.5  # load average per core
+LOAD_LOW = 0.8
+FPS_RATIO_LOW = 0.6  # detector fps relative to the capture frame rate
+FPS_RATIO_HIGH = 0.9
+GATED_IDLE_TIMEOUT = 5.0  # seconds without detections until only motion wakes the camera up
+
+
+class GovernorLevel:
+    """Settings of the people detection on one level of the governor.
+
+    :param str detector: Detection algorithm
+    :param float framerate: Frame rate of the capture
+    :param FrameFormat input_format: Input format of the detector, its own format if None
+    :param bool motion_gated: If true, the capture is throttled soon after the last detection
+                              and only a motion check wakes it up again
+    """
+
+    def __init__(self, detector: str, framerate: float, input_format: FrameFormat = None,
+                 motion_gated: bool = False):
+        self.detector = detector
+        self.framerate = framerate
+        self.input_format = input_format
+        self.motion_gated = motion_gated
+
+    def __repr__(self) -> str:
+        return '{} ({}) at {} FPS{}'.format(self.detector, self.input_format or 'default format',
+                                            self.framerate,
+                                            ', motion gated' if self.motion_gated else '')
+
+
+# ordered from the most expensive to the cheapest settings
+LEVELS = [
+    GovernorLevel('yolo', 5),
+    GovernorLevel('yolo', 5, FrameFormat(320, 320)),
+    GovernorLevel('yolo', 3, FrameFormat(320, 320)),
+    GovernorLevel('hog', 3),
+    GovernorLevel('hog_gray', 3),
+    GovernorLevel('hog_gray', 2, motion_gated=True),
+    GovernorLevel('motion', 2, motion_gated=True),
+]
+
+
+class SystemSensors:
+    """Reads the SoC temperature and the CPU load of the node.
+    The paths can be changed to read fake values from regular files.
+
+    :param Path temperature_path: File containing the temperature in millidegrees celsius
+    :param Path load_path: File in the format of `/proc/loadavg`
+    """
+
+    def __init__(self, temperature_path: Path = Path('/sys/class/thermal/thermal_zone0/temp'),
+                 load_path: Path = Path('/proc/loadavg')):
+        self.temperature_path = temperature_path
+        self.load_path = load_path
+
+    def temperature(self) -> float:
+        """Returns the SoC temperature.
+
+        :returns: Temperature in degrees celsius or None if not available
+        :rtype: float
+        """
+        try:
+            return int(self.temperature_path.read_text().strip()) / 1000
+        except (OSError, ValueError):
+            return None
+
+    def load(self) -> float:
+        """Returns the load average of the last minute per core.
+
+        :returns: Load per core or None if not available
+        :rtype: float
+        """
+        try:
+            return float(self.load_path.read_text().split()[0]) / (os.cpu_count() or 1)
+        except (OSError, ValueError, IndexError):
+            return None
+
+
+class Governor:
+    """Steps the people detection down to cheaper settings when a node runs out of headroom.
+    The detector fps, the CPU load and the SoC temperature are checked periodically. If the node
+    is under pressure for multiple checks, the next cheaper level is used. Once there is enough
+    headroom for a longer time, the governor steps back up again, but never above the detector
+    configured for the node.
+
+    :param tracking.manager.TrackingManager tracking: Tracking manager
+    :param SystemSensors sensors: Source of the temperature and load
+    """
+
+    def __init__(self, tracking, sensors: SystemSensors = None):
+        self.tracking = tracking
+        self.sensors = sensors or SystemSensors()
+        self.listeners = []
+        self.index = 0
+        self.pressure_checks = 0
+        self.headroom_checks = 0
+        self.changed_at = monotonic()
+        self.reason = ''
+        self.temperature = None
+        self.load = None
+        self.fps = 0.0
+
+    def register_listener(self, listener: callable) -> None:
+        """Registers a listener that is called after each decision.
+
+        :param callable listener: Listener function without any arguments
+        """
+        self.listeners.append(listener)
+
+    def ladder(self) -> list:
+        """Returns the levels available for the configured detector.
+
+        :returns: Levels starting with the configured detector
+        :rtype: list
+        """
+        for index, level in enumerate(LEVELS):
+            if level.detector == self.tracking.detector:
+                return LEVELS[index:]
+
+        return []
+
+    def level(self) -> GovernorLevel:
+        """Returns the current level.
+
+        :returns: Current level or None if the configured detector is not governed
+        :rtype: GovernorLevel
+        """
+        ladder = self.ladder()
+        return ladder[min(self.index, len(ladder) - 1)] if len(ladder) > 0 else None
+
+    def reset(self) -> None:
+        """Goes back to the configured settings, e.g. after the detector has been changed."""
+        self.index = 0
+        self.pressure_checks = 0
+        self.headroom_checks = 0
+        self.changed_at = monotonic()
+
+    async def run(self) -> None:
+        """Periodically checks the headroom of the node."""
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            await self.check()
+
+    async def check(self) -> None:
+        """Checks the headroom of the node and changes the level if necessary."""
+        ladder = self.ladder()
+        if len(ladder) == 0 or not self.tracking.is_process_running('detector'):
+            return
+
+        level = ladder[self.index]
+        self.temperature = self.sensors.temperature()
+        self.load = self.sensors.load()
+        # the slowest camera limits the tracking of the node
+        self.fps = min((DETECTOR_FPS.labels(source.camera_num).get()
+                        for source in self.tracking.sources), default=0.0)
+        # the fps is meaningless while the capture is throttled or the detector is starting
+        fps_valid = CAPTURE_IDLE.get() == 0 and monotonic() - self.changed_at > SETTLE_TIME
+
+        pressure = self.pressure(level, fps_valid)
+        if pressure is not None:
+            self.pressure_checks += 1
+            self.headroom_checks = 0
+        elif self.has_headroom(level, fps_valid):
+            self.headroom_checks += 1
+            self.pressure_checks = 0
+        else:
+            self.pressure_checks = 0
+            self.headroom_checks = 0
+
+        if self.pressure_checks >= STEP_DOWN_CHECKS and self.index < len(ladder) - 1:
+            await self.step(self.index + 1, pressure)
+        elif self.headroom_checks >= STEP_UP_CHECKS and self.index > 0:
+            await self.step(self.index - 1, 'headroom')
+
+    def pressure(self, level: GovernorLevel, fps_valid: bool) -> str:
+        """Returns why the node is under pressure.
+
+        :param GovernorLevel level: Current level
+        :param bool fps_valid: Whether the detector fps can be taken into account
+        :returns: Reason or None if the node is not under pressure
+        :rtype: str
+        """
+        if self.temperature is not None and self.temperature > TEMPERATURE_HIGH:
+            return 'temperature {:.1f}'.format(self.temperature)
+        if self.load is not None and self.load > LOAD_HIGH:
+            return 'load {:.2f}'.format(self.load)
+        if fps_valid and self.fps < FPS_RATIO_LOW * level.framerate:
+            return 'fps {:.1f}'.format(self.fps)
+
+        return None
+
+    def has_headroom(self, level: GovernorLevel, fps_valid: bool) -> bool:
+        """Returns whether the node has enough headroom for a more expensive level.
+
+        :param GovernorLevel level: Current level
+        :param bool fps_valid: Whether the detector fps can be taken into account
+        :returns: True if there is headroom
+        :rtype: bool
+        """
+        return (self.temperature is None or self.temperature < TEMPERATURE_LOW) and \
+            (self.load is None or self.load < LOAD_LOW) and \
+            (not fps_valid or self.fps >= FPS_RATIO_HIGH * level.framerate)
+
+    async def step(self, index: int, reason: str) -> None:
+        """Changes to the given level and informs the listeners.
+
+        :param int index: Index of the new level within the ladder
+        :param str reason: Reason of the change
+        """
+        self.index = index
+        self.reason = reason
+        self.pressure_checks = 0
+        self.headroom_checks = 0
+        self.changed_at = monotonic()
+
+        level = self.level()
+        print('[Governor] {}, switching to level {}: {}'.format(reason, index, level))
+        self.tracking.set_governor_level(None if index == 0 else level)
+
+        for listener in self.listeners:
+            await listener()
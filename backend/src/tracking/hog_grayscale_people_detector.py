@@ -1,17 +1,22 @@
 """Detects people in a given grayscale camera frame."""
-from multiprocessing import Queue, Event
+from multiprocessing import Queue
 import cv2
 from numpy import ndarray
 from .hog_people_detector import HogPeopleDetector
+from .subscriptions import Subscriptions
+from .buffer_pool import BUFFER_POOL
+from .frame_format import FrameFormat, DEFAULT_FRAME_FORMAT, COLOR_GRAY
 
 
 class HogGrayscalePeopleDetector(HogPeopleDetector):
     """Detects people in a given grayscale camera frame."""
 
-    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, return_frame: Event,
-                 coordinate_queue: Queue, people_group: str):
-        super().__init__(frame_queue, frame_result_queue, return_frame, coordinate_queue,
-                         people_group)
+    INPUT_FORMAT = FrameFormat(DEFAULT_FRAME_FORMAT.width, DEFAULT_FRAME_FORMAT.height, COLOR_GRAY)
+
+    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, subscriptions: Subscriptions,
+                 coordinate_queue: Queue, people_group: str, last_activity):
+        super().__init__(frame_queue, frame_result_queue, subscriptions, coordinate_queue,
+                         people_group, last_activity)
         self.name = "HoG G"
 
     def detect(self, frame: ndarray) -> list:
@@ -21,5 +26,9 @@ class HogGrayscalePeopleDetector(HogPeopleDetector):
         :returns: Detected people as bounding boxes
         :rtype: list
         """
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if frame.ndim == 2:
+            return super().detect(frame)
+
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY,
+                                  dst=BUFFER_POOL.get(frame.shape[:2], tag='gray'))
         return super().detect(gray_frame)
@@ -1,9 +1,10 @@
 """Detects people in a given camera frame."""
-from multiprocessing import Queue, Event
+from multiprocessing import Queue
 import cv2
 from numpy import ndarray
 from imutils.object_detection import non_max_suppression
 from .people_detector import PeopleDetector
+from .subscriptions import Subscriptions
 
 
 GROUP_THRESHOLD_WIDTH = 50
@@ -13,10 +14,15 @@ GROUP_THRESHOLD_HEIGTH = 50
 class HogPeopleDetector(PeopleDetector):
     """Detects people in a given camera frame."""
 
-    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, return_frame: Event,
-                 coordinate_queue: Queue, people_group: str):
-        super().__init__(frame_queue, frame_result_queue, return_frame, coordinate_queue,
-                         people_group)
+    # the detection time grows with the scanned area, so only scan around confirmed people
+    ROI_DETECTION = True
+    # detection window (64x128) plus the padding used during the detection
+    ROI_MIN_SIZE = (80, 144)
+
+    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, subscriptions: Subscriptions,
+                 coordinate_queue: Queue, people_group: str, last_activity):
+        super().__init__(frame_queue, frame_result_queue, subscriptions, coordinate_queue,
+                         people_group, last_activity)
         self.name = "HoG"
         self.hog = cv2.HOGDescriptor()
         self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
@@ -0,0 +1,31 @@
+"""Metrics recorded by the camera and people detector processes."""
+
+from metrics import REGISTRY
+
+# stages of the tracking pipeline in the order they run
+STAGES = ('source', 'gate', 'undistort', 'detect', 'track', 'coordinate', 'record', 'publish')
+
+DETECTOR_FPS = REGISTRY.gauge('tracking_detector_fps',
+                              'Frames per second processed by the people detector per camera',
+                              ('camera',))
+STAGE_SECONDS = REGISTRY.histogram('tracking_stage_seconds',
+                                   'Processing time of a single frame per tracking stage',
+                                   ('stage',))
+STAGE_DROPS = REGISTRY.counter('tracking_stage_drops_total',
+                               'Frames dropped by a tracking stage', ('stage',))
+STAGE_SKIPS = REGISTRY.counter('tracking_stage_skips_total',
+                               'Frames a tracking stage intentionally did not pass on',
+                               ('stage', 'reason'))
+FRAMES_CAPTURED = REGISTRY.counter('tracking_frames_captured_total',
+                                   'Frames captured by the camera')
+FRAMES_DROPPED = REGISTRY.counter('tracking_frames_dropped_total',
+                                  'Frames replaced before the detector consumed them')
+CAPTURE_IDLE = REGISTRY.gauge('tracking_capture_idle',
+                              'Whether the camera is throttled because nothing happens (0 or 1)')
+
+# children must exist before the tracking processes are started to share their values
+for stage in STAGES:
+    STAGE_SECONDS.labels(stage)
+    STAGE_DROPS.labels(stage)
+STAGE_SKIPS.labels('source', 'calibration')
+STAGE_SKIPS.labels('gate', 'no_consumer')
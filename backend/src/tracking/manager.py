@@ -2,13 +2,27 @@
 
 import multiprocessing
 import asyncio
+from typing import List
 from concurrent.futures import ProcessPoolExecutor
 import cv2
+from profiling import profile_file_name, start_profile, start_profile_listener
 from .camera import Camera
 from .yolo_people_detector import YoloPeopleDetector
 from .hog_people_detector import HogPeopleDetector
 from .hog_grayscale_people_detector import HogGrayscalePeopleDetector
 from .motion_people_detector import MotionPeopleDetector
+from .frame_format import FrameFormat, DEFAULT_FRAME_FORMAT
+from .subscriptions import Subscriptions, DETECTOR, STREAM
+from .thread_budget import ThreadBudget
+from .frame_pacer import PacingSettings
+from .governor import Governor, GovernorLevel, GATED_IDLE_TIMEOUT
+from .camera_source import CameraSource
+from .detector_pool import DetectorPool
+from .pipeline import PipelineLayout
+from .stages import UndistortStage, RecordStage
+from .calibration import Calibration, save_image
+from .frame_recorder import FrameRecorder
+from .instrumentation import DETECTOR_FPS
 
 
 DEFAULT_DETECTOR = 'yolo'
@@ -20,20 +34,31 @@ DETECTORS = {
 }
 DEFAULT_PEOPLE_GROUP = 'average'
 PEOPLE_GROUPS = ['average', 'track']
-
-
-def start_camera(frame_queue, frame_result_queue, return_frame, detection_active,
-                 camera_calibration_requests, camera_calibration_responses) -> None:
-    """Starts the camera in a subprocess."""
-    camera = Camera(frame_queue, frame_result_queue, return_frame, detection_active,
-                    camera_calibration_requests, camera_calibration_responses)
+PROFILED_PROCESSES = ['main', 'camera', 'detector']
+
+
+def start_camera(frame_queue, frame_result_queue, subscriptions,
+                 camera_calibration_requests, camera_calibration_responses,
+                 profile_requests, frame_format, frame_format_requests, last_activity,
+                 thread_budget, pacing, source, primary, layout) -> None:
+    """Starts a camera in a subprocess."""
+    thread_budget.apply('camera')
+    if profile_requests is not None:
+        start_profile_listener(profile_requests)
+    camera = Camera(frame_queue, frame_result_queue, subscriptions,
+                    camera_calibration_requests, camera_calibration_responses, frame_format,
+                    frame_format_requests, last_activity, pacing, source, primary, layout)
     camera.process()
 
 
-def start_detector(frame_queue, frame_result_queue, return_frame, coordinate_queue,
-                   detector_algorithm, people_group) -> None:
-    """Starts the people detector in a subprocess."""
-    detector = None
+def start_detector(frame_queues, frame_result_queue, subscriptions, coordinate_queue,
+                   detector_algorithm, people_group, profile_requests, last_activity,
+                   thread_budget, sources, layout, recorder_config) -> None:
+    """Starts the people detectors of all cameras in a subprocess."""
+    detectors = []
+    recorder = FrameRecorder.from_json(recorder_config)
+    thread_budget.apply('detector')
+    start_profile_listener(profile_requests)
 
     if detector_algorithm not in DETECTORS:
         raise RuntimeError('Unknown detection algorithm: {}'.format(detector_algorithm))
@@ -41,17 +66,42 @@ def start_detector(frame_queue, frame_result_queue, return_frame, coordinate_que
     if people_group not in PEOPLE_GROUPS:
         raise RuntimeError('Unknown people group algorithm: {}'.format(people_group))
 
-    detector = DETECTORS[detector_algorithm](frame_queue, frame_result_queue, return_frame,
-                                             coordinate_queue, people_group)
-    detector.process()
+    for index, (frame_queue, source) in enumerate(zip(frame_queues, sources)):
+        detector = DETECTORS[detector_algorithm](frame_queue, frame_result_queue, subscriptions,
+                                                 coordinate_queue, people_group, last_activity)
+        detector.axis = source.axis
+        detector.primary = index == 0
+        detector.camera_num = source.camera_num
 
+        factories = detector.stage_factories()
+        factories['undistort'] = lambda source=source: UndistortStage(
+            Calibration(DEFAULT_FRAME_FORMAT.size, None, source.calibration_suffix), refresh=True)
+        if recorder is not None:
+            factories['record'] = lambda: RecordStage(recorder)
+        detector.pipeline = layout.build('detector', factories)
+        detectors.append(detector)
 
-class TrackingManager:
-    """The tracking manager can start or stop the camera tracking and forward callbacks."""
+    DetectorPool(detectors).process()
 
-    def __init__(self, config):
+
+class TrackingManager:
+    """The tracking manager can start or stop the camera tracking and forward callbacks.
+    Each camera attached to the node runs in its own process, while a single detector process
+    serves all of them. The first camera is the primary one, which feeds the stream and can be
+    calibrated.
+    The stages of the tracking pipeline are placed on the processes according to the layout
+    configured for the node.
+    """
+
+    def __init__(self, config, thread_budget: ThreadBudget):
         self.config = config
-        self.camera_process = None
+        self.thread_budget = thread_budget
+        self.layout = PipelineLayout(config.pipeline)
+        self.sources: List[CameraSource] = config.cameras
+        # children must exist before the tracking processes are started to share their values
+        for source in self.sources:
+            DETECTOR_FPS.labels(source.camera_num)
+        self.camera_processes = []
         self.detector_process = None
         self.detector = DEFAULT_DETECTOR
         self.people_group = DEFAULT_PEOPLE_GROUP
@@ -62,13 +112,24 @@ class TrackingManager:
         self.cluster_slave = None
 
         manager = multiprocessing.Manager()
-        self.frame_queue = manager.Queue()
+        self.frame_queues = [manager.Queue() for _ in self.sources]
         self.frame_result_queue = manager.Queue()
-        self.camera_calibration_requests = manager.Queue()
+        # only the primary camera receives calibration requests
+        self.camera_calibration_requests = [manager.Queue() for _ in self.sources]
         self.camera_calibration_responses = manager.Queue()
         self.coordinate_queue = manager.Queue()
-        self.detection_active = manager.Event()
-        self.return_frame = manager.Event()
+        self.subscriptions = Subscriptions()
+        self.frame_format_requests = [manager.Queue() for _ in self.sources]
+        self.profile_requests = {
+            'camera': manager.Queue(),
+            'detector': manager.Queue(),
+        }
+        # monotonic time of the last detected person or motion, shared with the tracking processes
+        self.last_activity = multiprocessing.RawValue('d', 0.0)
+        self.pacing = PacingSettings(Camera.FRAMERATE, Camera.IDLE_TIMEOUT)
+        # settings chosen by the governor instead of the configured ones
+        self.governor_level = None
+        self.governor = Governor(self)
 
     async def on_settings_changed(self) -> None:
         """Update the tracking status when the settings have changed."""
@@ -87,11 +148,11 @@ class TrackingManager:
         :returns: True if the camera is active
         :rtype: bool
         """
-        return self.camera_process is not None
+        return len(self.camera_processes) > 0
 
     def acquire_camera(self) -> None:
         """Ensures the tracking is running."""
-        if self.camera_process is None:
+        if not self.is_camera_active():
             self.start_camera()
 
         self.camera_listeners += 1
@@ -107,41 +168,112 @@ class TrackingManager:
 
     def start_camera(self) -> None:
         """Start the camera tracking."""
-        if self.camera_process is None:
-            print('[Tracking] Starting camera')
-            self.camera_process = multiprocessing.Process(
-                target=start_camera, args=(self.frame_queue, self.frame_result_queue,
-                                           self.return_frame, self.detection_active,
-                                           self.camera_calibration_requests,
-                                           self.camera_calibration_responses, ))
-            self.camera_process.start()
+        if not self.is_camera_active():
+            for index, source in enumerate(self.sources):
+                print('[Tracking] Starting camera {}'.format(source.camera_num))
+                primary = index == 0
+                camera_process = multiprocessing.Process(
+                    target=start_camera, args=(self.frame_queues[index], self.frame_result_queue,
+                                               self.subscriptions,
+                                               self.camera_calibration_requests[index],
+                                               self.camera_calibration_responses,
+                                               self.profile_requests['camera'] if primary
+                                               else None,
+                                               self.frame_format(),
+                                               self.frame_format_requests[index],
+                                               self.last_activity, self.thread_budget,
+                                               self.pacing, source, primary, self.layout, ))
+                camera_process.start()
+                self.camera_processes.append(camera_process)
 
     def start_detector(self) -> None:
         """Start the people detector."""
         if self.detector_process is None:
-            print('[Tracking] Starting people detector: {}, {}'.format(self.detector,
+            print('[Tracking] Starting people detector: {}, {}'.format(self.active_detector(),
                                                                        self.people_group))
-            self.detection_active.set()
+            self.subscriptions.subscribe(DETECTOR)
             self.detector_process = multiprocessing.Process(
-                target=start_detector, args=(self.frame_queue, self.frame_result_queue,
-                                             self.return_frame, self.coordinate_queue,
-                                             self.detector, self.people_group, ))
+                target=start_detector, args=(self.frame_queues, self.frame_result_queue,
+                                             self.subscriptions, self.coordinate_queue,
+                                             self.active_detector(), self.people_group,
+                                             self.profile_requests['detector'],
+                                             self.last_activity, self.thread_budget,
+                                             self.sources, self.layout,
+                                             self.config.recorder, ))
             self.detector_process.start()
+            self.request_frame_format()
+
+    def active_detector(self) -> str:
+        """Returns the detection algorithm that is currently used.
+        This is the configured one unless the governor has chosen a cheaper one.
+
+        :returns: Detection algorithm
+        :rtype: str
+        """
+        if self.governor_level is not None:
+            return self.governor_level.detector
+
+        return self.detector
+
+    def frame_format(self) -> FrameFormat:
+        """Returns the input format the cameras record the copies for the detectors in.
+        If a detector is running, its preferred input format is used.
+
+        :returns: Frame format
+        :rtype: FrameFormat
+        """
+        if self.detector_process is None or self.active_detector() not in DETECTORS:
+            return DEFAULT_FRAME_FORMAT
+
+        if self.governor_level is not None and self.governor_level.input_format is not None:
+            return self.governor_level.input_format
+
+        return DETECTORS[self.active_detector()].INPUT_FORMAT
+
+    def set_governor_level(self, level: GovernorLevel) -> None:
+        """Applies the settings chosen by the governor.
+
+        :param GovernorLevel level: New settings or None to use the configured ones
+        """
+        previous_detector = self.active_detector()
+        self.governor_level = level
+        self.update_pacing()
+
+        if self.detector_process is not None:
+            if self.active_detector() != previous_detector:
+                self.stop_detector()
+                self.start_detector()
+            else:
+                self.request_frame_format()
+
+    def request_frame_format(self) -> None:
+        """Requests all cameras to capture in the current frame format."""
+        for frame_format_requests in self.frame_format_requests:
+            frame_format_requests.put_nowait(self.frame_format())
+
+    def update_pacing(self) -> None:
+        """Updates the frame rate and idle timeout of the camera for the current settings."""
+        level = self.governor_level
+        self.pacing.framerate = Camera.FRAMERATE if level is None else level.framerate
+        self.pacing.idle_timeout = GATED_IDLE_TIMEOUT if level is not None and \
+            level.motion_gated else Camera.IDLE_TIMEOUT
 
     def stop_camera(self) -> None:
         """Stop the current camera tracking."""
-        if self.camera_process is not None:
+        if self.is_camera_active():
             print('[Tracking] Stopping camera')
-            self.camera_process.kill()
-            self.camera_process = None
+            for camera_process in self.camera_processes:
+                camera_process.kill()
+            self.camera_processes = []
 
     def stop_detector(self) -> None:
         """Stop the people detector."""
         if self.detector_process is not None:
             print('[Tracking] Stopping people detector')
-            self.detection_active.clear()
+            self.subscriptions.unsubscribe(DETECTOR)
             self.detector_process.kill()
             self.detector_process = None
+            self.request_frame_format()
 
     async def await_frames(self) -> None:
         """Awaits result frames and passes them to the listener."""
@@ -169,8 +301,9 @@ class TrackingManager:
         loop = asyncio.get_running_loop()
 
         while True:
-            coordinate = await loop.run_in_executor(executor, self.coordinate_queue.get)
-            await self.config.tracking_repository.update_coordinate(coordinate)
+            axis, coordinate, capture_time = await loop.run_in_executor(executor,
+                                                                        self.coordinate_queue.get)
+            await self.config.tracking_repository.update_coordinate(coordinate, axis, capture_time)
 
     async def await_camera_calibration_responses(self) -> None:
         """Awaits camera calibration responses and passes them to the cluster slave."""
@@ -178,10 +311,15 @@ class TrackingManager:
         loop = asyncio.get_running_loop()
 
         while True:
-            count, image = await loop.run_in_executor(executor,
-                                                      self.camera_calibration_responses.get)
+            count, image, status, data = await loop.run_in_executor(
+                executor, self.camera_calibration_responses.get)
+            if len(data) > 0:
+                # the stored image is the fallback for older masters and for lost chunks
+                await loop.run_in_executor(None, save_image, image, data)
             if self.cluster_slave is not None:
-                self.cluster_slave.send_camera_calibration_response(count, image)
+                if len(data) > 0:
+                    await self.cluster_slave.send_camera_calibration_image(image, data)
+                self.cluster_slave.send_camera_calibration_response(count, image, status)
 
     def set_frame_callback(self, on_frame: callable) -> None:
         """Sets the `on_frame` callback that will receive every processed frame.
@@ -193,9 +331,9 @@ class TrackingManager:
         self.on_frame = on_frame
 
         if self.on_frame is not None:
-            self.return_frame.set()
+            self.subscriptions.subscribe(STREAM)
         else:
-            self.return_frame.clear()
+            self.subscriptions.unsubscribe(STREAM)
 
     def send_camera_calibration_request(self, start: bool, finish: bool, repeat: bool,
                                         cluster_slave) -> None:
@@ -206,7 +344,42 @@ class TrackingManager:
         :param bool repeat: If true, the current step will be repeated
         """
         self.cluster_slave = cluster_slave
-        self.camera_calibration_requests.put_nowait((start, finish, repeat))
+        self.camera_calibration_requests[0].put_nowait((start, finish, repeat))
+
+    def is_process_running(self, process: str) -> bool:
+        """Returns whether the given tracking process is running.
+
+        :param str process: One of `main`, `camera` or `detector`
+        :returns: True if the process is running
+        :rtype: bool
+        """
+        if process == 'camera':
+            return self.is_camera_active()
+        if process == 'detector':
+            return self.detector_process is not None
+
+        return process == 'main'
+
+    def request_profile(self, process: str, duration: float) -> str:
+        """Starts the sampling profiler in the given process.
+        The result will be written to the profiles folder once the duration has passed.
+
+        :param str process: One of `main`, `camera` or `detector`
+        :param float duration: Duration in seconds
+        :returns: Name of the result file
+        :rtype: str
+        """
+        if process not in PROFILED_PROCESSES:
+            raise RuntimeError('Unknown process: {}'.format(process))
+
+        file_name = profile_file_name(process)
+
+        if process == 'main':
+            start_profile(duration, file_name)
+        else:
+            self.profile_requests[process].put_nowait((duration, file_name))
+
+        return file_name
 
     def set_detector(self, detector: str) -> None:
         """Sets the detection algorithm.
@@ -215,6 +388,9 @@ class TrackingManager:
         """
         if self.detector != detector:
             self.detector = detector
+            self.governor_level = None
+            self.governor.reset()
+            self.update_pacing()
 
             if self.detector_process is not None:
                 self.stop_detector()
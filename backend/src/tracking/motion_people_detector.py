@@ -1,9 +1,12 @@
 """Detects people in a given camera frame."""
-from multiprocessing import Queue, Event
+from multiprocessing import Queue
 import cv2
 from numpy import ndarray, array
 from imutils.object_detection import non_max_suppression
 from .people_detector import PeopleDetector
+from .subscriptions import Subscriptions
+from .buffer_pool import BUFFER_POOL
+from .frame_format import FrameFormat, DEFAULT_FRAME_FORMAT, COLOR_GRAY
 
 
 GAUSSIAN_BLUR = 15
@@ -16,12 +19,17 @@ GROUP_THRESHOLD_HEIGTH = 500
 class MotionPeopleDetector(PeopleDetector):
     """Detects people in a given camera frame."""
 
-    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, return_frame: Event,
-                 coordinate_queue: Queue, people_group: str):
-        super().__init__(frame_queue, frame_result_queue, return_frame, coordinate_queue,
-                         people_group)
+    INPUT_FORMAT = FrameFormat(DEFAULT_FRAME_FORMAT.width, DEFAULT_FRAME_FORMAT.height, COLOR_GRAY)
+
+    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, subscriptions: Subscriptions,
+                 coordinate_queue: Queue, people_group: str, last_activity):
+        super().__init__(frame_queue, frame_result_queue, subscriptions, coordinate_queue,
+                         people_group, last_activity)
         self.name = "Motion"
         self.last_frame = None
+        self.blur_index = 0
+        # the blurred frames must not be shared with the detectors of other cameras
+        self.blur_tags = ('blur0-{}'.format(id(self)), 'blur1-{}'.format(id(self)))
         self.tracker.group_threshold_width = GROUP_THRESHOLD_WIDTH
         self.tracker.group_threshold_height = GROUP_THRESHOLD_HEIGTH
         self.tracker.history_size = 3
@@ -33,21 +41,27 @@ class MotionPeopleDetector(PeopleDetector):
         :returns: Detected people as bounding boxes
         :rtype: list
         """
+        shape = frame.shape[:2]
+
         # convert to grayscale and smooth frame
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray_frame = cv2.GaussianBlur(gray_frame, (GAUSSIAN_BLUR, GAUSSIAN_BLUR), 0)
+        # the blurred frames alternate between two buffers as the last one is still needed
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=BUFFER_POOL.get(shape, tag='gray'))
+        self.blur_index = 1 - self.blur_index
+        blurred = BUFFER_POOL.get(shape, tag=self.blur_tags[self.blur_index])
+        gray_frame = cv2.GaussianBlur(frame, (GAUSSIAN_BLUR, GAUSSIAN_BLUR), 0, dst=blurred)
 
         # requires last frame to already exist
-        if self.last_frame is None:
+        if self.last_frame is None or self.last_frame.shape != gray_frame.shape:
             self.last_frame = gray_frame
             return []
 
         # difference to last frame
-        diff = cv2.absdiff(self.last_frame, gray_frame)
+        diff = cv2.absdiff(self.last_frame, gray_frame, dst=BUFFER_POOL.get(shape, tag='diff'))
         self.last_frame = gray_frame
 
         # apply threshold
-        _, diff = cv2.threshold(diff, THRESHOLD, 255, cv2.THRESH_BINARY)
+        cv2.threshold(diff, THRESHOLD, 255, cv2.THRESH_BINARY, dst=diff)
 
         # find contours in image
         contours, _ = cv2.findContours(diff, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
@@ -1,73 +1,86 @@
 """Defines methods for the people detection."""
 from abc import ABC, abstractmethod
-from multiprocessing import Queue, Event
+from multiprocessing import Queue
 from queue import Empty
 from numpy import ndarray
 import cv2
 from .fps_calculator import Fps
 from .people_tracker import PeopleTracker
+from .frame_format import FrameFormat, DEFAULT_FRAME_FORMAT, COLOR_GRAY
+from .buffer_pool import BUFFER_POOL
+from .subscriptions import Subscriptions
+from .pipeline import FrameContext, DEFAULT_LAYOUT
+from .stages import DetectStage, TrackStage, CoordinateStage, PublishStage
 
 
-GREEN = (0, 120, 0)
-ORANGE = (51, 153, 255)
 DEFAULT_COORDINATE = 320  # center of the image
+ROI_PADDING = 48  # pixels added around the confirmed people
+ROI_MAX_AREA = 0.6  # scan the full frame if the region covers more of it anyway
+ROI_FULL_SWEEP_INTERVAL = 10  # frames between full frame sweeps
 
 
 class PeopleDetector(ABC):
-    """Defines methods for the people detection."""
-
-    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, return_frame: Event,
-                 coordinate_queue: Queue, people_group: str):
+    """Defines methods for the people detection.
+    Each detector declares the frame format it works on best. The camera records a copy of each
+    frame in this format, while the tracking and the stream keep using the captured frame, so
+    the regions are scaled back to its pixel space.
+    Detectors whose cost grows with the frame area can enable the region of interest mode, which
+    only scans a padded region around the confirmed people between full frame sweeps.
+    If multiple cameras are attached, each one has its own detector tagged with the coordinate
+    axis of the camera and only the detector of the primary camera feeds the stream.
+    The frames are processed by the detector's part of the tracking pipeline.
+    """
+
+    INPUT_FORMAT: FrameFormat = DEFAULT_FRAME_FORMAT
+    ROI_DETECTION: bool = False
+    ROI_MIN_SIZE: (int, int) = (0, 0)
+
+    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, subscriptions: Subscriptions,
+                 coordinate_queue: Queue, people_group: str, last_activity):
         self.name = "Unset"
         self.frame_queue = frame_queue
         self.frame_result_queue = frame_result_queue
-        self.return_frame = return_frame
+        self.subscriptions = subscriptions
         self.coordinate_queue = coordinate_queue
         self.people_group = people_group
-        self.drawing_frame = None
+        self.last_activity = last_activity
         self.people = []
         self.fps = Fps()
         self.tracker = PeopleTracker()
-        self.last_coordinate = DEFAULT_COORDINATE
+        self.frame_width = DEFAULT_FRAME_FORMAT.width
+        self.last_coordinate = self.frame_width // 2
+        self.roi_active = False
+        self.frames_since_full_sweep = 0
+        # set if the detector runs for one of multiple cameras
+        self.axis = None
+        self.primary = True
+        self.camera_num = 0
+        self.pipeline = DEFAULT_LAYOUT.build('detector', self.stage_factories())
 
     def process(self) -> None:
         """Starts people detection."""
         while True:
-            frame = self.frame_queue.get()
-            self.drawing_frame = frame
-            all_regions = self.detect(frame)
-
-            if len(all_regions) > 0:
-                next_people = self.tracker.filter_new_rects(all_regions, self.people)
-                self.tracker.rotate_history(all_regions)
-
-                # calculate the coordinate
-                if len(next_people) > 0:
-                    self.people = next_people
-                    self.last_coordinate = self.calculate_coordinate(self.people)
-                    self.report_coordinate(self.last_coordinate)
-
-            # count fps
-            self.fps.frame()
-
-            if self.return_frame.is_set():
-                # draw rects
-                if len(all_regions) > 0:
-                    self.draw_rects(self.drawing_frame, all_regions, ORANGE, 1)
-                if len(self.people) > 0:
-                    self.draw_rects(self.drawing_frame, self.people, GREEN, 2)
-
-                # write fps on the image
-                cv2.putText(self.drawing_frame, '{} FPS: {:.1f}'.format(self.name, self.fps.get()),
-                            (10, 26), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-                # write coordinate on the image
-                cv2.putText(self.drawing_frame, '{} ({})'.format(self.last_coordinate,
-                                                                 self.people_group),
-                            (10, 56), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-                # send result
-                self.frame_result_queue.put_nowait(self.drawing_frame)
+            self.process_frame(self.frame_queue.get())
+
+    def process_frame(self, context: FrameContext) -> None:
+        """Detects and tracks people in a single frame and reports the result.
+
+        :param FrameContext context: Context of the camera frame
+        """
+        self.pipeline.run(context)
+
+    def stage_factories(self) -> dict:
+        """Returns the factories of the stages run by the detector.
+
+        :returns: Function per stage name that creates the stage
+        :rtype: dict
+        """
+        return {
+            'detect': lambda: DetectStage(self),
+            'track': lambda: TrackStage(self),
+            'coordinate': lambda: CoordinateStage(self),
+            'publish': lambda: PublishStage(self),
+        }
 
     @abstractmethod
     def detect(self, frame: ndarray) -> list:
@@ -79,6 +92,119 @@ class PeopleDetector(ABC):
         """
         raise NotImplementedError()
 
+    def prepare_frame(self, frame: ndarray, input_format: FrameFormat) -> ndarray:
+        """Converts the frame into the input format of the detector. Only used if the camera
+        did not record a copy in the input format. The captured frame is left unchanged, as it
+        is tracked, drawn on and streamed.
+
+        :param numpy.ndarray frame: Captured frame
+        :param FrameFormat input_format: Input format of the detector
+        :returns: Converted copy of the frame or the frame itself if it is in the input format
+        :rtype: numpy.ndarray
+        """
+        if input_format.color == COLOR_GRAY and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY,
+                                 dst=BUFFER_POOL.get(frame.shape[:2], tag='input-gray'))
+
+        if (frame.shape[1], frame.shape[0]) != input_format.size:
+            shape = (input_format.height, input_format.width) + frame.shape[2:]
+            frame = cv2.resize(frame, input_format.size, interpolation=cv2.INTER_AREA,
+                               dst=BUFFER_POOL.get(shape, tag='input'))
+
+        return frame
+
+    def detect_people(self, frame: ndarray, scale: (float, float) = (1.0, 1.0)) -> list:
+        """Detects people in a given camera frame. If the region of interest mode is enabled, only
+        the region around the confirmed people is scanned. The full frame is scanned periodically
+        and whenever the region comes up empty, so new and moving people are not missed.
+
+        :param numpy.ndarray frame: Camera frame in the input format of the detector
+        :param (float, float) scale: Factors from the input format to the captured frame
+        :returns: Detected people as bounding boxes within the full captured frame
+        :rtype: list
+        """
+        if self.ROI_DETECTION and self.roi_active and \
+                self.frames_since_full_sweep < ROI_FULL_SWEEP_INTERVAL:
+            region = self.region_of_interest(frame.shape[1], frame.shape[0], scale)
+
+            if region is not None:
+                (left, top, right, bottom) = region
+                rects = self.detect(frame[top:bottom, left:right])
+
+                if len(rects) > 0:
+                    self.frames_since_full_sweep += 1
+                    return self.scale_rects([[pos_x + left, pos_y + top, width, height]
+                                             for (pos_x, pos_y, width, height) in rects], scale)
+
+        rects = self.detect(frame)
+        self.frames_since_full_sweep = 0
+        # only narrow down the next frames if someone is actually in the frame
+        self.roi_active = len(rects) > 0
+
+        return self.scale_rects(rects, scale)
+
+    @staticmethod
+    def scale_rects(rects: list, scale: (float, float)) -> list:
+        """Scales rects from the input format of the detector to the captured frame.
+
+        :param list rects: A list of rects in the form (x, y, width, height)
+        :param (float, float) scale: Horizontal and vertical factor
+        :returns: Scaled rects
+        :rtype: list
+        """
+        if scale == (1.0, 1.0):
+            return rects
+
+        (scale_x, scale_y) = scale
+        return [[int(pos_x * scale_x), int(pos_y * scale_y), int(width * scale_x),
+                 int(height * scale_y)] for (pos_x, pos_y, width, height) in rects]
+
+    def region_of_interest(self, frame_width: int, frame_height: int,
+                           scale: (float, float) = (1.0, 1.0)) -> (int, int, int, int):
+        """Calculates the padded region around all confirmed people.
+
+        :param int frame_width: Width of the frame in the input format
+        :param int frame_height: Height of the frame in the input format
+        :param (float, float) scale: Factors from the input format to the captured frame
+        :returns: Region as (left, top, right, bottom) or None if the full frame should be scanned
+        :rtype: (int, int, int, int)
+        """
+        if len(self.people) == 0:
+            return None
+
+        # the confirmed people are located within the captured frame
+        (scale_x, scale_y) = scale
+        left = int(min(rect[0] for rect in self.people) / scale_x) - ROI_PADDING
+        top = int(min(rect[1] for rect in self.people) / scale_y) - ROI_PADDING
+        right = int(max(rect[0] + rect[2] for rect in self.people) / scale_x) + ROI_PADDING
+        bottom = int(max(rect[1] + rect[3] for rect in self.people) / scale_y) + ROI_PADDING
+
+        # grow the region to the minimum size the detector can work with
+        (min_width, min_height) = self.ROI_MIN_SIZE
+        if right - left < min_width:
+            left -= (min_width - (right - left)) // 2
+            right = left + min_width
+        if bottom - top < min_height:
+            top -= (min_height - (bottom - top)) // 2
+            bottom = top + min_height
+
+        # shift the region back into the frame
+        if left < 0:
+            right -= left
+            left = 0
+        if top < 0:
+            bottom -= top
+            top = 0
+        right = min(right, frame_width)
+        bottom = min(bottom, frame_height)
+        left = max(0, min(left, right - min_width))
+        top = max(0, min(top, bottom - min_height))
+
+        if (right - left) * (bottom - top) > ROI_MAX_AREA * frame_width * frame_height:
+            return None
+
+        return (left, top, right, bottom)
+
     @staticmethod
     def draw_rects(frame: ndarray, rects: list, color: (int, int, int), thickness: int) -> None:
         """Draws the given rects ontop of the frame.
@@ -122,20 +248,37 @@ class PeopleDetector(ABC):
         else:
             raise RuntimeError('Unknown people group algorithm: {}'.format(self.people_group))
 
-    def report_coordinate(self, coordinate: int) -> None:
+    def to_default_coordinate(self, coordinate: int) -> int:
+        """Converts a coordinate of the current frame to the default frame width, so coordinates
+        are independent of the frame format a detector works on.
+
+        :param int coordinate: Coordinate within the current frame
+        :returns: Coordinate relative to the default frame width
+        :rtype: int
+        """
+        return int(coordinate * DEFAULT_FRAME_FORMAT.width / self.frame_width)
+
+    def report_coordinate(self, coordinate: int, capture_time: float) -> None:
         """Reports the detected coordinate to the master.
+        Only the latest coordinate per axis is kept in the queue.
 
         :param int coordinate: Coordinate
+        :param float capture_time: Unix time at which the frame has been captured
         """
-        # clear current queue
+        coordinates = {}
+
+        # clear current queue, but keep the coordinates of the other cameras
         while not self.coordinate_queue.empty():
             try:
-                self.coordinate_queue.get_nowait()
+                axis, queued_coordinate, queued_capture_time = self.coordinate_queue.get_nowait()
+                coordinates[axis] = (queued_coordinate, queued_capture_time)
             except Empty:
                 pass
 
         # add new coordinate to the queue
-        self.coordinate_queue.put_nowait(coordinate)
+        coordinates[self.axis] = (coordinate, capture_time)
+        for axis, (axis_coordinate, axis_capture_time) in coordinates.items():
+            self.coordinate_queue.put_nowait((axis, axis_coordinate, axis_capture_time))
 
     def group_nearby_rects(self, rects: list, threshold_width: int, threshold_height: int) -> list:
         """Groups nearby rectangles into a greater one.
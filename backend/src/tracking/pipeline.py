@@ -0,0 +1,168 @@
+"""Composes the tracking of a frame out of stages and places them on the tracking processes."""
+
+from abc import ABC, abstractmethod
+from time import perf_counter, monotonic
+from typing import Dict, List
+from numpy import ndarray
+from .instrumentation import STAGES, STAGE_SECONDS, STAGE_DROPS, STAGE_SKIPS
+from .frame_format import FrameFormat, DEFAULT_FRAME_FORMAT
+
+PROCESSES = ('camera', 'detector')
+DEFAULT_PLACEMENT = {
+    'source': 'camera',
+    'gate': 'camera',
+    'undistort': 'camera',
+    'detect': 'detector',
+    'track': 'detector',
+    'coordinate': 'detector',
+    'record': 'detector',
+    'publish': 'detector',
+}
+# the other stages depend on the camera or the detector they belong to
+MOVABLE_STAGES = ('undistort',)
+
+
+class FrameContext:
+    """A frame and everything the stages have found out about it.
+    It is handed from the camera to the detector process and therefore has to be picklable.
+
+    :param numpy.ndarray frame: Captured frame
+    :param str axis: Coordinate axis of the camera which captured the frame
+    :param FrameFormat input_format: Input format of the detector
+    """
+
+    def __init__(self, frame: ndarray, axis: str = None,
+                 input_format: FrameFormat = DEFAULT_FRAME_FORMAT):
+        self.frame = frame
+        self.axis = axis
+        self.input_format = input_format
+        # copy of the frame recorded by the camera in the input format, if it differs
+        self.input_frame = None
+        self.captured_at = monotonic()
+        # all detected regions and the newly confirmed people as bounding boxes
+        self.regions = []
+        self.people = []
+        # coordinate relative to the default frame width, if people have been confirmed
+        self.coordinate = None
+        # set by a stage that does not pass the frame on by intention, e.g. while calibrating
+        self.skip_reason = None
+
+
+class Stage(ABC):
+    """A single step of the tracking of a frame."""
+
+    name: str = 'unset'
+
+    @abstractmethod
+    def process(self, context: FrameContext) -> bool:
+        """Processes the frame of the given context.
+
+        :param FrameContext context: Frame context
+        :returns: True if the frame should be passed on to the next stage, False to drop it. A
+                  stage that stops the frame by intention sets `skip_reason` on the context.
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+
+class Pipeline:
+    """Runs stages one after another and records the processing time and the dropped frames
+    of each stage. Frames a stage skips by intention are counted separately per reason.
+
+    :param list stages: Stages in the order they should run
+    :param callable sink: Receives the contexts that passed all stages
+    """
+
+    def __init__(self, stages: List[Stage], sink: callable = None):
+        self.stages = stages
+        self.sink = sink
+        self.instruments = [(stage, STAGE_SECONDS.labels(stage.name),
+                             STAGE_DROPS.labels(stage.name)) for stage in stages]
+
+    def run(self, context: FrameContext, started_at: float = None) -> bool:
+        """Runs all stages on the given context.
+
+        :param FrameContext context: Frame context
+        :param float started_at: `perf_counter` time at which the first stage has started, e.g.
+                                 before waiting for the frame in the source stage
+        :returns: True if the context passed all stages
+        :rtype: bool
+        """
+        stage_started_at = perf_counter() if started_at is None else started_at
+
+        for stage, seconds, drops in self.instruments:
+            passed = stage.process(context)
+            stage_finished_at = perf_counter()
+            seconds.observe(stage_finished_at - stage_started_at)
+            stage_started_at = stage_finished_at
+
+            if not passed:
+                if context.skip_reason is None:
+                    drops.inc()
+                else:
+                    STAGE_SKIPS.labels(stage.name, context.skip_reason).inc()
+                return False
+
+        if self.sink is not None:
+            self.sink(context)
+
+        return True
+
+
+class PipelineLayout:
+    """Places the stages of the tracking pipeline on the camera and detector processes.
+    Frames only flow from the camera to the detector process, so the stages of the camera
+    process must precede the ones of the detector process. By default the camera process
+    captures, gates and undistorts the frames. On nodes with multiple cameras, the undistortion
+    can be moved to the detector process to keep the camera processes light.
+
+    :param dict overrides: Process per stage from the config, e.g. `{"undistort": "detector"}`
+    """
+
+    def __init__(self, overrides: dict = None):
+        self.placement: Dict[str, str] = dict(DEFAULT_PLACEMENT)
+
+        for stage, process in (overrides or {}).items():
+            if stage not in STAGES:
+                raise ValueError('Unknown pipeline stage: {}'.format(stage))
+            if process not in PROCESSES:
+                raise ValueError('Unknown pipeline process: {}'.format(process))
+            if stage not in MOVABLE_STAGES and process != DEFAULT_PLACEMENT[stage]:
+                raise ValueError('Pipeline stage {} cannot run in {}'.format(stage, process))
+
+            self.placement[stage] = process
+
+    def process_of(self, stage: str) -> str:
+        """Returns the process the given stage runs in.
+
+        :param str stage: Stage name
+        :returns: One of `camera` or `detector`
+        :rtype: str
+        """
+        return self.placement[stage]
+
+    def stages(self, process: str) -> List[str]:
+        """Returns the stages that run in the given process.
+
+        :param str process: One of `camera` or `detector`
+        :returns: Stage names in the order they run
+        :rtype: list
+        """
+        return [stage for stage in STAGES if self.placement[stage] == process]
+
+    def build(self, process: str, factories: Dict[str, callable], sink: callable = None) \
+            -> Pipeline:
+        """Builds the pipeline of the given process.
+        Optional stages without a factory, like the recorder, are left out.
+
+        :param str process: One of `camera` or `detector`
+        :param dict factories: Function per stage name that creates the stage
+        :param callable sink: Receives the contexts that passed all stages
+        :returns: Pipeline
+        :rtype: Pipeline
+        """
+        return Pipeline([factories[stage]() for stage in self.stages(process)
+                         if stage in factories], sink)
+
+
+DEFAULT_LAYOUT = PipelineLayout()
@@ -0,0 +1,226 @@
+"""Stages of the tracking pipeline."""
+
+from time import monotonic, time
+import cv2
+from .pipeline import Stage, FrameContext
+from .calibration import Calibration
+from .instrumentation import DETECTOR_FPS, FRAMES_CAPTURED
+from .subscriptions import DETECTOR, STREAM
+
+GREEN = (0, 120, 0)
+ORANGE = (51, 153, 255)
+REFRESH_INTERVAL = 2.0  # seconds between two checks for a new calibration
+
+
+class SourceStage(Stage):
+    """Accounts the captured frame and processes pending camera requests.
+    While calibrating, the frames are consumed by the calibration.
+
+    :param tracking.camera.Camera camera: Camera
+    """
+
+    name = 'source'
+
+    def __init__(self, camera):
+        self.camera = camera
+
+    def process(self, context: FrameContext) -> bool:
+        FRAMES_CAPTURED.inc()
+        self.camera.handle_requests()
+
+        if not self.camera.calibration.calibrating:
+            return True
+
+        self.camera.calibration.handle_frame(context.frame)
+        cv2.putText(context.frame, 'Calibrating Camera', (10, self.camera.FRAME_HEIGHT - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+        if self.camera.is_streaming():
+            self.camera.frame_result_queue.put_nowait(context.frame)
+
+        context.skip_reason = 'calibration'
+        return False
+
+
+class GateStage(Stage):
+    """Drops frames without a consumer, so they are neither corrected nor published.
+    While the capture is throttled, a cheap motion check wakes it up again.
+
+    :param tracking.camera.Camera camera: Camera
+    """
+
+    name = 'gate'
+
+    def __init__(self, camera):
+        self.camera = camera
+
+    def process(self, context: FrameContext) -> bool:
+        if not self.camera.subscriptions.any():
+            context.skip_reason = 'no_consumer'
+            return False
+
+        if not self.camera.subscriptions.is_subscribed(DETECTOR) or not self.camera.is_idle():
+            self.camera.motion_check.reset()
+        elif self.camera.motion_check.changed(context.frame):
+            print('[Camera] Motion detected, leaving idle mode')
+            self.camera.pacer.activity()
+
+        return True
+
+
+class UndistortStage(Stage):
+    """Corrects the lens distortion of the frame.
+    If the stage does not run in the camera process, the calibration is reloaded once the camera
+    has stored a new one.
+
+    :param Calibration calibration: Camera calibration
+    :param bool refresh: If true, the calibration file is checked for changes periodically
+    """
+
+    name = 'undistort'
+
+    def __init__(self, calibration: Calibration, refresh: bool = False):
+        self.calibration = calibration
+        self.refresh = refresh
+        self.refreshed_at = monotonic()
+
+    def process(self, context: FrameContext) -> bool:
+        if self.refresh and monotonic() - self.refreshed_at > REFRESH_INTERVAL:
+            self.calibration.refresh()
+            self.refreshed_at = monotonic()
+
+        context.frame = self.calibration.correct_frame(context.frame)
+        if context.input_frame is not None:
+            context.input_frame = self.calibration.correct_frame(context.input_frame,
+                                                                 tag='undistort-input')
+        return True
+
+
+class DetectStage(Stage):
+    """Detects people in the frame.
+
+    :param tracking.people_detector.PeopleDetector detector: People detector
+    """
+
+    name = 'detect'
+
+    def __init__(self, detector):
+        self.detector = detector
+
+    def process(self, context: FrameContext) -> bool:
+        # the detector works on a copy in its input format, the regions are scaled back
+        frame = context.input_frame
+        if frame is None:
+            # the camera did not record a copy, e.g. for the first frames or in the replay
+            frame = self.detector.prepare_frame(context.frame, context.input_format)
+        scale = (context.frame.shape[1] / frame.shape[1], context.frame.shape[0] / frame.shape[0])
+        self.detector.frame_width = context.frame.shape[1]
+        context.regions = self.detector.detect_people(frame, scale)
+
+        if len(context.regions) > 0:
+            # keeps the camera at the full frame rate
+            self.detector.last_activity.value = monotonic()
+
+        return True
+
+
+class TrackStage(Stage):
+    """Confirms the detected regions which have been seen in the previous frames.
+
+    :param tracking.people_detector.PeopleDetector detector: People detector
+    """
+
+    name = 'track'
+
+    def __init__(self, detector):
+        self.detector = detector
+
+    def process(self, context: FrameContext) -> bool:
+        if len(context.regions) > 0:
+            context.people = self.detector.tracker.filter_new_rects(context.regions,
+                                                                    self.detector.people)
+            self.detector.tracker.rotate_history(context.regions)
+
+            if len(context.people) > 0:
+                self.detector.people = context.people
+
+        # count fps
+        self.detector.fps.frame()
+        DETECTOR_FPS.labels(self.detector.camera_num).set(self.detector.fps.get())
+
+        return True
+
+
+class CoordinateStage(Stage):
+    """Calculates the coordinate of the confirmed people and reports it.
+
+    :param tracking.people_detector.PeopleDetector detector: People detector
+    """
+
+    name = 'coordinate'
+
+    def __init__(self, detector):
+        self.detector = detector
+
+    def process(self, context: FrameContext) -> bool:
+        if len(context.people) > 0:
+            self.detector.last_coordinate = self.detector.calculate_coordinate(context.people)
+            context.coordinate = self.detector.to_default_coordinate(self.detector.last_coordinate)
+            # the capture time is sent to other nodes, so it has to be a wall clock time
+            capture_time = time() - (monotonic() - context.captured_at)
+            self.detector.report_coordinate(context.coordinate, capture_time)
+
+        return True
+
+
+class RecordStage(Stage):
+    """Passes the frame and the detection results to the frame recorder.
+
+    :param tracking.frame_recorder.FrameRecorder recorder: Frame recorder
+    """
+
+    name = 'record'
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def process(self, context: FrameContext) -> bool:
+        self.recorder.record(context)
+        return True
+
+
+class PublishStage(Stage):
+    """Draws the detection results onto the frame and sends it to the stream.
+
+    :param tracking.people_detector.PeopleDetector detector: People detector
+    """
+
+    name = 'publish'
+
+    def __init__(self, detector):
+        self.detector = detector
+
+    def process(self, context: FrameContext) -> bool:
+        detector = self.detector
+        if not detector.primary or not detector.subscriptions.is_subscribed(STREAM):
+            return True
+
+        frame = context.frame
+
+        # draw rects
+        if len(context.regions) > 0:
+            detector.draw_rects(frame, context.regions, ORANGE, 1)
+        if len(detector.people) > 0:
+            detector.draw_rects(frame, detector.people, GREEN, 2)
+
+        # write fps on the image
+        cv2.putText(frame, '{} FPS: {:.1f}'.format(detector.name, detector.fps.get()),
+                    (10, 26), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # write coordinate on the image
+        cv2.putText(frame, '{} ({})'.format(detector.last_coordinate, detector.people_group),
+                    (10, 56), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # send result
+        detector.frame_result_queue.put_nowait(frame)
+        return True
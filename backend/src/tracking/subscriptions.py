@@ -0,0 +1,47 @@
+"""Shares which consumers currently want frames from the camera."""
+
+import multiprocessing
+
+DETECTOR = 1
+STREAM = 2
+
+
+class Subscriptions:
+    """Shares which consumers currently want frames from the camera.
+    The state is a bitmask in shared memory, so it can be checked for every frame without a round
+    trip to the multiprocessing manager. Only the tracking manager changes the subscriptions.
+    """
+
+    def __init__(self):
+        self.mask = multiprocessing.RawValue('i', 0)
+
+    def subscribe(self, consumer: int) -> None:
+        """Subscribes a consumer to the camera frames.
+
+        :param int consumer: `DETECTOR` or `STREAM`
+        """
+        self.mask.value |= consumer
+
+    def unsubscribe(self, consumer: int) -> None:
+        """Unsubscribes a consumer from the camera frames.
+
+        :param int consumer: `DETECTOR` or `STREAM`
+        """
+        self.mask.value &= ~consumer
+
+    def is_subscribed(self, consumer: int) -> bool:
+        """Returns whether the given consumer is subscribed.
+
+        :param int consumer: `DETECTOR` or `STREAM`
+        :returns: True if subscribed
+        :rtype: bool
+        """
+        return self.mask.value & consumer != 0
+
+    def any(self) -> bool:
+        """Returns whether any consumer is subscribed.
+
+        :returns: True if at least one consumer is subscribed
+        :rtype: bool
+        """
+        return self.mask.value != 0
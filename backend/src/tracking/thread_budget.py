@@ -0,0 +1,91 @@
+"""Assigns CPU cores and OpenCV threads to the processes of a node."""
+
+import os
+from typing import Dict, List
+import cv2
+
+ROLES = ('main', 'camera', 'detector')
+
+
+class ThreadBudget:
+    """Assigns CPU cores and OpenCV threads to the processes of a node.
+    Without a budget every process lets OpenCV start a thread per core, so the processes compete
+    for the same cores. By default the main process (API, balancing and the multiprocessing
+    manager) and the camera get a core each and the detector gets the remaining cores.
+
+    :param dict overrides: Budgets per role from the config, e.g.
+                           `{"detector": {"cores": [2, 3], "threads": 2}}`
+    :param int cpu_count: Number of available cores, detected if not given
+    """
+
+    def __init__(self, overrides: dict = None, cpu_count: int = None):
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.budgets = self.default_budgets(self.cpu_count)
+
+        for role, budget in (overrides or {}).items():
+            if role not in ROLES:
+                raise ValueError('Unknown thread budget role: {}'.format(role))
+
+            cores = budget.get('cores', self.budgets[role]['cores'])
+            self.budgets[role] = {
+                'cores': cores,
+                'threads': budget.get('threads', len(cores)),
+            }
+
+    @staticmethod
+    def default_budgets(cpu_count: int) -> Dict[str, dict]:
+        """Returns the default budgets for the given number of cores.
+
+        :param int cpu_count: Number of available cores
+        :returns: Cores and thread count per role
+        :rtype: dict
+        """
+        if cpu_count >= 4:
+            main_cores, camera_cores, detector_cores = [0], [1], list(range(2, cpu_count))
+        elif cpu_count >= 2:
+            main_cores, camera_cores, detector_cores = [0], [0], list(range(1, cpu_count))
+        else:
+            main_cores, camera_cores, detector_cores = [0], [0], [0]
+
+        return {
+            'main': {'cores': main_cores, 'threads': 1},
+            'camera': {'cores': camera_cores, 'threads': 1},
+            'detector': {'cores': detector_cores, 'threads': len(detector_cores)},
+        }
+
+    def cores(self, role: str) -> List[int]:
+        """Returns the cores assigned to the given role.
+
+        :param str role: One of `main`, `camera` or `detector`
+        :returns: Core ids
+        :rtype: list
+        """
+        return self.budgets[role]['cores']
+
+    def threads(self, role: str) -> int:
+        """Returns the number of OpenCV threads of the given role.
+
+        :param str role: One of `main`, `camera` or `detector`
+        :returns: Thread count
+        :rtype: int
+        """
+        return self.budgets[role]['threads']
+
+    def apply(self, role: str) -> None:
+        """Applies the budget of the given role to the current process.
+        Child processes inherit the affinity and must therefore apply their own budget.
+
+        :param str role: One of `main`, `camera` or `detector`
+        """
+        cores = self.cores(role)
+        threads = self.threads(role)
+
+        if hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, cores)
+            except OSError as error:
+                print('[Tracking] Could not set the affinity of {} to {}: {}'.format(
+                    role, cores, error))
+
+        cv2.setNumThreads(threads)
+        print('[Tracking] Thread budget of {}: cores {}, {} threads'.format(role, cores, threads))
@@ -1,29 +1,52 @@
 """Detects people in a given camera frame."""
-from multiprocessing import Queue, Event
+from multiprocessing import Queue
 from pathlib import Path
 import cv2
-from numpy import ndarray, array, argmax
+from numpy import ndarray, array, argmax, multiply, float32
 from .people_detector import PeopleDetector
+from .subscriptions import Subscriptions
+from .buffer_pool import BUFFER_POOL
+from .frame_format import FrameFormat
 
 
 YOLO_PATH: Path = (Path(__file__).resolve().parent / '..' / '..' / 'assets' / 'yolo').resolve()
 PERSON_CLASSIFICATION_ID = 0
 CONFIDENCE_THRESHOLD = 0.5
 GROUP_THRESHOLD_WIDTH = 150
+INPUT_SIZE = 416
 
 
 class YoloPeopleDetector(PeopleDetector):
-    """Detects people in a given camera frame."""
-
-    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, return_frame: Event,
-                 coordinate_queue: Queue, people_group: str):
-        super().__init__(frame_queue, frame_result_queue, return_frame, coordinate_queue,
-                         people_group)
+    """Detects people in a given camera frame.
+    The net is shared by all instances within a process, as multiple cameras are processed one
+    after the other.
+    """
+
+    # the camera records the frames for the detector in the net input size
+    INPUT_FORMAT = FrameFormat(INPUT_SIZE, INPUT_SIZE)
+    NET = None
+    OUTPUT_LAYERS = None
+
+    def __init__(self, frame_queue: Queue, frame_result_queue: Queue, subscriptions: Subscriptions,
+                 coordinate_queue: Queue, people_group: str, last_activity):
+        super().__init__(frame_queue, frame_result_queue, subscriptions, coordinate_queue,
+                         people_group, last_activity)
         self.name = "YOLO"
         self.tracker.group_threshold_width = GROUP_THRESHOLD_WIDTH
-        self.net = self.load_net()
 
-    def load_net(self):
+        if YoloPeopleDetector.NET is None:
+            YoloPeopleDetector.NET = self.load_net()
+
+            # get target layer names
+            layers = YoloPeopleDetector.NET.getLayerNames()
+            YoloPeopleDetector.OUTPUT_LAYERS = [
+                layers[i[0] - 1] for i in YoloPeopleDetector.NET.getUnconnectedOutLayers()]
+
+        self.net = YoloPeopleDetector.NET
+        self.output_layers = YoloPeopleDetector.OUTPUT_LAYERS
+
+    @staticmethod
+    def load_net():
         """Loads the yolo net."""
         weights_path = YOLO_PATH / 'tiny3.weights'
         config_path = YOLO_PATH / 'tiny3.cfg'
@@ -37,17 +60,25 @@ class YoloPeopleDetector(PeopleDetector):
         :returns: Detected people as bounding boxes
         :rtype: list
         """
-        # get target layer names
-        layers = self.net.getLayerNames()
-        layers = [layers[i[0] - 1] for i in self.net.getUnconnectedOutLayers()]
-
-        # convert image to a blob and pass it to the net
-        blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, (416, 416),  # pylint: disable=no-member
-                                     swapRB=True, crop=False)
+        # square frames with a size supported by the net are used as they are, which allows
+        # running the net at a lower input size
+        height, width = frame.shape[:2]
+        if height == width and width % 32 == 0:
+            input_size = width
+            resized = frame
+        else:
+            input_size = INPUT_SIZE
+            resized = cv2.resize(frame, (INPUT_SIZE, INPUT_SIZE),
+                                 dst=BUFFER_POOL.get((INPUT_SIZE, INPUT_SIZE, 3), tag='yolo'))
+
+        # convert image to a blob (scaled, RGB, channels first) and pass it to the net
+        blob = BUFFER_POOL.get((1, 3, input_size, input_size), float32, tag='yolo')
+        multiply(resized[:, :, ::-1].transpose(2, 0, 1), float32(1 / 255.0), out=blob[0],
+                 dtype=float32, casting='unsafe')
         self.net.setInput(blob)
 
         # process
-        results = self.net.forward(layers)
+        results = self.net.forward(self.output_layers)
 
         # convert results to bounding boxes
         rects = self.convert_to_boxes(frame, results)
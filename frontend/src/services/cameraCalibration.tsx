@@ -17,6 +17,7 @@ export type CameraCalibrationResponse = {
   };
   count: number;
   image: string;
+  status: 'found' | 'solving' | 'done' | 'failed';
 }
 
 export const useCameraCalibration = (nodeId?: number) => {